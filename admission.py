@@ -0,0 +1,139 @@
+# admission.py
+# Contrôle d'admission des commandes: un seau à jetons par chat, chaque classe de commandes ayant un coût,
+# et une file à priorités pour les créneaux de travail bloquant (les commandes légères passent en premier).
+# Un chat qui enchaîne /longterm ou /ask épuise son propre budget sans affamer /status ou /detail des autres.
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from broadcaster import TokenBucket
+
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", 0.5)) # Jetons regagnés par seconde et par chat
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", 20)) # Jetons max accumulés par chat
+# classe -> (coût en jetons, priorité: plus petit = servi d'abord)
+COMMAND_CLASSES = {
+    "cheap": (1, 0),
+    "medium": (3, 1),
+    "heavy": (6, 2),
+}
+COMMAND_CLASS_BY_COMMAND = {
+    "start": "cheap", "help": "cheap", "clear": "cheap", "status": "cheap", "info": "cheap", "digest": "cheap",
+    "stop": "cheap", "cachestats": "cheap", "metrics": "cheap",
+    "detail": "medium", "officers": "medium", "screen": "medium", "watch": "medium", "portfolio": "medium", "alert": "medium",
+    "longterm": "heavy", "longtermetf": "heavy", "longtermact": "heavy", "list": "heavy", "ask": "heavy",
+    "momentum": "heavy", "volatility": "heavy", "drawdown": "heavy", "sharpe": "heavy",
+}
+DEFAULT_COMMAND_CLASS = "medium" # Commande inconnue ou ajoutée sans classe
+REJECTION_NOTICE_INTERVAL = 10 # secondes: au plus un message de refus par chat sur cet intervalle
+
+# Priorité de la commande en cours de traitement (posée par le middleware d'admission, lue par PriorityGate)
+current_priority = contextvars.ContextVar("current_priority", default=COMMAND_CLASSES[DEFAULT_COMMAND_CLASS][1])
+
+def command_name(text):
+    """'/detail@MonBot AAPL' -> 'detail' ; None si `text` n'est pas une commande."""
+    if not text or not text.startswith("/"):
+        return None
+    return text.split(maxsplit=1)[0][1:].split("@", 1)[0].lower() or None
+
+def command_class(text):
+    """Classe d'admission du message, ou None si ce n'est pas une commande."""
+    name = command_name(text)
+    if name is None:
+        return None
+    return COMMAND_CLASS_BY_COMMAND.get(name, DEFAULT_COMMAND_CLASS)
+
+def command_priority(text):
+    """Priorité du message (les messages qui ne sont pas des commandes passent avec les commandes légères)."""
+    return COMMAND_CLASSES[command_class(text) or "cheap"][1]
+
+class ChatAdmission:
+    """Un TokenBucket par chat ; une commande est admise si le chat a encore de quoi payer son coût."""
+
+    def __init__(self, rate=ADMISSION_RATE, burst=ADMISSION_BURST, exempt=()):
+        self.rate = rate
+        self.burst = burst
+        self.exempt = set(exempt) # Chats jamais limités (propriétaire)
+        self._buckets = {} # chat_id -> TokenBucket
+        self._last_used = {} # chat_id -> dernière demande (time.monotonic())
+        self._notified_until = {} # chat_id -> fin de la période sans nouveau message de refus
+        self._lock = threading.Lock()
+
+    def try_admit(self, chat_id, class_name):
+        """Retourne 0 si la commande est admise, sinon le temps d'attente estimé (s) avant qu'elle le soit."""
+        if chat_id in self.exempt:
+            return 0.0
+        cost = COMMAND_CLASSES[class_name][0]
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(chat_id)
+            if bucket is None:
+                if len(self._buckets) > 10000:
+                    self._forget_idle(now)
+                bucket = self._buckets[chat_id] = TokenBucket(self.rate, self.burst)
+            self._last_used[chat_id] = now
+        return bucket.try_acquire(cost)
+
+    def _forget_idle(self, now):
+        """Oublie les chats dont le seau est forcément plein à nouveau (même état qu'un seau neuf). Sous le verrou."""
+        idle_after = self.burst / self.rate # Temps de remplissage complet
+        self._last_used = {c: t for c, t in self._last_used.items() if now - t < idle_after}
+        self._buckets = {c: self._buckets[c] for c in self._last_used}
+        self._notified_until = {c: t for c, t in self._notified_until.items() if t > now}
+
+    def should_notify(self, chat_id):
+        """True si le chat n'a pas déjà été prévenu d'un refus récemment (évite de répondre à chaque message)."""
+        now = time.monotonic()
+        with self._lock:
+            if self._notified_until.get(chat_id, 0.0) > now:
+                return False
+            self._notified_until[chat_id] = now + REJECTION_NOTICE_INTERVAL
+            return True
+
+class PriorityGate:
+    """
+    Sémaphore asyncio à `slots` places dont les attentes sont servies par priorité (puis ordre d'arrivée)
+    au lieu de l'ordre d'arrivée seul. À utiliser depuis une seule boucle asyncio.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self._in_use = 0
+        self._waiters = [] # tas de (priorité, n° d'arrivée, future)
+        self._counter = itertools.count()
+
+    def __len__(self):
+        """Nombre de tâches en attente d'une place."""
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority=None):
+        priority = current_priority.get() if priority is None else priority
+        if self._in_use < self.slots and not len(self):
+            self._in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future # La place est transmise par release() (_in_use inchangé)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled(): # Place reçue juste avant l'annulation: la rendre
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._in_use -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
@@ -0,0 +1,161 @@
+# ai_streaming.py
+# Réponses IA en streaming: un message provisoire est envoyé tout de suite puis édité au fil des morceaux
+# reçus du modèle, sans dépasser le rythme d'édition toléré par Telegram ni la limite de 4096 caractères.
+import asyncio
+import os
+import threading
+import time
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+ASK_STREAM_EDIT_INTERVAL = float(os.getenv("ASK_STREAM_EDIT_INTERVAL", 1.5)) # secondes entre deux éditions d'un message
+
+def _chunk_text(chunk):
+    # Un morceau sans texte (ex: filtré par la sécurité) lève ValueError sur .text chez Gemini
+    try:
+        return chunk.text
+    except (ValueError, AttributeError):
+        return ""
+
+async def stream_model_chunks(model, prompt):
+    """
+    Itérateur asynchrone sur les morceaux de texte de `model.generate_content(prompt, stream=True)`.
+    Le générateur (bloquant) du modèle est consommé dans un thread de l'executor.
+    Si le consommateur s'arrête avant la fin (erreur, annulation, aclose()), le thread cesse de lire le flux
+    au morceau suivant et le ferme, au lieu d'occuper un worker de l'executor jusqu'au bout de la réponse.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        if stop.is_set():
+            return
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError: # Boucle fermée: plus personne n'attend
+            stop.set()
+
+    def produce():
+        chunks = None
+        try:
+            chunks = iter(model.generate_content(prompt, stream=True))
+            for chunk in chunks:
+                if stop.is_set():
+                    break
+                text = _chunk_text(chunk)
+                if text:
+                    put(text)
+        except Exception as e:
+            put(e)
+        finally:
+            if stop.is_set() and hasattr(chunks, "close"):
+                chunks.close()
+            put(done)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+    await producer
+
+class StreamingReply:
+    """
+    Réponse Telegram construite progressivement.
+    `start()` envoie le message provisoire, `append()` ajoute du texte (éditions limitées à une toutes les
+    `edit_interval` secondes), `finish()` force la dernière édition. Au-delà de `limit` caractères,
+    le message courant est figé et la suite continue dans un nouveau message.
+    """
+
+    def __init__(self, bot, message, placeholder="🧠 _Réflexion en cours..._", edit_interval=ASK_STREAM_EDIT_INTERVAL,
+                 limit=TELEGRAM_MESSAGE_LIMIT):
+        self.bot = bot
+        self.message = message
+        self.placeholder = placeholder
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.sent_messages = [] # Messages Telegram utilisés pour la réponse
+        self._text = "" # Texte du message courant
+        self._shown = "" # Dernier texte effectivement affiché dans le message courant
+        self._next_edit_at = 0.0 # Le premier morceau est affiché immédiatement
+
+    @property
+    def chat_id(self):
+        return self.message.chat.id
+
+    async def start(self):
+        self.sent_messages.append(await self.bot.reply_to(self.message, self.placeholder))
+
+    async def append(self, text):
+        self._text += text
+        while len(self._text) > self.limit:
+            cut = self._text.rfind("\n", self.limit // 2, self.limit)
+            cut = cut + 1 if cut != -1 else self.limit
+            head, self._text = self._text[:cut], self._text[cut:]
+            await self._edit(head, final=True)
+            self.sent_messages.append(await self.bot.send_message(self.chat_id, self._text[:self.limit] or "…", parse_mode=""))
+            self._shown = self._text[:self.limit]
+        if time.monotonic() >= self._next_edit_at:
+            await self._edit(self._text)
+
+    async def finish(self, suffix=""):
+        if suffix:
+            await self.append(suffix)
+        await self._edit(self._text, final=True)
+
+    async def _edit(self, text, final=False):
+        """Édite le message courant. Le rendu Markdown n'est tenté qu'à la version finale (le texte partiel peut être mal balisé)."""
+        if not text.strip() or (text == self._shown and not final):
+            return
+        current = self.sent_messages[-1]
+        self._next_edit_at = time.monotonic() + self.edit_interval
+        try:
+            await self.bot.edit_message_text(text, self.chat_id, current.message_id, parse_mode=None if final else "")
+        except Exception as e:
+            error_code = getattr(e, "error_code", None)
+            if error_code == 429:
+                result_json = getattr(e, "result_json", None) or {}
+                retry_after = (result_json.get("parameters") or {}).get("retry_after", 1)
+                if final:
+                    await asyncio.sleep(retry_after)
+                    return await self._edit(text, final=True)
+                self._next_edit_at = time.monotonic() + retry_after
+                return
+            if error_code == 400 and "not modified" in str(e):
+                pass
+            elif error_code == 400 and final:
+                # Markdown invalide dans la réponse du modèle: afficher en texte brut
+                await self.bot.edit_message_text(text, self.chat_id, current.message_id, parse_mode="")
+            else:
+                raise
+        self._shown = text
+
+class FakeStreamingModel:
+    """Modèle local qui imite `generate_content(..., stream=True)` de Gemini (tests, benchmarks, développement)."""
+
+    class _Chunk:
+        def __init__(self, text):
+            self.text = text
+
+    def __init__(self, answer=None, chunk_size=40, delay=0.05):
+        self.answer = answer or ("Réponse de test générée localement. " * 30).strip()
+        self.chunk_size = chunk_size
+        self.delay = delay
+
+    def generate_content(self, prompt, stream=False):
+        if not stream:
+            time.sleep(self.delay * max(1, len(self.answer) // self.chunk_size))
+            return self._Chunk(self.answer)
+        return self._stream()
+
+    def _stream(self):
+        for i in range(0, len(self.answer), self.chunk_size):
+            time.sleep(self.delay)
+            yield self._Chunk(self.answer[i:i + self.chunk_size])
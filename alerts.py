@@ -0,0 +1,239 @@
+# alerts.py
+# Alertes de prix (/alert): seuils "above"/"below" par ticker, gardés triés en mémoire (bisect) et stockés dans SQLite.
+# Un nouveau prix ne parcourt que les seuils franchis: les alertes déclenchées sont retirées, donc tous les seuils
+# restants sont du "bon" côté du dernier prix et ceux franchis forment un préfixe (above) ou un suffixe (below).
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from metrics import observe
+
+ALERTS_DB_FILE = os.getenv("ALERTS_DB_FILE", "alerts.sqlite3")
+ALERT_POLL_SECONDS = float(os.getenv("ALERT_POLL_SECONDS", 60))
+ALERT_POLL_BATCH = int(os.getenv("ALERT_POLL_BATCH", 100)) # Tickers par téléchargement groupé
+ALERT_MAX_PER_CHAT = int(os.getenv("ALERT_MAX_PER_CHAT", 20))
+ALERT_DIRECTIONS = ("above", "below")
+
+class AlertStore:
+    """
+    Table `alerts(alert_id, chat_id, ticker, direction, threshold, created_at)`, écrite à chaque changement.
+    En mémoire: les alertes par identifiant et, par ticker et sens, une liste triée de (seuil, alert_id).
+    Une alerte déclenchée n'est supprimée de la table qu'une fois son message envoyé (acknowledge) ;
+    si l'envoi échoue, elle est réarmée (rearm). Un arrêt entre les deux la renvoie au redémarrage.
+    Les suppressions sont décidées par la table (la copie mémoire d'une réplica peut être en retard, voir reload).
+    """
+
+    def __init__(self, path=ALERTS_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._alerts = {} # alert_id -> dict
+        self._thresholds = {} # ticker -> {"above": [(seuil, id), ...], "below": [...]}
+        self._in_flight = {} # alert_id -> alerte déclenchée en cours d'envoi (encore dans la table)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS alerts ("
+                " alert_id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER NOT NULL, ticker TEXT NOT NULL,"
+                " direction TEXT NOT NULL, threshold REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+        self.reload()
+
+    def reload(self):
+        """
+        Relit la table (mode multi-réplicas: alertes créées ou supprimées par les autres réplicas).
+        Les alertes en cours d'envoi ne sont pas réindexées ; celles supprimées entre-temps ne seront pas réarmées.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT alert_id, chat_id, ticker, direction, threshold, created_at FROM alerts").fetchall()
+            self._alerts, self._thresholds = {}, {}
+            stored = set()
+            for alert_id, chat_id, ticker, direction, threshold, created_at in rows:
+                stored.add(alert_id)
+                if alert_id not in self._in_flight:
+                    self._index({"alert_id": alert_id, "chat_id": chat_id, "ticker": ticker, "direction": direction,
+                                 "threshold": threshold, "created_at": created_at})
+            for alert_id in [i for i in self._in_flight if i not in stored]:
+                del self._in_flight[alert_id]
+        return len(self._alerts)
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def _index(self, alert):
+        self._alerts[alert["alert_id"]] = alert
+        sides = self._thresholds.setdefault(alert["ticker"], {direction: [] for direction in ALERT_DIRECTIONS})
+        insort(sides[alert["direction"]], (alert["threshold"], alert["alert_id"]))
+
+    def _unindex(self, alert_id):
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return None
+        sides = self._thresholds[alert["ticker"]]
+        entries = sides[alert["direction"]]
+        position = bisect_left(entries, (alert["threshold"], alert_id))
+        if position < len(entries) and entries[position][1] == alert_id:
+            del entries[position]
+        if not any(sides.values()):
+            del self._thresholds[alert["ticker"]]
+        return alert
+
+    def tickers(self):
+        """Tickers ayant au moins une alerte active (les seuls à interroger à chaque passe)."""
+        with self._lock:
+            return list(self._thresholds)
+
+    def for_chat(self, chat_id):
+        with self._lock:
+            return sorted((a for a in self._alerts.values() if a["chat_id"] == chat_id), key=lambda a: a["alert_id"])
+
+    def add(self, chat_id, ticker, direction, threshold):
+        """Crée l'alerte (une transaction). Retourne l'alerte ; ValueError si le sens est inconnu."""
+        if direction not in ALERT_DIRECTIONS:
+            raise ValueError(f"Sens d'alerte inconnu: {direction}")
+        alert = {"chat_id": chat_id, "ticker": ticker, "direction": direction, "threshold": float(threshold),
+                 "created_at": time.time()}
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO alerts (chat_id, ticker, direction, threshold, created_at) VALUES (?, ?, ?, ?, ?)",
+                (chat_id, ticker, direction, alert["threshold"], alert["created_at"]))
+            alert["alert_id"] = cursor.lastrowid
+            self._index(alert)
+        return alert
+
+    def remove(self, chat_id, alert_id):
+        """Supprime l'alerte `alert_id` si elle appartient à `chat_id`. Retourne True si elle existait (dans la table)."""
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM alerts WHERE alert_id = ? AND chat_id = ?", (alert_id, chat_id)).rowcount
+            alert = self._alerts.get(alert_id) or self._in_flight.get(alert_id)
+            if alert is not None and alert["chat_id"] == chat_id:
+                self._unindex(alert_id)
+                self._in_flight.pop(alert_id, None)
+        return deleted > 0
+
+    def remove_chat(self, chat_id):
+        """Supprime toutes les alertes du chat (ex: bot bloqué). Retourne leur nombre (dans la table)."""
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM alerts WHERE chat_id = ?", (chat_id,)).rowcount
+            for alert_id in [a["alert_id"] for a in (*self._alerts.values(), *self._in_flight.values()) if a["chat_id"] == chat_id]:
+                self._unindex(alert_id)
+                self._in_flight.pop(alert_id, None)
+        return deleted
+
+    def pop_triggered(self, prices):
+        """
+        Alertes déclenchées par `prices` (dict ticker -> prix): "above" si prix >= seuil, "below" si prix <= seuil.
+        Par ticker, deux recherches dichotomiques puis seulement les seuils franchis sont lus.
+        Les alertes déclenchées sont retirées de l'index (plus de nouveau déclenchement) et retournées avec
+        le prix `price` ; elles restent dans la table jusqu'à acknowledge() ou rearm().
+        """
+        triggered = []
+        with self._lock:
+            for ticker, price in prices.items():
+                sides = self._thresholds.get(ticker)
+                if sides is None or price is None:
+                    continue
+                above, below = sides["above"], sides["below"]
+                crossed = above[:bisect_right(above, (price, float("inf")))] + below[bisect_left(below, (price,)):]
+                for _, alert_id in crossed:
+                    alert = self._in_flight[alert_id] = self._unindex(alert_id)
+                    triggered.append({**alert, "price": price})
+        return triggered
+
+    def acknowledge(self, alert_ids):
+        """Alertes déclenchées dont le message est parti: suppression définitive (une transaction). Retourne leur nombre."""
+        with self._lock, self._conn:
+            done = [alert_id for alert_id in alert_ids if self._in_flight.pop(alert_id, None) is not None]
+            if done:
+                self._conn.executemany("DELETE FROM alerts WHERE alert_id = ?", [(alert_id,) for alert_id in done])
+        return len(done)
+
+    def rearm(self, alert_ids):
+        """Alertes déclenchées dont l'envoi a échoué: remises dans l'index, elles seront renvoyées à la passe suivante."""
+        with self._lock:
+            alerts = [alert for alert in (self._in_flight.pop(alert_id, None) for alert_id in alert_ids) if alert is not None]
+            for alert in alerts:
+                self._index(alert)
+        return len(alerts)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def format_alert(alert):
+    sign = "≥" if alert["direction"] == "above" else "≤"
+    return f"#{alert['alert_id']} {alert['ticker']} {sign} {alert['threshold']:g}"
+
+def format_triggered_alerts(alerts):
+    """Message envoyé à un chat pour ses alertes déclenchées lors d'une même passe."""
+    lines = ["🚨 **Alerte(s) de prix**"]
+    for alert in alerts:
+        crossed = "au-dessus de" if alert["direction"] == "above" else "en dessous de"
+        lines.append(f"{alert['ticker']}: {alert['price']:.2f}, {crossed} {alert['threshold']:g} (#{alert['alert_id']})")
+    return "\n".join(lines)
+
+def settle_triggered(store, by_chat, summary):
+    """
+    Suite donnée aux alertes déclenchées selon le résumé d'envoi par chat (format de Broadcaster.send_many):
+    envoyées -> supprimées ; bot bloqué (403) -> toutes les alertes du chat supprimées ;
+    autre échec ou arrêt en cours d'envoi -> réarmées pour la passe suivante.
+    """
+    alert_ids = lambda chat_ids: [alert["alert_id"] for chat_id in chat_ids for alert in by_chat.get(chat_id, [])]
+    sent, forbidden = summary.get("sent", []), summary.get("forbidden", [])
+    store.acknowledge(alert_ids(sent))
+    for chat_id in forbidden: # Bot bloqué: ses autres alertes ne pourront pas être envoyées non plus
+        store.remove_chat(chat_id)
+    settled = set(sent) | set(forbidden)
+    store.rearm(alert_ids([chat_id for chat_id in by_chat if chat_id not in settled]))
+
+def run_alert_poller(store, fetch_quotes, notify, stop_event, interval=None, batch_size=None, is_leader=None):
+    """
+    Boucle du thread des alertes: à chaque passe, interroge par lots l'union des tickers ayant une alerte
+    (`fetch_quotes(tickers)` -> dict ticker -> cotation), puis `notify({chat_id: [alertes], ...})`, qui retourne
+    le résumé d'envoi par chat ({"sent": [...], "forbidden": [...], "failed": [...], ...}, voir settle_triggered).
+    Une cotation périmée (`stale_since`: dernière valeur connue servie faute de téléchargement) ne déclenche rien:
+    l'alerte est évaluée à la passe suivante, sur un prix frais.
+    Mode multi-réplicas (`is_leader` donné): seule la réplica leader fait les passes, chacune après avoir relu la table.
+    """
+    interval = ALERT_POLL_SECONDS if interval is None else interval
+    batch_size = ALERT_POLL_BATCH if batch_size is None else batch_size
+    while not stop_event.is_set():
+        if is_leader is not None:
+            if not is_leader():
+                stop_event.wait(interval)
+                continue
+            store.reload()
+        started = time.monotonic()
+        failed = False
+        by_chat = {}
+        tickers = store.tickers()
+        for start in range(0, len(tickers), batch_size):
+            if stop_event.is_set(): break
+            try:
+                quotes = fetch_quotes(tickers[start:start + batch_size])
+            except Exception as e:
+                print(f"Erreur cotations des alertes: {e}")
+                failed = True
+                continue
+            stale = [t for t, q in quotes.items() if q.get("stale_since")]
+            if stale:
+                failed = True
+                print(f"Alertes: {len(stale)} cotation(s) périmée(s) ignorée(s).")
+            prices = {t: q.get("price") for t, q in quotes.items() if not q.get("stale_since")}
+            for alert in store.pop_triggered(prices):
+                by_chat.setdefault(alert["chat_id"], []).append(alert)
+        if by_chat:
+            try:
+                summary = notify(by_chat)
+            except Exception as e:
+                print(f"Erreur envoi des alertes: {e}")
+                summary = {} # Rien n'est confirmé: tout est réarmé
+            failed = failed or len(summary.get("sent", [])) + len(summary.get("forbidden", [])) < len(by_chat)
+            settle_triggered(store, by_chat, summary)
+        if tickers:
+            observe("job.alerts", time.monotonic() - started, error=failed)
+        stop_event.wait(interval)
+    print("Thread des alertes arrêté.")
@@ -0,0 +1,457 @@
+# benchmark.py
+# Benchmarks hors-ligne: les clients yfinance et Gemini sont remplacés par des doublures locales qui rejouent
+# des payloads enregistrés (ou synthétiques), pour mesurer le coût des chemins du bot sans aucun appel réseau.
+#
+#   python benchmark.py record AAPL MSFT SPY --fixtures fixtures.json   # Enregistrer des payloads réels
+#   python benchmark.py run --sizes 100,1000,10000 --output bench.json  # Mesurer
+#   python benchmark.py run --compare bench.json                        # Comparer à une exécution précédente
+#   python benchmark.py memory --size 5000                              # Mémoire retenue par les classements
+import argparse
+import asyncio
+import copy
+import gc
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+os.environ.setdefault("TELEGRAM_API_KEY", "000000:BENCHMARK") # bot.py exige une clé (jamais utilisée ici)
+os.environ.setdefault("GEMINI_FAKE_MODEL", "1")
+
+import numpy as np
+
+import financial_data
+import price_history
+import rankings
+import screener
+import vectorized_scoring
+from ai_streaming import FakeStreamingModel
+from cache import TTLCache
+from fundamentals_store import FundamentalsStore
+from subscriptions_store import SubscriptionStore
+from ticker_record import TickerRecord
+
+# Payload type utilisé quand aucun fichier de fixtures n'est fourni (champs lus par le scoring et l'affichage)
+DEFAULT_STOCK_PAYLOAD = {
+    "longName": "Benchmark Corp", "shortName": "BENCH", "currency": "USD", "quoteType": "EQUITY",
+    "currentPrice": 150.0, "previousClose": 148.5, "regularMarketChange": 1.5, "regularMarketChangePercent": 0.0101,
+    "dayHigh": 151.2, "dayLow": 147.9, "fiftyTwoWeekHigh": 190.0, "fiftyTwoWeekLow": 120.0,
+    "marketCap": 250_000_000_000, "regularMarketVolume": 12_000_000, "averageVolume": 15_000_000,
+    "trailingPE": 28.0, "forwardPE": 24.0, "profitMargins": 0.21, "revenueGrowth": 0.08, "returnOnEquity": 0.25,
+    "debtToEquity": 1.2, "dividendYield": 0.012, "payoutRatio": 0.3, "beta": 1.1,
+    "sector": "Technology", "industry": "Software", "website": "https://example.com",
+    "longBusinessSummary": "Synthetic company used for offline benchmarks. " * 20,
+    "companyOfficers": [{"name": f"Officer {i}", "title": "Director"} for i in range(10)],
+}
+DEFAULT_ETF_PAYLOAD = {
+    "longName": "Benchmark ETF", "shortName": "BETF", "currency": "USD", "quoteType": "ETF",
+    "regularMarketPrice": 420.0, "previousClose": 418.0, "regularMarketChange": 2.0, "regularMarketChangePercent": 0.0048,
+    "fiveYearAverageReturn": 0.11, "threeYearAverageReturn": 0.09, "annualReportExpenseRatio": 0.002,
+    "longBusinessSummary": "Synthetic ETF used for offline benchmarks. " * 10,
+}
+NUMERIC_JITTER = 0.35 # Variation relative appliquée aux champs numériques des univers synthétiques
+
+# --- Doublures des clients ---
+class FakeTicker:
+    def __init__(self, fake_yf, symbol):
+        self._fake_yf = fake_yf
+        self.ticker = symbol
+
+    @property
+    def info(self):
+        self._fake_yf.calls += 1
+        self._fake_yf.sleep()
+        return self._fake_yf.payload(self.ticker)
+
+    def history(self, period="1d", **kwargs):
+        import pandas as pd
+        self._fake_yf.sleep()
+        price = self._fake_yf.payload(self.ticker).get("previousClose")
+        return pd.DataFrame({"Close": [price]} if price is not None else {"Close": []})
+
+class FakeYFinance:
+    """
+    Remplace le module yfinance: Ticker(...).info et download(...) servis depuis `payloads`
+    (dicts, ou textes JSON décodés à chaque appel comme une réponse réseau).
+    """
+
+    def __init__(self, payloads, latency_ms=0.0):
+        self.payloads = payloads
+        self.latency = latency_ms / 1000.0
+        self.calls = 0
+
+    def sleep(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def payload(self, symbol):
+        """Copie indépendante du payload de `symbol` ({} si inconnu)."""
+        payload = self.payloads.get(symbol, {})
+        return json.loads(payload) if isinstance(payload, str) else copy.deepcopy(payload)
+
+    def Ticker(self, symbol):
+        return FakeTicker(self, symbol)
+
+    def download(self, tickers, **kwargs):
+        import pandas as pd
+        self.calls += 1
+        self.sleep()
+        index = pd.date_range("2024-01-01", periods=2, freq="D")
+        columns = {}
+        for symbol in tickers:
+            payload = self.payload(symbol)
+            if not payload:
+                continue
+            price = payload.get("currentPrice", payload.get("regularMarketPrice"))
+            columns[(symbol, "Close")] = [payload.get("previousClose", price), price]
+        frame = pd.DataFrame(columns, index=index)
+        if columns:
+            frame.columns = pd.MultiIndex.from_tuples(frame.columns)
+        return frame
+
+# --- Univers ---
+def load_fixtures(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def make_synthetic_universe(size, templates, prefix, seed=0):
+    """`size` payloads dérivés des modèles `templates` en perturbant leurs champs numériques."""
+    rng = random.Random(seed)
+    universe = {}
+    for i in range(size):
+        payload = copy.deepcopy(templates[i % len(templates)])
+        for key, value in payload.items():
+            if isinstance(value, float):
+                payload[key] = value * (1 + rng.uniform(-NUMERIC_JITTER, NUMERIC_JITTER))
+            elif rng.random() < 0.03 and key in vectorized_scoring.UNIVERSE_FIELDS:
+                payload[key] = None # Quelques données manquantes, comme en réel
+        universe[f"{prefix}{i:05d}"] = payload
+    return universe
+
+def split_templates(fixtures):
+    etfs = [p for p in fixtures.values() if p.get("quoteType") == "ETF"]
+    stocks = [p for p in fixtures.values() if p.get("quoteType") != "ETF"]
+    return stocks or [DEFAULT_STOCK_PAYLOAD], etfs or [DEFAULT_ETF_PAYLOAD]
+
+def install_universe(fake_yf, stock_payloads, etf_payloads):
+    """Branche la doublure yfinance et l'univers dans financial_data, caches et classements remis à zéro."""
+    financial_data.yf = fake_yf
+    financial_data.ACTION_UNIVERSE = list(stock_payloads)
+    financial_data.ETF_UNIVERSE = list(etf_payloads)
+    total = len(stock_payloads) + len(etf_payloads)
+    financial_data.FETCH_BUDGET = total # Tout rafraîchir lors d'un build froid
+    financial_data.FETCH_BATCH_SIZE = max(financial_data.FETCH_BATCH_SIZE, 200)
+    reset_state(total)
+
+def reset_state(capacity):
+    financial_data._info_cache = TTLCache(max_entries=capacity + 256, ttl=financial_data.PRICE_TTL_SECONDS,
+                                          stale_ttl=financial_data.CACHE_STALE_SECONDS, name="ticker_info",
+                                          on_evict=financial_data._forget_refresh_attempt)
+    # Le cache ne garde que des TickerRecord: /detail lit le payload complet dans le stockage local, comme en production
+    financial_data._fundamentals_store = FundamentalsStore(":memory:")
+    financial_data._quote_cache = TTLCache(max_entries=capacity + 256, ttl=financial_data.PRICE_TTL_SECONDS, name="quotes")
+    financial_data._last_refresh_attempt.clear()
+    rankings._snapshots.clear()
+    screener._snapshot = None
+
+# --- Mesure ---
+def measure(func, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "repeat": repeat, "min_ms": round(timings[0], 3), "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.fmean(timings), 3), "p95_ms": round(timings[max(0, math.ceil(0.95 * len(timings)) - 1)], 3),
+    }
+
+def bench_data_paths(size, stock_payloads, etf_payloads, fake_yf, repeat):
+    results = {}
+    capacity = len(stock_payloads) + len(etf_payloads)
+    infos = list(stock_payloads.items())
+    first_stock = infos[0][0]
+
+    # Premier classement sans snapshot: refetch de l'univers puis construction (chemin du rafraîchisseur ;
+    # les handlers ne construisent jamais depuis le réseau, voir rankings._get_or_build_snapshot)
+    results["refresh_snapshot.cold"] = measure(
+        lambda: rankings.refresh_snapshot("ACTION"), repeat, setup=lambda: reset_state(capacity))
+    results["rebuild_snapshot.warm"] = measure(lambda: rankings.rebuild_snapshot("ACTION"), repeat)
+    results["get_ranking_text.snapshot"] = measure(lambda: rankings.get_ranking_text("ACTION", limit=10), repeat)
+    results["get_quote_list_formatted.cold"] = measure(
+        lambda: financial_data.get_quote_list_formatted("ACTION", limit=10), repeat, setup=lambda: reset_state(capacity))
+    results["get_detailed_stock_data.cold"] = measure(
+        lambda: financial_data.get_detailed_stock_data(first_stock), repeat, setup=lambda: reset_state(capacity))
+    results["get_detailed_stock_data.warm"] = measure(lambda: financial_data.get_detailed_stock_data(first_stock), repeat)
+    financial_data.refresh_stale_tickers(list(stock_payloads) + list(etf_payloads)) # Tout l'univers en cache
+    results["screen.build"] = measure(screener.rebuild_screen_snapshot, repeat)
+    results["screen.query"] = measure(lambda: screener.screen("forwardPE<25 dividendYield>1% sort=-dividendYield"), repeat)
+
+    results["calculate_long_term_stock_score.universe"] = measure(
+        lambda: [financial_data.calculate_long_term_stock_score(info) for _, info in infos], repeat)
+    results["calculate_long_term_etf_score.universe"] = measure(
+        lambda: [financial_data.calculate_long_term_etf_score(info) for info in etf_payloads.values()], repeat)
+    results["score_universe.vectorized_stocks"] = measure(lambda: vectorized_scoring.score_universe(stock_payloads), repeat)
+    results["score_universe.vectorized_etfs"] = measure(lambda: vectorized_scoring.score_universe(etf_payloads, is_etf=True), repeat)
+
+    # Scores historiques sur une matrice de clôtures synthétique (séances x tickers)
+    rng = np.random.default_rng(size)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (price_history.PRICE_HISTORY_DAYS, size)), axis=0))
+    results["compute_history_scores.universe"] = measure(lambda: price_history.compute_history_scores(closes), repeat)
+    return results
+
+def bench_handlers(stock_payloads, repeat):
+    """Corps des handlers de bot.py avec un bot Telegram simulé (aucun envoi réel)."""
+    try:
+        import bot
+    except ImportError as e:
+        return {"skipped": f"bot.py non importable: {e}"}
+
+    async def fake_send(*args, **kwargs):
+        return types.SimpleNamespace(message_id=1)
+    for method in ("reply_to", "send_message", "send_chat_action", "edit_message_text"):
+        setattr(bot.bot, method, fake_send)
+    bot.gemini_model = FakeStreamingModel(delay=0)
+    bot.subscriptions = SubscriptionStore(":memory:")
+    bot.warmup_done.set() # Données déjà installées: pas de préchauffage à attendre
+
+    def message(text):
+        return types.SimpleNamespace(text=text, chat=types.SimpleNamespace(id=1), from_user=types.SimpleNamespace(id=bot.BOT_OWNER_ID))
+
+    first_stock = next(iter(stock_payloads))
+    cases = {
+        "handler.status": (bot.send_status_handler, "/status"),
+        "handler.longterm": (bot.send_longterm_all, "/longterm"),
+        "handler.list": (bot.send_list_all_no_sort, "/list"),
+        "handler.detail": (bot.send_detailed_financial_info_handler, f"/detail {first_stock}"),
+        "handler.officers": (bot.send_officers_info_handler, f"/officers {first_stock}"),
+        "handler.ask": (bot.ask_gemini_handler, "/ask Benchmark question"),
+    }
+    results = {}
+    for name, (handler, text) in cases.items():
+        if name == "handler.ask":
+            setup = lambda: bot.ask_cache.invalidate(bot.normalize_prompt("Benchmark question"))
+        else:
+            setup = None
+        results[name] = measure(lambda: asyncio.run(handler(message(text))), repeat, setup=setup)
+    return results
+
+def run(args):
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else {}
+    stock_templates, etf_templates = split_templates(fixtures)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "latency_ms": args.latency_ms, "repeat": args.repeat,
+            "fixtures": args.fixtures or None,
+        },
+        "results": {},
+    }
+    for size in args.sizes:
+        etf_size = max(1, size // 5)
+        stock_payloads = make_synthetic_universe(size - etf_size, stock_templates, "S", seed=size)
+        etf_payloads = make_synthetic_universe(etf_size, etf_templates, "E", seed=size + 1)
+        fake_yf = FakeYFinance({**stock_payloads, **etf_payloads}, latency_ms=args.latency_ms)
+        install_universe(fake_yf, stock_payloads, etf_payloads)
+        print(f"Univers de {size} tickers...", file=sys.stderr)
+        size_results = bench_data_paths(size, stock_payloads, etf_payloads, fake_yf, args.repeat)
+        if not args.skip_handlers:
+            size_results.update(bench_handlers(stock_payloads, args.repeat))
+        size_results["yfinance_calls"] = fake_yf.calls
+        report["results"][str(size)] = size_results
+    return report
+
+def retained_bytes(build):
+    """Mémoire encore allouée (tracemalloc) une fois `build()` terminé, temporaires libérés."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return retained
+
+def rss_bytes():
+    """RSS courant du processus (Linux: /proc/self/statm) ; à défaut, le pic de RSS (getrusage)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024 # Octets sous macOS, Kio ailleurs
+
+def process_memory(args):
+    """
+    Exécuté dans un processus séparé (voir memory_report): RSS de tout le processus avant et après le
+    rafraîchissement complet de l'univers, suivi des classements et du snapshot /screen, avec un stockage local
+    sur disque comme en production. Mode "payloads": le cache garde le payload `.info` complet (ancien comportement).
+    """
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else {}
+    stock_templates, etf_templates = split_templates(fixtures)
+    etf_size = max(1, args.size // 5)
+    # La doublure garde des textes JSON (compacts) et les décode à chaque fetch: seul le bot retient des dicts
+    stocks = {t: json.dumps(p) for t, p in make_synthetic_universe(args.size - etf_size, stock_templates, "S", seed=args.size).items()}
+    etfs = {t: json.dumps(p) for t, p in make_synthetic_universe(etf_size, etf_templates, "E", seed=args.size + 1).items()}
+    fake_yf = FakeYFinance({**stocks, **etfs})
+    install_universe(fake_yf, stocks, etfs)
+    if args.mode == "payloads":
+        financial_data._load_ticker_record = financial_data._fetch_ticker_info
+    with tempfile.TemporaryDirectory() as tmp:
+        financial_data._fundamentals_store = FundamentalsStore(os.path.join(tmp, "fundamentals.sqlite3"))
+        gc.collect()
+        baseline = rss_bytes()
+        refreshed = financial_data.refresh_stale_tickers(list(stocks) + list(etfs))
+        for item_type in ("ACTION", "ETF"):
+            rankings.rebuild_snapshot(item_type)
+        screener.rebuild_screen_snapshot()
+        gc.collect()
+        after = rss_bytes()
+        financial_data._fundamentals_store.close()
+    return {"mode": args.mode, "size": args.size, "refreshed": refreshed,
+            "rss_baseline_mib": round(baseline / 2 ** 20, 1), "rss_mib": round(after / 2 ** 20, 1),
+            "retained_mib": round((after - baseline) / 2 ** 20, 1),
+            "retained_bytes_per_ticker": round((after - baseline) / args.size)}
+
+def memory_report(args):
+    """
+    Mémoire retenue pour `size` tickers: payloads `.info` complets (ce que gardaient les classements) contre
+    TickerRecord, et entrées de classement avec l'un ou l'autre. Chaque payload est décodé depuis JSON,
+    comme une réponse yfinance: aucune chaîne partagée entre tickers.
+    Puis RSS de tout le processus, cache compris, mesuré dans un processus neuf par mode (voir process_memory).
+    """
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else {}
+    stock_templates, etf_templates = split_templates(fixtures)
+    etf_size = max(1, args.size // 5)
+    payloads = {**make_synthetic_universe(args.size - etf_size, stock_templates, "S", seed=args.size),
+                **make_synthetic_universe(etf_size, etf_templates, "E", seed=args.size + 1)}
+    raw = [(ticker, json.dumps(payload), ticker.startswith("E")) for ticker, payload in payloads.items()]
+    del payloads
+
+    def entry_with_payload(ticker, is_etf, payload):
+        entry = financial_data.get_stock_data_with_score(ticker, is_etf, info=payload)
+        entry["record"] = payload # Ancien format: payload complet gardé par l'entrée (`info_dict`)
+        return entry
+
+    cases = {
+        "payloads": lambda: [json.loads(text) for _, text, _ in raw],
+        "records": lambda: [TickerRecord.from_info(ticker, json.loads(text)) for ticker, text, _ in raw],
+        "entries.full_payload": lambda: [entry_with_payload(ticker, is_etf, json.loads(text)) for ticker, text, is_etf in raw],
+        "entries.record": lambda: [financial_data.get_stock_data_with_score(ticker, is_etf, info=json.loads(text))
+                                   for ticker, text, is_etf in raw],
+    }
+    results = {}
+    for name, build in cases.items():
+        retained = retained_bytes(build)
+        results[name] = {"bytes": retained, "bytes_per_ticker": round(retained / args.size), "mib": round(retained / 2 ** 20, 2)}
+        print(f"{name}: {results[name]['mib']} Mio ({results[name]['bytes_per_ticker']} octets/ticker)", file=sys.stderr)
+    full, compact = results["entries.full_payload"]["bytes"], results["entries.record"]["bytes"]
+
+    process = {}
+    for mode in ("payloads", "records"):
+        command = [sys.executable, os.path.abspath(__file__), "memory-process", "--size", str(args.size), "--mode", mode]
+        if args.fixtures:
+            command += ["--fixtures", args.fixtures]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        process[mode] = json.loads(output)
+        print(f"processus.{mode}: {process[mode]['rss_mib']} Mio "
+              f"(+{process[mode]['retained_mib']} Mio après rafraîchissement de l'univers)", file=sys.stderr)
+    return {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                     "size": args.size, "fixtures": args.fixtures or None},
+            "results": results, "entries_ratio": round(full / compact, 2) if compact else None, "process": process}
+
+def compare(report, baseline, threshold):
+    """Affiche les écarts de médiane par rapport à `baseline`. Retourne le nombre de régressions au-delà de `threshold`."""
+    regressions = 0
+    for size, cases in report["results"].items():
+        for name, current in cases.items():
+            previous = baseline.get("results", {}).get(size, {}).get(name)
+            if not isinstance(current, dict) or not isinstance(previous, dict) or "median_ms" not in current:
+                continue
+            ratio = current["median_ms"] / previous["median_ms"] if previous["median_ms"] else float("inf")
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "  <-- RÉGRESSION"
+                regressions += 1
+            print(f"[{size}] {name}: {previous['median_ms']:.3f} -> {current['median_ms']:.3f} ms (x{ratio:.2f}){flag}", file=sys.stderr)
+    return regressions
+
+def record(args):
+    """Enregistre les payloads `.info` réels des tickers demandés dans le fichier de fixtures."""
+    import yfinance as yf
+    fixtures = load_fixtures(args.fixtures) if os.path.exists(args.fixtures) else {}
+    for symbol in args.tickers:
+        try:
+            fixtures[symbol] = yf.Ticker(symbol).info
+            print(f"{symbol}: {len(fixtures[symbol])} champs", file=sys.stderr)
+        except Exception as e:
+            print(f"{symbol}: erreur {e}", file=sys.stderr)
+    with open(args.fixtures, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f, default=str, indent=1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks hors-ligne du bot financier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Mesurer les chemins de données, le scoring et les handlers.")
+    run_parser.add_argument("--sizes", type=lambda v: [int(x) for x in v.split(",")], default=[100, 1000, 10000])
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--latency-ms", type=float, default=0.0, help="Latence simulée de chaque appel yfinance.")
+    run_parser.add_argument("--fixtures", help="Payloads enregistrés (voir `record`) servant de modèles.")
+    run_parser.add_argument("--skip-handlers", action="store_true")
+    run_parser.add_argument("--output", help="Fichier JSON de résultats (sinon sortie standard).")
+    run_parser.add_argument("--compare", help="Résultats JSON précédents à comparer.")
+    run_parser.add_argument("--threshold", type=float, default=0.2, help="Régression tolérée sur la médiane (0.2 = +20%%).")
+
+    record_parser = sub.add_parser("record", help="Enregistrer des payloads yfinance réels.")
+    record_parser.add_argument("tickers", nargs="+")
+    record_parser.add_argument("--fixtures", default="bench_fixtures.json")
+
+    memory_parser = sub.add_parser("memory", help="Mesurer la mémoire retenue par ticker (payloads vs TickerRecord).")
+    memory_parser.add_argument("--size", type=int, default=5000)
+    memory_parser.add_argument("--fixtures", help="Payloads enregistrés (voir `record`) servant de modèles.")
+
+    # Interne: un processus neuf par mesure de RSS (lancé par `memory`)
+    process_parser = sub.add_parser("memory-process")
+    process_parser.add_argument("--size", type=int, default=5000)
+    process_parser.add_argument("--mode", choices=("payloads", "records"), default="records")
+    process_parser.add_argument("--fixtures")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        record(args)
+        return 0
+    if args.command == "memory":
+        print(json.dumps(memory_report(args), indent=1))
+        return 0
+    if args.command == "memory-process":
+        print(json.dumps(process_memory(args)))
+        return 0
+
+    report = run(args)
+    output = json.dumps(report, indent=1)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.compare:
+        return 1 if compare(report, load_fixtures(args.compare), args.threshold) else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
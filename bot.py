@@ -1,19 +1,53 @@
 # bot.py
-import telebot
-from telebot import apihelper, types # types pour les boutons potentiels futurs
+import startup_report # En premier: origine de la mesure du temps de démarrage
+import asyncio
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+from telebot.asyncio_handler_backends import BaseMiddleware, CancelUpdate
+from telebot import types # types pour les boutons potentiels futurs
 import os
+import math
+import random
 import time
-import schedule
 import threading
+from contextlib import aclosing
 from dotenv import load_dotenv
-import google.generativeai as genai
 import sys # Pour sys.exit()
-import json # Pour la persistance
 
 from financial_data import (
-    get_selected_items_formatted,
     get_detailed_stock_data,
-    get_company_officers
+    get_company_officers,
+    open_fundamentals_store,
+    warm_heavy_modules,
+    flush_fundamentals_store,
+    get_cache_stats,
+    get_quote_list_formatted,
+    get_quotes_batch,
+    get_upstream_status,
+    stale_marker
+)
+from rankings import get_ranking_text, run_ranking_refresher, prime_snapshots_from_cache
+from screener import screen
+from broadcaster import Broadcaster
+from cache import TTLCache
+from price_history import HISTORY_SCORE_TYPES
+from subscriptions_store import SubscriptionStore, SUBSCRIPTIONS_DB_FILE, DIGEST_SECTIONS
+from delivery_scheduler import DeliveryScheduler, DELIVERY_INTERVALS_HOURS, DELIVERY_JITTER_SECONDS, next_delivery_time
+from shared_state import SharedState, ReplicaSet, REPLICA_MODE
+from alerts import (
+    AlertStore, ALERTS_DB_FILE, ALERT_DIRECTIONS, ALERT_MAX_PER_CHAT, format_alert, format_triggered_alerts,
+    run_alert_poller
+)
+from portfolios import (
+    PortfolioStore, PORTFOLIOS_DB_FILE, PORTFOLIO_MAX_TICKERS, format_watchlist, format_portfolio, run_portfolio_refresher
+)
+from ai_streaming import StreamingReply, FakeStreamingModel, stream_model_chunks
+from admission import (
+    ChatAdmission, PriorityGate, COMMAND_CLASSES, command_class, command_priority, current_priority
+)
+from webhook import WebhookServer, WEBHOOK_MODE, WEBHOOK_URL, WEBHOOK_SECRET_TOKEN
+from metrics import (
+    timed, timed_function, instrument_async_method, register_cache_source, format_metrics_summary, start_metrics_server
 )
 
 # --- Configuration & Chargement Clés ---
@@ -21,74 +55,142 @@ load_dotenv()
 TELEGRAM_API_KEY = os.getenv("TELEGRAM_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 BOT_OWNER_ID = int(os.getenv("BOT_OWNER_ID", 0))
+ASK_STREAMING = os.getenv("ASK_STREAMING", "1") == "1" # /ask: réponse affichée au fil de l'eau
+GEMINI_FAKE_MODEL = os.getenv("GEMINI_FAKE_MODEL", "0") == "1" # Modèle local simulé (tests sans Gemini)
 
 if not TELEGRAM_API_KEY:
     print("Erreur: TELEGRAM_API_KEY non trouvé.")
     sys.exit(1)
+if WEBHOOK_MODE and not WEBHOOK_SECRET_TOKEN:
+    print("Erreur: WEBHOOK_MODE=1 exige WEBHOOK_SECRET_TOKEN (en-tête vérifié sur chaque mise à jour reçue).")
+    sys.exit(1)
 
-bot = telebot.TeleBot(TELEGRAM_API_KEY, parse_mode="Markdown")
+bot = AsyncTeleBot(TELEGRAM_API_KEY, parse_mode="Markdown")
+# Durée des appels à l'API Telegram (reply_to inclut son send_message)
+for _method, _stage in (("reply_to", "telegram.reply_to"), ("send_message", "telegram.send_message"),
+                        ("edit_message_text", "telegram.edit_message_text")):
+    instrument_async_method(bot, _method, _stage)
 
 # --- Configuration Gemini ---
+# Configuré au premier usage (ou par le préchauffage): l'import de google.generativeai est lent
 gemini_model = None
-if GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        # Utiliser un modèle rapide pour les réponses interactives
-        gemini_model = genai.GenerativeModel('models/gemini-1.5-flash-latest')
-        print("Modèle Gemini configuré (gemini-1.5-flash-latest).")
-    except Exception as e:
-        print(f"Erreur config Gemini: {e}")
-else:
-    print("Avertissement: GEMINI_API_KEY non configuré. IA désactivée.")
+_gemini_configured = False
+_gemini_lock = threading.Lock()
+
+def get_gemini_model():
+    """Modèle IA (configuré au premier appel), ou None si l'IA n'est pas disponible."""
+    global gemini_model, _gemini_configured
+    with _gemini_lock:
+        if gemini_model is not None or _gemini_configured:
+            return gemini_model
+        _gemini_configured = True
+        if GEMINI_FAKE_MODEL:
+            gemini_model = FakeStreamingModel()
+            print("Modèle IA simulé (GEMINI_FAKE_MODEL=1).")
+        elif GEMINI_API_KEY:
+            try:
+                import google.generativeai as genai
+                genai.configure(api_key=GEMINI_API_KEY)
+                # Utiliser un modèle rapide pour les réponses interactives
+                gemini_model = genai.GenerativeModel('models/gemini-1.5-flash-latest')
+                print("Modèle Gemini configuré (gemini-1.5-flash-latest).")
+            except Exception as e:
+                print(f"Erreur config Gemini: {e}")
+        else:
+            print("Avertissement: GEMINI_API_KEY non configuré. IA désactivée.")
+        return gemini_model
 
 # --- Persistance des Abonnements ---
-subscribed_chats = set()
-PERSISTENCE_FILE = "subscribed_chats.json"
+# SQLite: chaque (dés)abonnement est écrit immédiatement et atomiquement (voir subscriptions_store.py)
+subscriptions = None # SubscriptionStore, ouvert par load_subscriptions()
 
-def load_subscriptions():
-    global subscribed_chats
-    if os.path.exists(PERSISTENCE_FILE):
-        try:
-            with open(PERSISTENCE_FILE, 'r') as f:
-                subscribed_chats = set(json.load(f))
-            print(f"Abonnements chargés: {len(subscribed_chats)}.")
-        except json.JSONDecodeError:
-            print(f"Erreur décodage JSON dans {PERSISTENCE_FILE}. Fichier ignoré/sera écrasé.")
-            subscribed_chats = set()
-        except Exception as e:
-            print(f"Erreur chargement abonnements: {e}")
-    else:
-        print("Aucun fichier d'abonnements trouvé. Démarrage avec une liste vide.")
+def load_subscriptions(path=SUBSCRIPTIONS_DB_FILE):
+    global subscriptions
+    subscriptions = SubscriptionStore(path)
+    migrated = subscriptions.migrate_json()
+    if migrated:
+        print(f"{migrated} abonnement(s) migré(s) depuis l'ancien fichier JSON.")
+    print(f"Abonnements chargés: {len(subscriptions)}.")
 
-def save_subscriptions():
-    try:
-        with open(PERSISTENCE_FILE, 'w') as f:
-            json.dump(list(subscribed_chats), f)
-    except Exception as e:
-        print(f"Erreur sauvegarde abonnements: {e}")
+# --- Persistance des Alertes de prix ---
+# Même principe: SQLite, une transaction par création/suppression (voir alerts.py)
+alerts = None # AlertStore, ouvert par load_alerts()
+
+def load_alerts(path=ALERTS_DB_FILE):
+    global alerts
+    alerts = AlertStore(path)
+    print(f"Alertes de prix chargées: {len(alerts)}.")
+
+# --- Persistance des Listes de suivi et Portefeuilles ---
+portfolio_store = None # PortfolioStore, ouvert par load_portfolios()
+
+def load_portfolios(path=PORTFOLIOS_DB_FILE):
+    global portfolio_store
+    portfolio_store = PortfolioStore(path)
+    print(f"Listes de suivi et portefeuilles chargés: {len(portfolio_store.tickers())} symbole(s) suivi(s).")
+
+# --- Mode multi-réplicas (REPLICA_MODE=1) ---
+# Les réplicas partagent les bases SQLite (abonnements, fondamentaux, état partagé): chacune envoie les infos
+# périodiques de sa part des abonnés et refetch sa part des tickers ; le leader publie les classements.
+replicas = None # ReplicaSet, créé par load_replicas()
+
+def load_replicas():
+    global replicas
+    if not REPLICA_MODE:
+        return
+    replicas = ReplicaSet(SharedState())
+    replicas.heartbeat()
+    if not WEBHOOK_MODE:
+        print("Avertissement: REPLICA_MODE sans WEBHOOK_MODE, le polling Telegram n'accepte qu'un seul processus.")
+
+def owns_chat(chat_id):
+    return replicas is None or replicas.owns(chat_id)
 
 # --- Contrôle d'Arrêt du Bot ---
 stop_event = threading.Event() # Pour signaler l'arrêt propre
+bot_loop = None # Boucle asyncio du bot (définie au démarrage)
+polling_task = None # Tâche de polling (ou du serveur webhook), annulée par /stop
+webhook_server = None # WebhookServer en mode webhook
+
+# --- Travail bloquant (yfinance, Gemini) hors de la boucle asyncio ---
+# Chaque type de travail a sa propre limite de concurrence: une rafale de /ask ou /longterm
+# n'empêche jamais /status ou /help de répondre. Les places libérées vont d'abord aux commandes
+# les moins coûteuses (ex: /detail avant /longterm), voir admission.py.
+COMMAND_CONCURRENCY = {
+    "data": int(os.getenv("CONCURRENCY_DATA", 4)), # /longterm*, /list, /detail, /officers, /screen
+    "ai": int(os.getenv("CONCURRENCY_AI", 2)),     # /ask
+}
+_command_gates = {name: PriorityGate(limit) for name, limit in COMMAND_CONCURRENCY.items()}
+
+async def run_blocking(work_type, func, *args, **kwargs):
+    """Exécute `func` dans un thread de l'executor, en respectant la limite de son type de travail."""
+    async with _command_gates[work_type]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+def run_on_bot_loop(coro, timeout=60):
+    """Depuis un thread (planificateur...), exécute une coroutine du bot sur sa boucle et attend le résultat."""
+    return asyncio.run_coroutine_threadsafe(coro, bot_loop).result(timeout)
 
 # --- Décorateur pour restreindre aux propriétaires ---
 def owner_only(func):
-    def wrapper(message):
+    async def wrapper(message):
         if BOT_OWNER_ID == 0: # Si non configuré, ne pas restreindre pour dev facile
              print("BOT_OWNER_ID non configuré. Commande non restreinte.")
         elif message.from_user.id != BOT_OWNER_ID:
-            bot.reply_to(message, "🚫 Commande réservée au propriétaire du bot.")
+            await bot.reply_to(message, "🚫 Commande réservée au propriétaire du bot.")
             return
-        return func(message)
+        return await func(message)
     return wrapper
 
 # --- Helper Function for simulated clear ---
-def simulate_clear_chat_and_welcome(message):
+async def simulate_clear_chat_and_welcome(message):
     """
     Simule un nettoyage du chat en envoyant des lignes vides,
     puis renvoie le message de bienvenue.
     """
     chat_id = message.chat.id
-    bot.send_chat_action(chat_id, 'typing') # Indiquer une action
+    await bot.send_chat_action(chat_id, 'typing') # Indiquer une action
 
     # Envoyer un message de "nettoyage"
     # Vous pouvez ajuster le nombre de lignes vides.
@@ -109,15 +211,15 @@ def simulate_clear_chat_and_welcome(message):
         # bot.delete_message(chat_id, message.message_id)
         
         # Envoyer le message de "nettoyage"
-        # msg_to_delete = bot.send_message(chat_id, "🧹 Nettoyage de l'affichage...")
+        # msg_to_delete = await bot.send_message(chat_id, "🧹 Nettoyage de l'affichage...")
         # time.sleep(0.5) # Petit délai
         # bot.delete_message(chat_id, msg_to_delete.message_id) # Supprimer notre propre message de nettoyage
                                                             # pour que ce soit plus propre.
                                                             # Fonctionne car c'est notre message récent.
         
         # Alternative plus simple: juste envoyer les sauts de ligne
-        bot.send_message(chat_id, "🧹") # Un emoji pour marquer le "clear"
-        bot.send_message(chat_id, "\n" * 30,disable_notification=True) # Beaucoup de sauts de ligne
+        await bot.send_message(chat_id, "🧹") # Un emoji pour marquer le "clear"
+        await bot.send_message(chat_id, "\n" * 30,disable_notification=True) # Beaucoup de sauts de ligne
                                                                   # disable_notification pour être discret
 
     except Exception as e:
@@ -125,16 +227,16 @@ def simulate_clear_chat_and_welcome(message):
         # Continuer même si la suppression ou l'envoi du message de nettoyage échoue
 
     # Renvoyer le message de bienvenue
-    send_welcome(message, is_clear_command=True) # Passer un flag pour ajuster la réponse si besoin
+    await send_welcome(message, is_clear_command=True) # Passer un flag pour ajuster la réponse si besoin
 
 
 # --- Commandes du Bot ---
 @bot.message_handler(commands=['start', 'help'])
-def send_welcome_handler(message): # Renommer pour éviter conflit de nom si appelé directement
-    send_welcome(message, is_clear_command=False)
+async def send_welcome_handler(message): # Renommer pour éviter conflit de nom si appelé directement
+    await send_welcome(message, is_clear_command=False)
 
 # Cette fonction sera maintenant appelée par /start, /help ET /clear (via simulate_clear_chat_and_welcome)
-def send_welcome(message, is_clear_command=False): # Ajout du paramètre is_clear_command
+async def send_welcome(message, is_clear_command=False): # Ajout du paramètre is_clear_command
     global BOT_OWNER_ID # Si vous définissez un owner_id
     if BOT_OWNER_ID == 0 and message.from_user.id and not is_clear_command: # Enregistrer l'ID du premier utilisateur comme propriétaire potentiel
         print(f"Conseil: Pour la commande /stop, définissez BOT_OWNER_ID={message.from_user.id} dans votre .env")
@@ -151,11 +253,17 @@ def send_welcome(message, is_clear_command=False): # Ajout du paramètre is_clea
         "/longterm : ETFs & Actions triés par Score Potentiel LT.\n"
         "/longtermetf : ETFs triés par Score Potentiel LT.\n"
         "/longtermact : Actions triées par Score Potentiel LT.\n"
+        "/momentum, /volatility, /drawdown, /sharpe : Classements sur l'historique des cours (1 an).\n"
         "\n/list : Listes sélectionnées (non triées par score).\n"
         "/detail `<TICKER>` : Infos détaillées (ex: `/detail AAPL`).\n"
         "/officers `<TICKER>` : Dirigeants (ex: `/officers MSFT`).\n"
-        "\n/info : S'abonner/Se désabonner aux màj (12h).\n"
+        "/screen `<filtres>` : Filtre l'univers (ex: `/screen forwardPE<20 dividendYield>2% sector=Technology`).\n"
+        "\n/info : S'abonner/Se désabonner aux màj (12h par défaut).\n"
         "/status : Statut de l'abonnement.\n"
+        "/digest : Contenu des infos périodiques (listes, nombre de lignes, classement).\n"
+        "/watch `[TICKER]` : Liste de suivi (ajoute/retire un symbole, ou l'affiche).\n"
+        "/portfolio `[add <TICKER> <quantité> [prix de revient]|del <TICKER>]` : Portefeuille (valeur, P&L du jour, score LT).\n"
+        "/alert `<TICKER> above|below <prix>` : Alerte de prix (`/alert` pour la liste, `/alert del <n°>` pour supprimer).\n"
         "/ask `<question>` : Question à l'IA (Gemini).\n"
         "/clear : Réinitialise l'affichage et montre ce message.\n" # Ajout de /clear ici
         f"\n{disclaimer_lt_score}"
@@ -168,42 +276,45 @@ def send_welcome(message, is_clear_command=False): # Ajout du paramètre is_clea
     # Utiliser bot.send_message au lieu de bot.reply_to pour /clear,
     # car le message original /clear pourrait être "loin" en haut.
     if is_clear_command:
-        bot.send_message(message.chat.id, full_welcome_text)
+        await bot.send_message(message.chat.id, full_welcome_text)
     else:
-        bot.reply_to(message, full_welcome_text)
+        await bot.reply_to(message, full_welcome_text)
 
 @bot.message_handler(commands=['clear'])
-def handle_clear_command(message):
-    bot.send_chat_action(message.chat.id, 'typing')
-    simulate_clear_chat_and_welcome(message)
+async def handle_clear_command(message):
+    await bot.send_chat_action(message.chat.id, 'typing')
+    await simulate_clear_chat_and_welcome(message)
 
 @bot.message_handler(commands=['stop'])
 @owner_only # Restreint cette commande
-def stop_bot_command(message):
-    bot.send_chat_action(message.chat.id, 'typing')
-    bot.reply_to(message, "⏳ Arrêt du bot en cours...")
+async def stop_bot_command(message):
+    await bot.send_chat_action(message.chat.id, 'typing')
+    await bot.reply_to(message, "⏳ Arrêt du bot en cours...")
     print(f"Arrêt du bot initié par le propriétaire (ID: {message.from_user.id}).")
-    stop_event.set() # Signale aux threads (scheduler) de s'arrêter
+    delivery_scheduler.stop() # Signale aux threads (planificateur...) de s'arrêter
     
-    # Arrêter le polling de Telebot
-    # Cela peut prendre quelques secondes pour que le thread de polling se termine
-    bot.stop_polling()
+    # Arrêter le polling de Telebot: annuler la tâche de polling termine asyncio.run() dans le __main__
+    if polling_task is not None:
+        polling_task.cancel()
     print("Polling de Telebot arrêté.")
 
     # Il n'est généralement pas nécessaire de faire os._exit(0) si les threads sont bien gérés (daemon=True)
-    # et que le thread principal (celui de infinity_polling) se termine.
-    # La boucle principale du script se terminera après que bot.stop_polling() ait fait effet.
+    # et que la boucle principale se termine.
 
-def send_financial_list(message, item_type=None, sort_by_score=True, score_type="long_term", limit=7):
-    """Fonction helper pour envoyer les listes financières."""
-    bot.send_chat_action(message.chat.id, 'typing')
+async def send_financial_list(message, item_type=None, sort_by_score=True, score_type="long_term", limit=7):
+    """Fonction helper pour envoyer les listes financières (lues depuis les classements en mémoire)."""
+    await bot.send_chat_action(message.chat.id, 'typing')
+    if not warmup_done.is_set(): # Juste après le démarrage: attendre les classements rechargés plutôt que tout refetcher
+        await asyncio.get_running_loop().run_in_executor(None, warmup_done.wait, STARTUP_WARMUP_TIMEOUT)
     
     text_parts = []
-    if item_type is None or item_type.upper() == "ETF":
-        text_parts.append(get_selected_items_formatted(item_type="ETF", limit=limit, sort_by_score=sort_by_score, score_type=score_type))
-    
-    if item_type is None or item_type.upper() == "ACTION":
-        text_parts.append(get_selected_items_formatted(item_type="ACTION", limit=limit, sort_by_score=sort_by_score, score_type=score_type))
+    for part_type in ("ETF", "ACTION"):
+        if item_type is not None and item_type.upper() != part_type:
+            continue
+        if sort_by_score:
+            text_parts.append(await run_blocking("data", get_ranking_text, item_type=part_type, limit=limit, sort_by_score=sort_by_score, score_type=score_type))
+        else: # Pas de score à afficher: cotations légères en un seul appel groupé
+            text_parts.append(await run_blocking("data", get_quote_list_formatted, item_type=part_type, limit=limit))
     
     full_text = "\n\n".join(text_parts)
     
@@ -214,56 +325,63 @@ def send_financial_list(message, item_type=None, sort_by_score=True, score_type=
     try:
         # Gérer les messages trop longs en les divisant
         if len(full_text) > 4096:
-            bot.reply_to(message, "Les informations combinées sont très longues.")
+            await bot.reply_to(message, "Les informations combinées sont très longues.")
             if item_type is None: # Si on demandait les deux
-                bot.send_message(message.chat.id, text_parts[0] + (disclaimer_lt_score if sort_by_score and score_type == "long_term" else ""))
-                time.sleep(0.5) # Petit délai
-                bot.send_message(message.chat.id, text_parts[1] + (disclaimer_lt_score if sort_by_score and score_type == "long_term" else ""))
+                await bot.send_message(message.chat.id, text_parts[0] + (disclaimer_lt_score if sort_by_score and score_type == "long_term" else ""))
+                await asyncio.sleep(0.5) # Petit délai
+                await bot.send_message(message.chat.id, text_parts[1] + (disclaimer_lt_score if sort_by_score and score_type == "long_term" else ""))
             else: # Si on demandait un seul type mais qu'il est trop long (peu probable avec limit=7)
-                 bot.send_message(message.chat.id, "Informations trop longues, affichage partiel.")
+                 await bot.send_message(message.chat.id, "Informations trop longues, affichage partiel.")
         else:
-            bot.reply_to(message, full_text)
-    except apihelper.ApiTelegramException as e:
+            await bot.reply_to(message, full_text)
+    except ApiTelegramException as e:
         print(f"Erreur API Telegram (send_financial_list): {e}")
-        bot.reply_to(message, "Une erreur est survenue lors de l'affichage des listes.")
+        await bot.reply_to(message, "Une erreur est survenue lors de l'affichage des listes.")
 
 @bot.message_handler(commands=['longterm'])
-def send_longterm_all(message):
-    send_financial_list(message, item_type=None, sort_by_score=True, score_type="long_term", limit=7)
+async def send_longterm_all(message):
+    await send_financial_list(message, item_type=None, sort_by_score=True, score_type="long_term", limit=7)
 
 @bot.message_handler(commands=['longtermetf'])
-def send_longterm_etf(message):
-    send_financial_list(message, item_type="ETF", sort_by_score=True, score_type="long_term", limit=10)
+async def send_longterm_etf(message):
+    await send_financial_list(message, item_type="ETF", sort_by_score=True, score_type="long_term", limit=10)
 
 @bot.message_handler(commands=['longtermact'])
-def send_longterm_action(message):
-    send_financial_list(message, item_type="ACTION", sort_by_score=True, score_type="long_term", limit=10)
+async def send_longterm_action(message):
+    await send_financial_list(message, item_type="ACTION", sort_by_score=True, score_type="long_term", limit=10)
+
+@bot.message_handler(commands=list(HISTORY_SCORE_TYPES)) # /momentum, /volatility, /drawdown, /sharpe
+async def send_history_ranking(message):
+    score_type = message.text.split()[0].lstrip('/').split('@')[0].lower()
+    await send_financial_list(message, item_type=None, sort_by_score=True, score_type=score_type, limit=7)
 
 @bot.message_handler(commands=['list']) # Listes non triées par score
-def send_list_all_no_sort(message):
-    send_financial_list(message, item_type=None, sort_by_score=False, limit=10)
+async def send_list_all_no_sort(message):
+    await send_financial_list(message, item_type=None, sort_by_score=False, limit=10)
 
 # --- Handlers /detail, /officers, /info, /status, /ask (globalement inchangés) ---
 @bot.message_handler(commands=['detail'])
-def send_detailed_financial_info_handler(message):
+async def send_detailed_financial_info_handler(message):
     try:
         parts = message.text.split(maxsplit=1)
         if len(parts) < 2 or not parts[1].strip():
-            bot.reply_to(message, "Usage: `/detail <TICKER>`")
+            await bot.reply_to(message, "Usage: `/detail <TICKER>`")
             return
         ticker_symbol = parts[1].strip().upper()
     except IndexError:
-        bot.reply_to(message, "Format incorrect. Usage: `/detail <TICKER>`")
+        await bot.reply_to(message, "Format incorrect. Usage: `/detail <TICKER>`")
         return
 
-    bot.send_chat_action(message.chat.id, 'typing')
-    data = get_detailed_stock_data(ticker_symbol)
+    await bot.send_chat_action(message.chat.id, 'typing')
+    data = await run_blocking("data", get_detailed_stock_data, ticker_symbol)
 
     if data.get("error"):
-        bot.reply_to(message, data["error"])
+        await bot.reply_to(message, data["error"])
         return
 
     response_parts = [f"🔍 **Détails pour {data.get('shortName', ticker_symbol)} ({ticker_symbol})**\n"]
+    if data.get("stale_since"): # Yahoo indisponible: dernière valeur connue
+        response_parts.append(f"Yahoo Finance ne répond pas,{stale_marker(data['stale_since'])}\n")
     def add_info(label, value, is_price=False, is_percent=False, is_large_number=False):
         if value is not None and str(value).strip() != "":
             val_str = str(value)
@@ -292,53 +410,270 @@ def send_detailed_financial_info_handler(message):
         if len(summary) > 1000: response_text += "..."
 
     if len(response_text) > 4096:
-        bot.reply_to(message, "Infos trop longues. Affichage des principaux éléments:\n" + "".join(response_parts[:8]))
+        await bot.reply_to(message, "Infos trop longues. Affichage des principaux éléments:\n" + "".join(response_parts[:8]))
     else:
-        bot.reply_to(message, response_text)
+        await bot.reply_to(message, response_text)
 
 @bot.message_handler(commands=['officers'])
-def send_officers_info_handler(message):
+async def send_officers_info_handler(message):
     try:
         parts = message.text.split(maxsplit=1)
         if len(parts) < 2 or not parts[1].strip():
-            bot.reply_to(message, "Usage: `/officers <TICKER>`")
+            await bot.reply_to(message, "Usage: `/officers <TICKER>`")
             return
         ticker_symbol = parts[1].strip().upper()
     except IndexError:
-        bot.reply_to(message, "Format incorrect. Usage: `/officers <TICKER>`")
+        await bot.reply_to(message, "Format incorrect. Usage: `/officers <TICKER>`")
         return
-    bot.send_chat_action(message.chat.id, 'typing')
-    bot.reply_to(message, get_company_officers(ticker_symbol))
+    await bot.send_chat_action(message.chat.id, 'typing')
+    await bot.reply_to(message, await run_blocking("data", get_company_officers, ticker_symbol))
+
+@bot.message_handler(commands=['screen'])
+async def screen_handler(message):
+    """/screen [filtres] [sort=champ] [page=N] : filtre et trie tout l'univers depuis le snapshot en colonnes."""
+    parts = message.text.split(maxsplit=1)
+    if not warmup_done.is_set(): # Juste après le démarrage: attendre le cache rechargé
+        await asyncio.get_running_loop().run_in_executor(None, warmup_done.wait, STARTUP_WARMUP_TIMEOUT)
+    await bot.reply_to(message, await run_blocking("data", screen, parts[1] if len(parts) > 1 else ""))
 
 @bot.message_handler(commands=['info'])
-def toggle_info_subscription_handler(message):
+async def toggle_info_subscription_handler(message):
     chat_id = message.chat.id
-    if chat_id in subscribed_chats:
-        subscribed_chats.remove(chat_id)
-        bot.reply_to(message, "✅ Désabonné des infos périodiques.")
+    if subscriptions.toggle(chat_id):
+        preferences = schedule_chat_delivery(chat_id)
+        await bot.reply_to(message, f"✅ Abonné aux infos périodiques (toutes les {preferences['delivery_interval_hours']}h)! Personnalisation: /digest")
     else:
-        subscribed_chats.add(chat_id)
-        bot.reply_to(message, "✅ Abonné aux infos périodiques (toutes les 12h)!")
-    save_subscriptions()
+        delivery_scheduler.cancel(chat_id)
+        await bot.reply_to(message, "✅ Désabonné des infos périodiques.")
 
 @bot.message_handler(commands=['status'])
-def send_status_handler(message):
-    status_msg = "✅ Abonné aux infos périodiques." if message.chat.id in subscribed_chats else "❌ Non abonné. Utilisez /info."
-    bot.reply_to(message, status_msg)
+async def send_status_handler(message):
+    status_msg = "✅ Abonné aux infos périodiques." if message.chat.id in subscriptions else "❌ Non abonné. Utilisez /info."
+    await bot.reply_to(message, status_msg)
+
+DIGEST_SCORE_TYPES = ("long_term", *HISTORY_SCORE_TYPES)
+DIGEST_MAX_LIMIT = 15
+
+def describe_digest_preferences(preferences):
+    sections = " + ".join("ETFs" if s == "ETF" else "Actions" for s in preferences["digest_sections"].split(","))
+    when = f"toutes les {preferences['delivery_interval_hours']}h"
+    if preferences["delivery_time"]:
+        when += f" à partir de {preferences['delivery_time']}"
+    return f"{sections}, {preferences['digest_limit']} lignes par liste, classement `{preferences['digest_score_type']}`, {when}"
+
+def schedule_chat_delivery(chat_id):
+    """(Re)programme le prochain envoi du chat selon ses préférences et l'enregistre. Retourne les préférences."""
+    preferences = subscriptions.get_preferences(chat_id)
+    if owns_chat(chat_id):
+        due_at, nominal = delivery_scheduler.schedule(chat_id, preferences["delivery_interval_hours"], preferences["delivery_time"])
+    else: # Chat d'une autre réplica: elle reprendra l'échéance enregistrée à sa prochaine synchronisation
+        nominal = next_delivery_time(time.time(), preferences["delivery_interval_hours"], preferences["delivery_time"])
+        due_at = nominal + random.uniform(0, DELIVERY_JITTER_SECONDS)
+    subscriptions.set_next_deliveries([(chat_id, due_at, nominal)])
+    return preferences
+
+def parse_delivery_time(value):
+    """'8:30' -> '08:30' ; None si ce n'est pas une heure valide."""
+    hour, _, minute = value.partition(":")
+    if not (hour.isdigit() and minute.isdigit() and len(minute) == 2):
+        return None
+    if int(hour) > 23 or int(minute) > 59:
+        return None
+    return f"{int(hour):02d}:{minute}"
+
+@bot.message_handler(commands=['digest'])
+async def digest_preferences_handler(message):
+    """/digest [etf|action|all] [limite] [type de score] [HH:MM|libre] [6h|12h|24h|168h] : infos périodiques de ce chat."""
+    updates = {}
+    for arg in message.text.split()[1:]:
+        value = arg.lower()
+        if value.endswith("h") and value[:-1].isdigit() and int(value[:-1]) in DELIVERY_INTERVALS_HOURS:
+            updates["delivery_interval_hours"] = int(value[:-1])
+        elif value == "libre":
+            updates["delivery_time"] = None
+        elif parse_delivery_time(value):
+            updates["delivery_time"] = parse_delivery_time(value)
+        elif value in ("etf", "action", "all"):
+            updates["digest_sections"] = ",".join(DIGEST_SECTIONS) if value == "all" else value.upper()
+        elif value.isdigit() and 1 <= int(value) <= DIGEST_MAX_LIMIT:
+            updates["digest_limit"] = int(value)
+        elif value in DIGEST_SCORE_TYPES:
+            updates["digest_score_type"] = value
+        else:
+            intervals = "|".join(f"{h}h" for h in DELIVERY_INTERVALS_HOURS)
+            await bot.reply_to(message, f"Usage: `/digest [etf|action|all] [1-{DIGEST_MAX_LIMIT}] [{'|'.join(DIGEST_SCORE_TYPES)}] [HH:MM|libre] [{intervals}]`")
+            return
+    if updates:
+        preferences = subscriptions.set_preferences(message.chat.id, **updates)
+        if message.chat.id in subscriptions and {"delivery_interval_hours", "delivery_time"} & set(updates):
+            schedule_chat_delivery(message.chat.id)
+        await bot.reply_to(message, f"✅ Infos périodiques: {describe_digest_preferences(preferences)}.")
+    else:
+        preferences = subscriptions.get_preferences(message.chat.id)
+        await bot.reply_to(message, f"Infos périodiques: {describe_digest_preferences(preferences)}.")
+
+ALERT_USAGE = "Usage: `/alert <TICKER> above|below <prix>`, `/alert` (liste) ou `/alert del <n°>`"
+
+@bot.message_handler(commands=['alert'])
+async def price_alert_handler(message):
+    """/alert <TICKER> above|below <prix> : crée une alerte ; /alert : liste ; /alert del <n°> : supprime."""
+    chat_id = message.chat.id
+    args = message.text.split()[1:]
+    if not args:
+        chat_alerts = alerts.for_chat(chat_id)
+        if not chat_alerts:
+            await bot.reply_to(message, f"Aucune alerte de prix active.\n{ALERT_USAGE}")
+            return
+        await bot.reply_to(message, "🔔 **Alertes actives**\n" + "\n".join(format_alert(a) for a in chat_alerts))
+        return
+    if args[0].lower() == "del" and len(args) == 2:
+        alert_id = args[1].lstrip("#")
+        if alert_id.isdigit() and alerts.remove(chat_id, int(alert_id)):
+            await bot.reply_to(message, f"✅ Alerte #{alert_id} supprimée.")
+        else:
+            await bot.reply_to(message, f"Alerte #{alert_id} introuvable.")
+        return
+    try:
+        ticker_symbol, direction, threshold = args[0].upper(), args[1].lower(), float(args[2].replace(",", "."))
+    except (IndexError, ValueError):
+        await bot.reply_to(message, ALERT_USAGE)
+        return
+    if direction not in ALERT_DIRECTIONS or len(args) != 3 or threshold <= 0:
+        await bot.reply_to(message, ALERT_USAGE)
+        return
+    if len(alerts.for_chat(chat_id)) >= ALERT_MAX_PER_CHAT:
+        await bot.reply_to(message, f"Limite de {ALERT_MAX_PER_CHAT} alertes atteinte. Supprimez-en avec `/alert del <n°>`.")
+        return
+    quote = (await run_blocking("data", get_quotes_batch, [ticker_symbol])).get(ticker_symbol)
+    if quote is None:
+        await bot.reply_to(message, f"Aucune cotation trouvée pour {ticker_symbol}.")
+        return
+    price = quote["price"]
+    if (price >= threshold) if direction == "above" else (price <= threshold):
+        await bot.reply_to(message, f"{ticker_symbol} cote déjà {price:.2f}: condition remplie, alerte non créée.")
+        return
+    alert = alerts.add(chat_id, ticker_symbol, direction, threshold)
+    await bot.reply_to(message, f"✅ Alerte créée: {format_alert(alert)} (cours actuel {price:.2f}).")
+
+async def has_quote(ticker_symbol):
+    return ticker_symbol in await run_blocking("data", get_quotes_batch, [ticker_symbol])
+
+@bot.message_handler(commands=['watch'])
+async def watchlist_handler(message):
+    """/watch : affiche la liste de suivi ; /watch <TICKER> : ajoute ou retire le symbole."""
+    chat_id = message.chat.id
+    args = message.text.split()[1:]
+    if not args:
+        tickers = portfolio_store.watchlist(chat_id)
+        if not tickers:
+            await bot.reply_to(message, "Liste de suivi vide. Ajoutez un symbole avec `/watch <TICKER>`.")
+            return
+        await bot.send_chat_action(chat_id, 'typing')
+        await bot.reply_to(message, await run_blocking("data", format_watchlist, tickers))
+        return
+    ticker_symbol = args[0].upper()
+    watched = portfolio_store.watchlist(chat_id)
+    if ticker_symbol not in watched:
+        if len(watched) >= PORTFOLIO_MAX_TICKERS:
+            await bot.reply_to(message, f"Limite de {PORTFOLIO_MAX_TICKERS} symboles suivis atteinte.")
+            return
+        if not await has_quote(ticker_symbol):
+            await bot.reply_to(message, f"Aucune cotation trouvée pour {ticker_symbol}.")
+            return
+    if portfolio_store.toggle_watch(chat_id, ticker_symbol):
+        await bot.reply_to(message, f"✅ {ticker_symbol} ajouté à la liste de suivi.")
+    else:
+        await bot.reply_to(message, f"✅ {ticker_symbol} retiré de la liste de suivi.")
+
+PORTFOLIO_USAGE = "Usage: `/portfolio`, `/portfolio add <TICKER> <quantité> [prix de revient]` ou `/portfolio del <TICKER>`"
+
+@bot.message_handler(commands=['portfolio'])
+async def portfolio_handler(message):
+    """/portfolio : valorisation ; /portfolio add <TICKER> <quantité> [prix de revient] ; /portfolio del <TICKER>."""
+    chat_id = message.chat.id
+    args = message.text.split()[1:]
+    if not args:
+        positions = portfolio_store.positions(chat_id)
+        if not positions:
+            await bot.reply_to(message, f"Portefeuille vide.\n{PORTFOLIO_USAGE}")
+            return
+        await bot.send_chat_action(chat_id, 'typing')
+        await bot.reply_to(message, await run_blocking("data", format_portfolio, positions))
+        return
+    action = args[0].lower()
+    if action == "del" and len(args) == 2:
+        ticker_symbol = args[1].upper()
+        if portfolio_store.remove_position(chat_id, ticker_symbol):
+            await bot.reply_to(message, f"✅ Position {ticker_symbol} supprimée.")
+        else:
+            await bot.reply_to(message, f"Aucune position {ticker_symbol}.")
+        return
+    if action != "add" or len(args) not in (3, 4):
+        await bot.reply_to(message, PORTFOLIO_USAGE)
+        return
+    try:
+        ticker_symbol = args[1].upper()
+        quantity = float(args[2].replace(",", "."))
+        cost_basis = float(args[3].replace(",", ".")) if len(args) == 4 else None
+    except ValueError:
+        await bot.reply_to(message, PORTFOLIO_USAGE)
+        return
+    if quantity <= 0 or (cost_basis is not None and cost_basis < 0):
+        await bot.reply_to(message, PORTFOLIO_USAGE)
+        return
+    held = {t for t, _, _ in portfolio_store.positions(chat_id)}
+    if ticker_symbol not in held:
+        if len(held) >= PORTFOLIO_MAX_TICKERS:
+            await bot.reply_to(message, f"Limite de {PORTFOLIO_MAX_TICKERS} positions atteinte.")
+            return
+        if not await has_quote(ticker_symbol):
+            await bot.reply_to(message, f"Aucune cotation trouvée pour {ticker_symbol}.")
+            return
+    portfolio_store.set_position(chat_id, ticker_symbol, quantity, cost_basis)
+    cost_str = f" à {cost_basis:g}" if cost_basis is not None else ""
+    await bot.reply_to(message, f"✅ Position enregistrée: {quantity:g} {ticker_symbol}{cost_str}.")
+
+# --- Cache des réponses IA ---
+# Une même question (normalisée) posée dans l'intervalle ASK_CACHE_TTL est servie depuis le cache ;
+# des questions identiques simultanées attendent une seule génération.
+ASK_CACHE_TTL = float(os.getenv("ASK_CACHE_TTL", 3600))
+ASK_CACHE_MAX_ENTRIES = int(os.getenv("ASK_CACHE_MAX_ENTRIES", 256))
+ask_cache = TTLCache(max_entries=ASK_CACHE_MAX_ENTRIES, ttl=ASK_CACHE_TTL, name="ask")
+
+def normalize_prompt(prompt):
+    """Clé de cache d'une question: casse, espaces et ponctuation finale ignorés."""
+    return " ".join(prompt.lower().split()).rstrip(" ?!.")
 
 @bot.message_handler(commands=['ask'])
-def ask_gemini_handler(message):
-    if not gemini_model:
-        bot.reply_to(message, "🤖 IA (Gemini) non disponible actuellement.")
+async def ask_gemini_handler(message):
+    if not await asyncio.get_running_loop().run_in_executor(None, get_gemini_model):
+        await bot.reply_to(message, "🤖 IA (Gemini) non disponible actuellement.")
         return
     
     prompt = message.text.split(maxsplit=1)[1] if len(message.text.split(maxsplit=1)) > 1 else ""
     if not prompt.strip():
-        bot.reply_to(message, "Veuillez poser une question après /ask.\nEx: `/ask Perspectives du secteur des semi-conducteurs ?`")
+        await bot.reply_to(message, "Veuillez poser une question après /ask.\nEx: `/ask Perspectives du secteur des semi-conducteurs ?`")
         return
 
     disclaimer_ia = "\n\n🧠 _Réponse IA (Gemini). Info générale, pas un conseil financier. Vérifiez toujours._"
-    bot.send_chat_action(message.chat.id, 'typing')
+    await bot.send_chat_action(message.chat.id, 'typing')
+
+    cache_key = normalize_prompt(prompt)
+    status, cached = ask_cache.claim(cache_key)
+    if status == "hit":
+        await send_ai_text(message, cached + disclaimer_ia)
+        return
+    if status == "wait": # Même question en cours de génération pour un autre utilisateur
+        try:
+            answer = await asyncio.wrap_future(cached)
+        except Exception:
+            await bot.reply_to(message, f"🤖 Oups! Erreur en contactant l'IA. {disclaimer_ia}")
+            return
+        await send_ai_text(message, answer + disclaimer_ia)
+        return
+
+    future = cached
+    answer, error = None, None
     try:
         # Pour une question financière, il est bon de guider Gemini
         contextual_prompt = (f"En tant qu'assistant d'information financière pour un usage personnel, "
@@ -346,90 +681,348 @@ def ask_gemini_handler(message):
                              f"en te basant sur des connaissances générales publiques. "
                              f"Évite les conseils d'investissement directs ou les prédictions spéculatives. "
                              f"Question: {prompt}")
-        response = gemini_model.generate_content(contextual_prompt)
-        response_text = response.text + disclaimer_ia
-        
-        # Gestion des messages longs
-        if len(response_text) > 4096:
-            for i in range(0, len(response_text), 4090): # Laisse une petite marge
-                bot.send_message(message.chat.id, response_text[i:i+4090])
+        if ASK_STREAMING:
+            answer = await stream_ai_answer(message, contextual_prompt, disclaimer_ia)
         else:
-            bot.reply_to(message, response_text)
+            with timed("gemini.generate_content"):
+                response = await run_blocking("ai", gemini_model.generate_content, contextual_prompt)
+            answer = response.text
+            await send_ai_text(message, answer + disclaimer_ia)
+        if not answer:
+            raise ValueError("réponse IA vide")
     except Exception as e:
-        print(f"Erreur Gemini: {e}")
-        bot.reply_to(message, f"🤖 Oups! Erreur en contactant l'IA. {disclaimer_ia}")
+        error = e
+    finally:
+        # En finally: une annulation (CancelledError n'est pas une Exception) doit aussi libérer la clé,
+        # sinon les demandes suivantes de la même question attendraient indéfiniment
+        if error is None and answer:
+            ask_cache.release(cache_key, future, value=answer)
+        else:
+            ask_cache.release(cache_key, future, error=error or RuntimeError("génération IA annulée"))
+    if error is not None:
+        print(f"Erreur Gemini: {error}")
+        if not ASK_STREAMING: # En streaming, l'erreur est déjà affichée dans la réponse
+            await bot.reply_to(message, f"🤖 Oups! Erreur en contactant l'IA. {disclaimer_ia}")
+
+async def send_ai_text(message, response_text):
+    # Gestion des messages longs
+    if len(response_text) > 4096:
+        for i in range(0, len(response_text), 4090): # Laisse une petite marge
+            await bot.send_message(message.chat.id, response_text[i:i+4090])
+    else:
+        await bot.reply_to(message, response_text)
+
+async def stream_ai_answer(message, contextual_prompt, disclaimer_ia):
+    """
+    Affiche la réponse de Gemini au fil des morceaux reçus (message provisoire puis éditions).
+    Retourne le texte complet, ou None si la génération a échoué (l'erreur est signalée dans la réponse).
+    """
+    reply = StreamingReply(bot, message)
+    answer_parts = []
+    async with _command_gates["ai"]:
+        await reply.start()
+        try:
+            with timed("gemini.generate_content"): # Durée totale du flux, éditions Telegram comprises
+                # aclosing: si l'envoi échoue ou si la tâche est annulée, le flux du modèle est arrêté tout de suite
+                async with aclosing(stream_model_chunks(gemini_model, contextual_prompt)) as chunks:
+                    async for text in chunks:
+                        answer_parts.append(text)
+                        await reply.append(text)
+        except Exception as e:
+            print(f"Erreur Gemini (streaming): {e}")
+            await reply.append("\n\n🤖 Oups! Réponse interrompue (erreur en contactant l'IA).")
+            answer_parts = None
+        await reply.finish(disclaimer_ia)
+    return "".join(answer_parts) if answer_parts is not None else None
+
+@bot.message_handler(commands=['cachestats'])
+@owner_only
+async def send_cache_stats_handler(message):
+    lines = ["📦 **Caches**"]
+    for stats in (get_cache_stats(), ask_cache.stats()):
+        lines.append(f"`{stats['name']}`: {stats['size']}/{stats['max_entries']} entrées, "
+                     f"{stats['hits']} hits, {stats['stale_hits']} périmés servis, {stats['misses']} misses, "
+                     f"{stats['coalesced']} regroupés (ratio {stats['hit_ratio']:.0%})")
+    await bot.reply_to(message, "\n".join(lines))
+
+register_cache_source("ticker_info", get_cache_stats)
+register_cache_source("ask", ask_cache.stats)
+
+@bot.message_handler(commands=['metrics'])
+@owner_only
+async def send_metrics_handler(message):
+    text = format_metrics_summary()
+    upstream = get_upstream_status()
+    text += (f"\nYahoo: circuit `{upstream['state']}`"
+             + (f" (nouvel essai dans {upstream['retry_in']:.0f}s)" if upstream['retry_in'] else "")
+             + f", {upstream['calls']} appels, {upstream['failures']} échecs, {upstream['retries']} réessais, "
+               f"{upstream['rejected']} refusés, budget de réessais épuisé {upstream['budget_exhausted']} fois")
+    if replicas is not None:
+        text += (f"\nRéplica `{replicas.replica_id}`{' (leader)' if replicas.is_leader else ''}: "
+                 f"{len(replicas.live)} réplica(s) active(s), {len(delivery_scheduler)} abonné(s) programmé(s)")
+    if webhook_server is not None:
+        stats = webhook_server.stats()
+        text += (f"\nWebhook: {stats['queued']}/{stats['queue_size']} en file, {stats['processed']} traitées, "
+                 f"{stats['rejected']} refusées (503), {stats['dropped']} abandonnées, {stats['failed']} en erreur")
+    await bot.reply_to(message, text + "\n\n" + startup_report.format_startup_report())
 
 # --- Tâches Planifiées ---
-def send_scheduled_info_to_chat(chat_id):
-    if stop_event.is_set(): return # Ne rien faire si arrêt demandé
-    try:
-        print(f"Envoi infos planifiées à {chat_id}")
-        # Pour les updates, on peut utiliser le score LT ou des listes non triées plus courtes
-        etfs_text = get_selected_items_formatted(item_type="ETF", limit=5, sort_by_score=True, score_type="long_term")
-        actions_text = get_selected_items_formatted(item_type="ACTION", limit=5, sort_by_score=True, score_type="long_term")
-        update_text = (
-            f"🔔 **Votre Point Financier Périodique** 🔔\n\n"
-            f"{etfs_text}\n\n{actions_text}\n\n"
-            f"_Prochaine mise à jour dans ~12h. Score LT expérimental._"
-        )
-        bot.send_message(chat_id, update_text)
-    except apihelper.ApiTelegramException as e:
-        print(f"Erreur API Telegram (envoi planifié) pour {chat_id}: {e}")
-        if e.error_code == 403: # Forbidden: bot blocked
-           if chat_id in subscribed_chats:
-               subscribed_chats.remove(chat_id)
-               save_subscriptions()
-               print(f"Chat {chat_id} désabonné (bot bloqué).")
-    except Exception as e:
-        print(f"Erreur générique (envoi planifié) pour {chat_id}: {e}")
+# Envoi des infos périodiques: parallèle, limité au débit autorisé par Telegram, avec reprise sur 429
+broadcaster = Broadcaster(lambda chat_id, text: run_on_bot_loop(bot.send_message(chat_id, text)), stop_event=stop_event)
 
-def job_send_periodic_info():
+def build_periodic_digest(sections=DIGEST_SECTIONS, limit=5, score_type="long_term", interval_hours=12):
+    """Construit le message périodique une seule fois pour tous les abonnés ayant ces préférences."""
+    parts = [get_ranking_text(item_type=section, limit=limit, sort_by_score=True, score_type=score_type)
+             for section in sections]
+    footer = f"_Prochaine mise à jour dans ~{interval_hours}h._"
+    if score_type == "long_term":
+        footer = f"_Prochaine mise à jour dans ~{interval_hours}h. Score LT expérimental._"
+    return f"🔔 **Votre Point Financier Périodique** 🔔\n\n" + "\n\n".join(parts) + f"\n\n{footer}"
+
+def job_send_periodic_info(dues):
+    """
+    Envoie les infos périodiques aux chats arrivés à échéance, `dues` = {chat_id: échéance nominale}
+    (appelé par le planificateur).
+    """
     if stop_event.is_set(): return
-    if not subscribed_chats: return
-    print(f"Tâche planifiée: Envoi infos à {len(subscribed_chats)} abonné(s).")
-    for chat_id in list(subscribed_chats):
-        if stop_event.is_set(): break # Vérifier avant chaque envoi
-        send_scheduled_info_to_chat(chat_id)
-        time.sleep(2) # Éviter rate limiting (augmenté un peu)
+    chat_ids = [chat_id for chat_id in dues if chat_id in subscriptions]
+    if not chat_ids: return
+    if replicas is not None: # Réservation de l'échéance: un seul envoi par échéance, même pendant un rééquilibrage
+        chat_ids = subscriptions.claim_deliveries({chat_id: dues[chat_id] for chat_id in chat_ids}, replicas.replica_id,
+                                                  same_delivery_window=DELIVERY_JITTER_SECONDS)
+        if not chat_ids: return
+    preferences = subscriptions.preferences_for(chat_ids)
+    print(f"Tâche planifiée: Envoi infos à {len(chat_ids)} abonné(s).")
+
+    # Un message par combinaison de préférences, construit une seule fois
+    groups = {}
+    for chat_id in chat_ids:
+        p = preferences[chat_id]
+        key = (p["digest_sections"], p["digest_limit"], p["digest_score_type"], p["delivery_interval_hours"])
+        groups.setdefault(key, []).append(chat_id)
+
+    sent, failed, forbidden = 0, 0, []
+    for (sections, limit, score_type, interval_hours), group in groups.items():
+        try:
+            update_text = build_periodic_digest(sections.split(","), limit, score_type, interval_hours)
+        except Exception as e:
+            print(f"Erreur construction des infos planifiées ({sections}, {limit}, {score_type}): {e}")
+            failed += len(group)
+            continue
+        summary = broadcaster.broadcast(group, update_text)
+        sent += len(summary["sent"])
+        failed += len(summary["failed"])
+        forbidden += summary["forbidden"]
+    print(f"Infos planifiées: {sent} envoyé(s), {failed} échec(s).")
+
+    if forbidden: # Forbidden: bot bloqué -> désabonner (une seule transaction)
+        subscriptions.unsubscribe_many(forbidden)
+        for chat_id in forbidden:
+            delivery_scheduler.cancel(chat_id)
+        print(f"{len(forbidden)} chat(s) désabonné(s) (bot bloqué).")
+
+def send_triggered_alerts(alerts_by_chat):
+    """
+    Un message par chat pour ses alertes déclenchées, via le même envoi limité que les infos périodiques.
+    Retourne le résumé par chat: run_alert_poller supprime les alertes envoyées et réarme les autres.
+    """
+    summary = broadcaster.send_many(
+        [(chat_id, format_triggered_alerts(chat_alerts)) for chat_id, chat_alerts in alerts_by_chat.items()])
+    print(f"Alertes de prix: {len(summary['sent'])} message(s) envoyé(s), {len(summary['failed'])} échec(s).")
+    return summary
+
+def run_alerts():
+    warmup_done.wait(STARTUP_WARMUP_TIMEOUT)
+    # Multi-réplicas: une seule réplica (le leader) surveille les alertes, sinon chacune les enverrait
+    is_leader = (lambda: replicas.is_leader) if replicas is not None else None
+    run_alert_poller(alerts, get_quotes_batch, send_triggered_alerts, stop_event, is_leader=is_leader)
+
+def run_portfolios():
+    warmup_done.wait(STARTUP_WARMUP_TIMEOUT)
+    run_portfolio_refresher(portfolio_store, stop_event, owns_chat=owns_chat if replicas is not None else None)
+
+# Chaque abonné a sa propre échéance (préférences /digest), persistée pour survivre aux redémarrages
+delivery_scheduler = DeliveryScheduler(
+    timed_function("job.periodic_info")(job_send_periodic_info), stop_event,
+    on_rescheduled=lambda deliveries: subscriptions.set_next_deliveries(deliveries),
+)
+
+def owned_delivery_rows():
+    """Échéances des abonnés attribués à cette réplica (tous hors mode multi-réplicas)."""
+    return [row for row in subscriptions.delivery_rows() if owns_chat(row[0])]
 
 def run_scheduler():
-    # schedule.every(1).minutes.do(job_send_periodic_info) # Pour test rapide
-    schedule.every(12).hours.do(job_send_periodic_info)
-    # schedule.every().day.at("08:00").do(job_send_periodic_info) # Ex: tous les jours à 8h
+    warmup_done.wait(STARTUP_WARMUP_TIMEOUT) # Premiers envois depuis les classements rechargés
+    delivery_scheduler.sync(owned_delivery_rows())
+    print(f"Planificateur: {len(delivery_scheduler)} abonné(s) programmé(s).")
+    delivery_scheduler.run()
 
-    while not stop_event.is_set():
-        schedule.run_pending()
-        time.sleep(20) # Vérifier toutes les 20 secondes si arrêt demandé
-    print("Thread du planificateur arrêté.")
+def rebalance_replica(changed):
+    """Après chaque battement: reprend les (dés)abonnements, réglages, alertes et portefeuilles modifiés sur les
+    autres réplicas et les chats réattribués (réplica ajoutée ou disparue)."""
+    subscriptions.reload()
+    alerts.reload()
+    portfolio_store.reload()
+    if not warmup_done.is_set(): # Le planificateur n'a pas encore chargé ses abonnés
+        return
+    added, removed = delivery_scheduler.sync(owned_delivery_rows())
+    if changed or added or removed:
+        print(f"Réplica: {len(delivery_scheduler)} abonné(s) programmé(s) (+{added}, -{removed}).")
+
+def run_replica():
+    replicas.run(stop_event, on_tick=rebalance_replica)
 
 # --- Démarrage & Arrêt du Bot ---
+# --- Démarrage rapide: préchauffage en arrière-plan une fois le polling lancé ---
+STARTUP_WARMUP_TIMEOUT = float(os.getenv("STARTUP_WARMUP_TIMEOUT", 30)) # Attente max des commandes de listes
+warmup_done = threading.Event()
+
+def warm_up_then_refresh_rankings():
+    """
+    Thread lancé avec le polling: recharge les données locales et les classements, importe les modules lourds,
+    configure l'IA, puis devient le thread de rafraîchissement des classements.
+    """
+    try:
+        # Redémarrage à chaud: classements servis tout de suite depuis les dernières données connues
+        loaded = open_fundamentals_store()
+        print(f"Données locales chargées: {loaded} ticker(s), {prime_snapshots_from_cache()} classement(s) prêts.")
+    except Exception as e:
+        print(f"Stockage local des données indisponible: {e}")
+    try:
+        warm_heavy_modules()
+        get_gemini_model()
+    except Exception as e:
+        print(f"Erreur préchauffage: {e}")
+    warmup_done.set()
+    startup_report.mark("warmup")
+    print(startup_report.format_startup_report())
+    run_ranking_refresher(stop_event, replicas=replicas)
+
+class FirstUpdateMiddleware(BaseMiddleware):
+    """Relève le moment où la première mise à jour a été entièrement traitée (rapport de démarrage)."""
+
+    def __init__(self):
+        super().__init__()
+        self.update_types = ['message']
+
+    async def pre_process(self, message, data):
+        pass
+
+    async def post_process(self, message, data, exception):
+        if startup_report.mark("first_update"):
+            print(startup_report.format_startup_report())
+
+# --- Admission: budget de commandes par chat ---
+# Propriétaire exempté (commandes d'administration toujours disponibles)
+chat_admission = ChatAdmission(exempt={BOT_OWNER_ID} if BOT_OWNER_ID else ())
+
+class AdmissionMiddleware(BaseMiddleware):
+    """Refuse vite (sans lancer le handler) une commande dont le chat a épuisé son budget."""
+
+    def __init__(self):
+        super().__init__()
+        self.update_types = ['message']
+
+    async def pre_process(self, message, data):
+        class_name = command_class(message.text)
+        if class_name is None:
+            return
+        current_priority.set(COMMAND_CLASSES[class_name][1]) # Lue par run_blocking pour ce handler
+        wait_for = chat_admission.try_admit(message.chat.id, class_name)
+        if wait_for == 0.0:
+            return
+        print(f"Commande refusée pour le chat {message.chat.id} ({class_name}): budget épuisé.")
+        if chat_admission.should_notify(message.chat.id):
+            await bot.reply_to(message, f"⏳ Trop de demandes rapprochées. Réessayez dans {math.ceil(wait_for)} s.")
+        return CancelUpdate()
+
+    async def post_process(self, message, data, exception):
+        pass
+
+bot.setup_middleware(FirstUpdateMiddleware())
+bot.setup_middleware(AdmissionMiddleware())
+
+async def process_webhook_update(update):
+    await bot.process_new_updates([types.Update.de_json(update)])
+
+async def start_webhook():
+    """Mode webhook: déclare WEBHOOK_URL à Telegram (si défini) et sert les mises à jour reçues localement."""
+    global webhook_server
+    webhook_server = WebhookServer(process_webhook_update, bot_loop, priority=lambda update: command_priority(
+        (update.get("message") or {}).get("text"))) # Commandes légères traitées avant les autres
+    if WEBHOOK_URL:
+        await bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET_TOKEN, drop_pending_updates=True)
+        print(f"Webhook déclaré à Telegram: {WEBHOOK_URL}")
+    return asyncio.create_task(webhook_server.serve())
+
+async def run_bot():
+    global bot_loop, polling_task
+    bot_loop = asyncio.get_running_loop()
+    if WEBHOOK_MODE:
+        polling_task = await start_webhook()
+    else:
+        # infinity_polling tourne jusqu'à ce que /stop annule la tâche ou qu'une erreur survienne
+        polling_task = asyncio.create_task(bot.infinity_polling(skip_pending=True, timeout=20, request_timeout=30))
+    startup_report.mark("polling")
+    threading.Thread(target=warm_up_then_refresh_rankings, daemon=True).start()
+    print("Préchauffage et rafraîchissement des classements démarrés.")
+    try:
+        await polling_task
+    except asyncio.CancelledError:
+        pass
+
+startup_report.mark("imports")
+
 if __name__ == '__main__':
     load_subscriptions()
+    load_alerts()
+    load_portfolios()
+    load_replicas()
     print(f"Démarrage du bot... Propriétaire ID configuré: {BOT_OWNER_ID if BOT_OWNER_ID else 'Non (commandes admin désactivées)'}")
 
     scheduler_thread = threading.Thread(target=run_scheduler, daemon=True) # daemon=True permet au thread de se fermer avec le principal
     scheduler_thread.start()
     print("Planificateur de tâches démarré.")
+    threading.Thread(target=run_alerts, daemon=True).start()
+    print("Surveillance des alertes de prix démarrée.")
+    threading.Thread(target=run_portfolios, daemon=True).start()
+    print("Rafraîchissement des listes de suivi et portefeuilles démarré.")
+    replica_thread = None
+    if replicas is not None:
+        replica_thread = threading.Thread(target=run_replica, daemon=True)
+        replica_thread.start()
+        print(f"Mode multi-réplicas: réplica {replicas.replica_id}.")
+
+    try:
+        start_metrics_server() # Endpoint Prometheus local, si METRICS_PORT est défini
+    except OSError as e:
+        print(f"Endpoint de métriques indisponible: {e}")
 
     print("Bot en écoute des messages (Ctrl+C pour arrêter)...")
     try:
-        # infinity_polling va bloquer ici jusqu'à ce que stop_polling soit appelé ou une erreur survienne
-        bot.infinity_polling(skip_pending=True,none_stop=False, timeout=30, long_polling_timeout = 20) # none_stop pour Ctrl+C
+        # asyncio.run va bloquer ici jusqu'à l'arrêt du polling (/stop, Ctrl+C ou erreur)
+        asyncio.run(run_bot())
     except KeyboardInterrupt:
         print("Arrêt demandé par Ctrl+C.")
-        stop_event.set() # Signaler aux autres threads
-        bot.stop_polling()
     except Exception as e:
         print(f"Erreur critique du bot: {e}")
-        stop_event.set()
-        bot.stop_polling()
     finally:
+        delivery_scheduler.stop() # Signaler aux autres threads (et réveiller le planificateur)
         print("Nettoyage avant l'arrêt...")
         # Attendre que le scheduler thread se termine s'il n'est pas daemon ou si on veut être sûr
         if scheduler_thread.is_alive():
              print("Attente de l'arrêt du planificateur...")
              scheduler_thread.join(timeout=5) # Attendre max 5 sec
+        if replica_thread is not None:
+            replica_thread.join(timeout=5) # Retrait de l'état partagé: les autres réplicas reprennent sa part
+            replicas.shared.close()
         
-        save_subscriptions() # Sauvegarder une dernière fois
+        if subscriptions is not None:
+            subscriptions.close()
+        if alerts is not None:
+            alerts.close()
+        if portfolio_store is not None:
+            portfolio_store.close()
+        flush_fundamentals_store()
         print("Bot arrêté.")
         # sys.exit(0) # Assure que le script se termine complètement
\ No newline at end of file
@@ -0,0 +1,122 @@
+# broadcaster.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Limites documentées par Telegram pour les bots
+TELEGRAM_GLOBAL_RATE = 30 # messages/seconde, tous chats confondus
+TELEGRAM_PER_CHAT_RATE = 1 # message/seconde dans un même chat
+
+class TokenBucket:
+    """Seau à jetons thread-safe : `rate` jetons/seconde, au plus `capacity` jetons accumulés."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens=1):
+        """Prend `tokens` jetons si possible. Retourne 0 si c'est fait, sinon le temps d'attente estimé (s)."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, stop_event=None):
+        """Bloque jusqu'à obtenir les jetons. Retourne False si `stop_event` est levé entre-temps."""
+        while True:
+            wait_for = self.try_acquire(tokens)
+            if wait_for == 0.0:
+                return True
+            if stop_event is not None:
+                if stop_event.wait(wait_for):
+                    return False
+            else:
+                time.sleep(wait_for)
+
+class Broadcaster:
+    """
+    Envoi parallèle d'un même texte à de nombreux chats en respectant les limites Telegram :
+    un seau global, un intervalle minimal par chat, et une pause globale lors d'un 429 (retry_after).
+    `send_func(chat_id, text)` fait l'envoi réel (ex: bot.send_message).
+    """
+
+    def __init__(self, send_func, global_rate=TELEGRAM_GLOBAL_RATE, per_chat_rate=TELEGRAM_PER_CHAT_RATE,
+                 max_workers=8, max_retries=3, stop_event=None):
+        self.send_func = send_func
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.stop_event = stop_event
+        self._global_bucket = TokenBucket(global_rate)
+        self._per_chat_interval = 1.0 / per_chat_rate
+        self._chat_next_slot = {} # chat_id -> instant à partir duquel on peut lui réécrire
+        self._paused_until = 0.0 # Pause globale imposée par un 429
+        self._lock = threading.Lock()
+
+    def _sleep(self, seconds):
+        """Attend `seconds`. Retourne False si l'arrêt a été demandé."""
+        if seconds <= 0:
+            return True
+        if self.stop_event is not None:
+            return not self.stop_event.wait(seconds)
+        time.sleep(seconds)
+        return True
+
+    def _wait_for_slot(self, chat_id):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._chat_next_slot.get(chat_id, 0.0))
+            self._chat_next_slot[chat_id] = slot + self._per_chat_interval
+            if len(self._chat_next_slot) > 10000: # Oublier les chats dont le créneau est passé
+                self._chat_next_slot = {c: t for c, t in self._chat_next_slot.items() if t > now}
+            paused_until = self._paused_until
+        if not self._sleep(max(slot, paused_until) - time.monotonic()):
+            return False
+        return self._global_bucket.acquire(stop_event=self.stop_event)
+
+    def send(self, chat_id, text):
+        """
+        Envoie `text` à `chat_id` en respectant les limites et en réessayant sur 429.
+        Retourne "sent", "forbidden" (403: bot bloqué), "failed" ou "stopped".
+        """
+        for attempt in range(self.max_retries + 1):
+            if not self._wait_for_slot(chat_id):
+                return "stopped"
+            try:
+                self.send_func(chat_id, text)
+                return "sent"
+            except Exception as e:
+                error_code = getattr(e, "error_code", None)
+                if error_code == 403:
+                    return "forbidden"
+                if error_code == 429 and attempt < self.max_retries:
+                    result_json = getattr(e, "result_json", None) or {}
+                    retry_after = (result_json.get("parameters") or {}).get("retry_after", 1)
+                    print(f"Limite Telegram atteinte (429), pause de {retry_after}s.")
+                    with self._lock:
+                        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                    continue
+                print(f"Erreur envoi à {chat_id}: {e}")
+                return "failed"
+        return "failed"
+
+    def broadcast(self, chat_ids, text):
+        """Envoie `text` à tous les `chat_ids` en parallèle. Retourne un résumé par statut."""
+        return self.send_many([(chat_id, text) for chat_id in chat_ids])
+
+    def send_many(self, messages):
+        """Envoie des messages différents [(chat_id, text), ...] en parallèle. Retourne un résumé par statut."""
+        summary = {"sent": [], "forbidden": [], "failed": [], "stopped": []}
+        messages = list(messages)
+        if not messages:
+            return summary
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(messages)), thread_name_prefix="broadcast") as pool:
+            for (chat_id, _), status in zip(messages, pool.map(lambda m: self.send(*m), messages)):
+                summary[status].append(chat_id)
+        return summary
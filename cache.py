@@ -0,0 +1,186 @@
+# cache.py
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+class TTLCache:
+    """
+    Cache mémoire partagé (thread-safe) :
+    - LRU borné à `max_entries` entrées,
+    - une entrée est fraîche pendant `ttl` secondes (le TTL peut être choisi à chaque lecture),
+    - puis servie "périmée" pendant `stale_ttl` secondes supplémentaires pendant qu'un
+      rafraîchissement tourne en arrière-plan (stale-while-revalidate) : au plus `refresh_workers`
+      à la fois, et au plus `max_pending_refreshes` en attente (au-delà, la valeur périmée est servie sans
+      rafraîchissement ; la lecture suivante réessaiera),
+    - les lectures simultanées d'une même clé absente partagent un seul chargement en cours,
+    - `on_evict(clé)` est appelé pour chaque entrée évincée par le LRU ou invalidée.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60, stale_ttl=0, name="cache", refresh_workers=4,
+                 max_pending_refreshes=64, on_evict=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self.refresh_workers = refresh_workers
+        self.max_pending_refreshes = max_pending_refreshes
+        self.on_evict = on_evict
+        self._entries = OrderedDict() # clé -> (valeur, horodatage time.time())
+        self._inflight = {} # clé -> Future du chargement en cours
+        self._refresh_executor = None # Créé au premier rafraîchissement en arrière-plan
+        self._pending_refreshes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.refreshes_skipped = 0
+
+    def get_or_load(self, key, loader, ttl=None, stale_ttl=None):
+        """Retourne la valeur en cache pour `key`, ou l'obtient via `loader()` (une seule fois par clé)."""
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        refresh_in_background = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = time.time() - stored_at
+                if age < ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if age < ttl + stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key in self._inflight: # Rafraîchissement déjà lancé
+                        return value
+                    if self._pending_refreshes >= self.max_pending_refreshes:
+                        self.refreshes_skipped += 1
+                        return value
+                    future = self._inflight[key] = Future()
+                    self._pending_refreshes += 1
+                    if self._refresh_executor is None:
+                        self._refresh_executor = ThreadPoolExecutor(
+                            max_workers=self.refresh_workers, thread_name_prefix=f"{self.name}-refresh")
+                    executor = self._refresh_executor
+                    refresh_in_background = True
+            if not refresh_in_background:
+                future = self._inflight.get(key)
+                if future is not None:
+                    self.coalesced += 1
+                    is_leader = False
+                else:
+                    self.misses += 1
+                    future = self._inflight[key] = Future()
+                    is_leader = True
+
+        if refresh_in_background:
+            executor.submit(self._load_quietly, key, loader, future)
+            return value
+        if not is_leader:
+            return future.result()
+        return self._load(key, loader, future)
+
+    def _load(self, key, loader, future):
+        try:
+            value = loader()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _load_quietly(self, key, loader, future):
+        try:
+            self._load(key, loader, future)
+        except Exception as e:
+            print(f"Erreur rafraîchissement {self.name} pour {key}: {e}")
+        finally:
+            with self._lock:
+                self._pending_refreshes -= 1
+
+    def get(self, key, ttl=None):
+        """Valeur fraîche pour `key`, ou None (compté comme miss) ; ne déclenche aucun chargement."""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] < ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def claim(self, key, ttl=None):
+        """
+        Variante de get_or_load pour un chargement piloté par l'appelant (ex: code asynchrone).
+        Retourne ("hit", valeur) si l'entrée est fraîche, ("wait", future) si un chargement de la clé
+        est déjà en cours, sinon ("load", future) : l'appelant charge alors la valeur et appelle release().
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] < ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return "hit", entry[0]
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return "wait", future
+            self.misses += 1
+            future = self._inflight[key] = Future()
+            return "load", future
+
+    def release(self, key, future, value=None, error=None):
+        """Termine un chargement obtenu par claim(): met `value` en cache, ou propage `error` aux appelants en attente."""
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            self.put(key, value)
+            future.set_result(value)
+
+    def put(self, key, value, stored_at=None):
+        evicted = []
+        with self._lock:
+            self._entries[key] = (value, time.time() if stored_at is None else stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+                self.evictions += 1
+        self._notify_evicted(evicted)
+
+    def _notify_evicted(self, keys):
+        if self.on_evict is not None:
+            for key in keys:
+                self.on_evict(key)
+
+    def peek(self, key):
+        """Retourne (valeur, horodatage) quel que soit l'âge de l'entrée, ou None. Ne touche ni au LRU ni aux compteurs."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def invalidate(self, key):
+        with self._lock:
+            removed = self._entries.pop(key, None) is not None
+        self._notify_evicted([key] if removed else [])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+            return {
+                "name": self.name, "size": len(self._entries), "max_entries": self.max_entries,
+                "hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses,
+                "coalesced": self.coalesced, "evictions": self.evictions, "refreshes_skipped": self.refreshes_skipped,
+                "hit_ratio": round((self.hits + self.stale_hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            }
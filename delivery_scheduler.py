@@ -0,0 +1,186 @@
+# delivery_scheduler.py
+# Planification des messages périodiques par chat: un tas (heapq) des prochaines échéances,
+# un thread qui dort jusqu'à la plus proche (pas de scrutation), et une dispersion aléatoire (jitter)
+# des envois tombant dans la même fenêtre pour lisser la charge sur yfinance et Telegram.
+import heapq
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+DELIVERY_JITTER_SECONDS = float(os.getenv("DELIVERY_JITTER_SECONDS", 300))
+DELIVERY_INTERVALS_HOURS = (6, 12, 24, 168) # Fréquences proposées par /digest
+DEFAULT_DELIVERY_INTERVAL_HOURS = 12
+
+def next_delivery_time(now, interval_hours, delivery_time=None, last_due=None):
+    """
+    Prochaine échéance nominale (timestamp) après `now`.
+    Avec `delivery_time` ("HH:MM", heure locale du serveur): les envois ont lieu à cette heure puis toutes
+    les `interval_hours` heures. Sans: `interval_hours` après la précédente échéance (ou après `now`).
+    """
+    interval = interval_hours * 3600
+    if delivery_time:
+        hour, minute = (int(x) for x in delivery_time.split(":"))
+        anchor = datetime.fromtimestamp(now).replace(hour=hour, minute=minute, second=0, microsecond=0).timestamp()
+        return anchor + (math.floor((now - anchor) / interval) + 1) * interval
+    if last_due is None:
+        return now + interval
+    return max(last_due + interval, now)
+
+class DeliveryScheduler:
+    """
+    `deliver({chat_id: échéance nominale})` est appelé depuis le thread du planificateur pour chaque lot d'échéances
+    atteintes (l'échéance identifie l'envoi, voir SubscriptionStore.claim_deliveries) ;
+    `on_rescheduled([(chat_id, échéance, échéance nominale), ...])` reçoit les nouvelles échéances (pour les persister).
+    L'échéance nominale (sans jitter) est persistée à part: relue au redémarrage, elle reste la base des suivantes,
+    et le jitter n'est jamais cumulé. Une seule échéance est active par chat: les entrées remplacées restent dans
+    le tas et sont ignorées.
+    """
+
+    def __init__(self, deliver, stop_event, on_rescheduled=None, jitter=DELIVERY_JITTER_SECONDS):
+        self.deliver = deliver
+        self.stop_event = stop_event
+        self.on_rescheduled = on_rescheduled
+        self.jitter = jitter
+        self._heap = [] # (échéance, chat_id)
+        self._due = {} # chat_id -> échéance active (jitter compris)
+        self._nominal = {} # chat_id -> échéance active sans jitter (base de la suivante, évite la dérive)
+        self._settings = {} # chat_id -> (interval_hours, delivery_time)
+        self._wakeup = threading.Condition()
+
+    def __len__(self):
+        return len(self._due)
+
+    def schedule(self, chat_id, interval_hours=DEFAULT_DELIVERY_INTERVAL_HOURS, delivery_time=None, due_at=None, nominal=None):
+        """
+        (Re)programme le chat. Sans `due_at`, l'échéance est calculée depuis maintenant et décalée d'un jitter.
+        Retourne (échéance retenue, échéance nominale).
+        """
+        if due_at is None:
+            nominal = next_delivery_time(time.time(), interval_hours, delivery_time)
+            due_at = nominal + random.uniform(0, self.jitter)
+        elif nominal is None:
+            nominal = self._nominal_of(due_at, interval_hours, delivery_time)
+        with self._wakeup:
+            self._settings[chat_id] = (interval_hours, delivery_time)
+            self._due[chat_id] = due_at
+            self._nominal[chat_id] = nominal
+            heapq.heappush(self._heap, (due_at, chat_id))
+            if self._heap[0][1] == chat_id: # Nouvelle échéance la plus proche: réveiller le thread
+                self._wakeup.notify()
+        return due_at, nominal
+
+    def _nominal_of(self, due_at, interval_hours, delivery_time):
+        """
+        Échéance nominale d'une ligne enregistrée sans elle (base antérieure): avec `delivery_time`, le créneau
+        d'origine est retrouvé (il précède `due_at` d'au plus le jitter) ; sinon, faute de mieux, `due_at` lui-même.
+        """
+        if delivery_time:
+            return next_delivery_time(due_at - self.jitter - 1, interval_hours, delivery_time)
+        return due_at
+
+    def schedule_many(self, rows):
+        """
+        Chargement initial: `rows` = [(chat_id, due_at ou None, interval_hours, delivery_time, nominal ou None), ...].
+        Une échéance future est reprise telle quelle avec son échéance nominale enregistrée (aucun nouveau jitter).
+        Toute échéance calculée ici (absente, ou manquée puis étalée) est transmise à `on_rescheduled` : une fois
+        persistée, sync() la retrouve telle quelle et ne la re-tire pas au sort à chaque passage.
+        """
+        now = time.time()
+        missing = []
+        with self._wakeup:
+            for chat_id, due_at, interval_hours, delivery_time, nominal in rows:
+                if due_at is None:
+                    nominal = next_delivery_time(now, interval_hours, delivery_time)
+                    due_at = nominal + random.uniform(0, self.jitter)
+                    missing.append((chat_id, due_at, nominal))
+                elif due_at < now: # Échéance manquée pendant un arrêt: un seul rattrapage, étalé
+                    nominal = now
+                    due_at = now + random.uniform(0, self.jitter)
+                    missing.append((chat_id, due_at, nominal))
+                elif nominal is None:
+                    nominal = self._nominal_of(due_at, interval_hours, delivery_time)
+                self._settings[chat_id] = (interval_hours, delivery_time)
+                self._due[chat_id] = due_at
+                self._nominal[chat_id] = nominal
+                self._heap.append((due_at, chat_id))
+            heapq.heapify(self._heap)
+            self._wakeup.notify()
+        if missing and self.on_rescheduled is not None:
+            self.on_rescheduled(missing)
+
+    def sync(self, rows):
+        """
+        Aligne le planificateur sur `rows` (même format que schedule_many, ex: les chats attribués à cette réplica):
+        les chats absents sont retirés, les nouveaux et ceux dont l'échéance ou la fréquence a changé ailleurs
+        sont (re)programmés. Les chats en cours d'envoi sont laissés à la boucle. Retourne (ajoutés, retirés).
+        """
+        wanted = {row[0]: row for row in rows}
+        with self._wakeup:
+            removed = [chat_id for chat_id in self._settings if chat_id not in wanted]
+            changed = [row for chat_id, row in wanted.items()
+                       if chat_id not in self._settings
+                       or (chat_id in self._due and (self._settings[chat_id] != (row[2], row[3])
+                                                     or (row[1] is not None and abs(self._due[chat_id] - row[1]) > 1)))]
+        for chat_id in removed:
+            self.cancel(chat_id)
+        if changed:
+            self.schedule_many(changed)
+        return len(changed), len(removed)
+
+    def cancel(self, chat_id):
+        with self._wakeup:
+            self._due.pop(chat_id, None)
+            self._nominal.pop(chat_id, None)
+            self._settings.pop(chat_id, None)
+
+    def stop(self):
+        """Demande l'arrêt et réveille immédiatement le thread."""
+        self.stop_event.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _pop_due(self, now):
+        """Retire du tas les échéances atteintes (entrées actives seulement). À appeler sous le verrou."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, chat_id = heapq.heappop(self._heap)
+            if self._due.get(chat_id) == due_at:
+                del self._due[chat_id]
+                due.append((chat_id, self._nominal.pop(chat_id, due_at)))
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]: # Entrées remplacées/annulées
+            heapq.heappop(self._heap)
+        return due
+
+    def run(self):
+        while not self.stop_event.is_set():
+            with self._wakeup:
+                due = self._pop_due(time.time())
+                if not due:
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    if timeout is None or timeout > 0:
+                        self._wakeup.wait(timeout)
+                    continue
+            try:
+                self.deliver(dict(due))
+            except Exception as e:
+                print(f"Erreur envoi des infos planifiées: {e}")
+            rescheduled = []
+            now = time.time()
+            with self._wakeup:
+                for chat_id, nominal in due:
+                    settings = self._settings.get(chat_id)
+                    if settings is None or chat_id in self._due: # Désabonné ou reprogrammé pendant l'envoi
+                        continue
+                    interval_hours, delivery_time = settings
+                    next_nominal = next_delivery_time(now, interval_hours, delivery_time, last_due=nominal)
+                    next_due = next_nominal + random.uniform(0, self.jitter)
+                    self._due[chat_id] = next_due
+                    self._nominal[chat_id] = next_nominal
+                    heapq.heappush(self._heap, (next_due, chat_id))
+                    rescheduled.append((chat_id, next_due, next_nominal))
+            if rescheduled and self.on_rescheduled is not None:
+                self.on_rescheduled(rescheduled)
+        print("Thread du planificateur arrêté.")
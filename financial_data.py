@@ -1,7 +1,45 @@
 # financial_data.py
-import yfinance as yf
-import pandas as pd
-import numpy as np
+import math
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from lazy_import import LazyModule
+from cache import TTLCache
+from metrics import timed, timed_function
+from upstream_guard import UpstreamGuard, UpstreamUnavailable
+from fundamentals_store import FundamentalsStore, FUNDAMENTALS_DB_FILE
+from ticker_record import TickerRecord
+from universe import load_universe, ETF_UNIVERSE_FILE, ACTION_UNIVERSE_FILE
+from price_history import (
+    PriceHistory, HISTORY_SCORE_TYPES, PRICE_HISTORY_DAYS, compute_history_scores, last_closes, format_history_score
+)
+
+# Modules lourds importés au premier usage (ou par warm_heavy_modules), pas au démarrage du bot
+yf = LazyModule("yfinance")
+pd = LazyModule("pandas")
+
+# Tous les appels yfinance passent par ce garde (disjoncteur, backoff, budget de réessais)
+yahoo = UpstreamGuard("yahoo")
+
+def get_upstream_status():
+    """État du garde yfinance (circuit, échecs, réessais, appels refusés)."""
+    return yahoo.stats()
+
+def format_age(seconds):
+    if seconds < 60: return "à l'instant"
+    if seconds < 3600: return f"il y a {int(seconds // 60)} min"
+    return f"il y a {int(seconds // 3600)} h {int(seconds % 3600 // 60):02d}"
+
+def stale_marker(fetched_at):
+    """Mention ajoutée aux données servies depuis le cache faute de réponse de Yahoo."""
+    return f" ⏳ _données {format_age(time.time() - fetched_at)}_"
+
+def warm_heavy_modules():
+    """Importe yfinance et pandas (numpy compris) ; à appeler en arrière-plan une fois le bot démarré."""
+    yf.warm()
+    pd.warm()
 
 # --- Configuration des Tickers (gardez vos listes étendues ici) ---
 DEFAULT_ETF_TICKERS = [
@@ -17,9 +55,434 @@ DEFAULT_ACTION_TICKERS = [
     "NESN.SW", "NOVN.SW", "ROG.SW", "ASML.AS", "SAP.DE", "SIE.DE", "VOW3.DE", "IBE.MC"
 ]
 
+# Univers réellement classés: fichiers ETF_UNIVERSE_FILE / ACTION_UNIVERSE_FILE s'ils sont configurés,
+# sinon les listes ci-dessus.
+ETF_UNIVERSE = load_universe(ETF_UNIVERSE_FILE, DEFAULT_ETF_TICKERS)
+ACTION_UNIVERSE = load_universe(ACTION_UNIVERSE_FILE, DEFAULT_ACTION_TICKERS)
+
+def get_universe(item_type="ETF"):
+    return ETF_UNIVERSE if item_type.upper() == "ETF" else ACTION_UNIVERSE
+
+# --- Récupération concurrente (pool borné, timeout par ticker, échéance globale) ---
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", 8))
+FETCH_TICKER_TIMEOUT = float(os.getenv("FETCH_TICKER_TIMEOUT", 10)) # secondes par ticker
+FETCH_TOTAL_DEADLINE = float(os.getenv("FETCH_TOTAL_DEADLINE", 25)) # secondes pour toute la requête
+# Rafraîchissement incrémental des univers: au plus FETCH_BUDGET tickers refetchés par passe,
+# par lots de FETCH_BATCH_SIZE, les plus anciens d'abord, dès qu'ils ont plus de UNIVERSE_MAX_AGE secondes.
+FETCH_BUDGET = int(os.getenv("FETCH_BUDGET", 200))
+FETCH_BATCH_SIZE = int(os.getenv("FETCH_BATCH_SIZE", 50))
+UNIVERSE_MAX_AGE_SECONDS = float(os.getenv("UNIVERSE_MAX_AGE", 900))
+# Un fetch abandonné (timeout) garde son thread jusqu'à la fin de l'appel yfinance: au-delà de
+# FETCH_MAX_ABANDONED threads ainsi bloqués, les nouvelles récupérations échouent aussitôt au lieu d'en empiler d'autres.
+FETCH_MAX_ABANDONED = int(os.getenv("FETCH_MAX_ABANDONED", 2 * FETCH_MAX_WORKERS))
+
+_fetch_executor = None
+_fetch_executor_abandoned = 0 # Workers du pool courant occupés par des fetchs abandonnés
+_abandoned_total = 0 # Tous pools confondus (pools retirés compris)
+_fetch_executor_lock = threading.Lock()
+
+def _current_fetch_executor():
+    """
+    Pool partagé par tout le processus (créé au premier usage). À appeler sous _fetch_executor_lock.
+    Dès que la moitié de ses workers sont bloqués par des fetchs abandonnés, il est retiré et remplacé par un pool neuf :
+    les threads bloqués se terminent seuls à la fin de leur appel, sans priver les requêtes suivantes de workers.
+    """
+    global _fetch_executor, _fetch_executor_abandoned
+    if _fetch_executor is not None and _fetch_executor_abandoned * 2 >= FETCH_MAX_WORKERS:
+        print(f"Pool de fetch remplacé: {_fetch_executor_abandoned} worker(s) bloqué(s) par des fetchs abandonnés.")
+        _fetch_executor.shutdown(wait=False)
+        _fetch_executor = None
+    if _fetch_executor is None:
+        _fetch_executor = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix="yf-fetch")
+        _fetch_executor_abandoned = 0
+    return _fetch_executor
+
+def _get_fetch_executor():
+    with _fetch_executor_lock:
+        return _current_fetch_executor()
+
+def _submit_fetch(func, *args):
+    """
+    Soumet `func(*args)` au pool courant. Pool et soumission sous le même verrou: un autre appelant ne peut pas
+    retirer (shutdown) le pool entre les deux, ce qui ferait échouer submit. Retourne (pool, future).
+    """
+    with _fetch_executor_lock:
+        executor = _current_fetch_executor()
+        return executor, executor.submit(func, *args)
+
+def _abandon_fetch(executor, future):
+    """Compte le worker occupé par `future` (abandonné en cours d'exécution) jusqu'à la fin de son appel."""
+    global _fetch_executor_abandoned, _abandoned_total
+    with _fetch_executor_lock:
+        _abandoned_total += 1
+        if executor is _fetch_executor:
+            _fetch_executor_abandoned += 1
+
+    def release(_):
+        global _fetch_executor_abandoned, _abandoned_total
+        with _fetch_executor_lock:
+            _abandoned_total -= 1
+            if executor is _fetch_executor:
+                _fetch_executor_abandoned -= 1
+    future.add_done_callback(release)
+
+def abandoned_fetch_count():
+    with _fetch_executor_lock:
+        return _abandoned_total
+
+# --- Cache partagé des tickers (prix + fondamentaux) ---
+# Une seule entrée par ticker, un TickerRecord (champs du scoring, des classements, de /detail et de /screen) ;
+# le payload `.info` complet n'est gardé que dans le stockage SQLite (voir get_full_ticker_info_or_stale).
+# Chaque appelant choisit la fraîcheur dont il a besoin : les vues affichant un prix exigent PRICE_TTL,
+# les vues purement fondamentales (dirigeants) FUNDAMENTALS_TTL.
+PRICE_TTL_SECONDS = float(os.getenv("CACHE_PRICE_TTL", 60))
+FUNDAMENTALS_TTL_SECONDS = float(os.getenv("CACHE_FUNDAMENTALS_TTL", 6 * 3600))
+CACHE_STALE_SECONDS = float(os.getenv("CACHE_STALE_SECONDS", 300)) # Fenêtre stale-while-revalidate
+# Le cache doit pouvoir contenir tout l'univers, sinon l'éviction LRU forcerait des refetchs en boucle
+CACHE_MAX_ENTRIES = max(int(os.getenv("CACHE_MAX_ENTRIES", 1024)), len(ETF_UNIVERSE) + len(ACTION_UNIVERSE) + 256)
+
+_last_refresh_attempt = {} # ticker -> dernier essai de rafraîchissement (réussi ou non)
+
+def _forget_refresh_attempt(ticker_symbol):
+    """Appelé à l'éviction d'un ticker du cache: son dernier essai n'a plus à être retenu."""
+    _last_refresh_attempt.pop(ticker_symbol, None)
+
+_info_cache = TTLCache(max_entries=CACHE_MAX_ENTRIES, ttl=PRICE_TTL_SECONDS, stale_ttl=CACHE_STALE_SECONDS, name="ticker_info",
+                       on_evict=_forget_refresh_attempt)
+
+_fundamentals_store = None # FundamentalsStore, ouvert par open_fundamentals_store()
+
+def _fetch_ticker_info(ticker_symbol):
+    with timed("yfinance.info"):
+        info = yahoo.call(lambda: yf.Ticker(ticker_symbol).info)
+    if _fundamentals_store is not None and info:
+        _fundamentals_store.queue(ticker_symbol, info)
+    return info
+
+def _load_ticker_record(ticker_symbol):
+    """Chargeur du cache: le payload complet part dans le stockage local, le cache n'en garde que l'extrait."""
+    return TickerRecord.from_info(ticker_symbol, _fetch_ticker_info(ticker_symbol))
+
+def get_ticker_info(ticker_symbol, max_age=None):
+    """Retourne le TickerRecord du ticker via le cache partagé (un seul fetch en vol par ticker)."""
+    return _info_cache.get_or_load(ticker_symbol, lambda: _load_ticker_record(ticker_symbol),
+                                   ttl=PRICE_TTL_SECONDS if max_age is None else max_age)
+
+def get_cached_ticker_info(ticker_symbol):
+    """(TickerRecord, fetched_at) depuis le cache quel que soit son âge, sans aucun appel réseau ; None si inconnu."""
+    return _info_cache.peek(ticker_symbol)
+
+def get_ticker_info_or_stale(ticker_symbol, max_age=None):
+    """
+    Comme get_ticker_info, mais si Yahoo est indisponible (circuit ouvert ou erreur), retourne la dernière valeur
+    connue. Retourne (info, fetched_at si la valeur est périmée sinon None) ; lève l'erreur si rien n'est connu.
+    """
+    try:
+        return get_ticker_info(ticker_symbol, max_age), None
+    except Exception as e:
+        cached = get_cached_ticker_info(ticker_symbol)
+        if cached is None or not cached[0]:
+            raise
+        if not isinstance(e, UpstreamUnavailable):
+            print(f"Erreur yfinance pour {ticker_symbol} ({e}), dernière valeur connue servie.")
+        return cached
+
+def get_full_ticker_info_or_stale(ticker_symbol, max_age=None):
+    """
+    Payload `.info` complet (résumé, dirigeants...), que le cache ne garde pas: ligne du stockage local si elle a
+    moins de `max_age`, sinon fetch (qui rafraîchit aussi le cache). Mêmes retours et même repli que
+    get_ticker_info_or_stale: dernière ligne stockée, ou à défaut le TickerRecord du cache.
+    Sans stockage local, chaque appel refetche.
+    """
+    max_age = PRICE_TTL_SECONDS if max_age is None else max_age
+    stored = _fundamentals_store.get(ticker_symbol) if _fundamentals_store is not None else None
+    if stored is not None and stored[0] and time.time() - stored[1] < max_age:
+        return stored[0], None
+    try:
+        info = _fetch_ticker_info(ticker_symbol)
+    except Exception as e:
+        fallback = stored if stored is not None and stored[0] else get_cached_ticker_info(ticker_symbol)
+        if fallback is None or not fallback[0]:
+            raise
+        if not isinstance(e, UpstreamUnavailable):
+            print(f"Erreur yfinance pour {ticker_symbol} ({e}), dernière valeur connue servie.")
+        return fallback
+    if info:
+        _info_cache.put(ticker_symbol, TickerRecord.from_info(ticker_symbol, info))
+    return info, None
+
+def open_fundamentals_store(path=FUNDAMENTALS_DB_FILE):
+    """
+    Ouvre le stockage local et pré-remplit le cache avec l'extrait (TickerRecord) de chaque ligne, horodatages
+    d'origine conservés: les lignes périmées seront donc refetchées normalement. Retourne le nombre de tickers chargés.
+    """
+    global _fundamentals_store, _store_synced_at
+    _fundamentals_store = FundamentalsStore(path)
+    loaded = 0
+    for ticker_symbol, info, fetched_at in _fundamentals_store.iter_all():
+        _info_cache.put(ticker_symbol, TickerRecord.from_info(ticker_symbol, info), stored_at=fetched_at)
+        _store_synced_at = max(_store_synced_at, fetched_at)
+        loaded += 1
+    return loaded
+
+_store_synced_at = 0.0 # Plus récent fetched_at déjà relu depuis le stockage
+STORE_SYNC_OVERLAP_SECONDS = 300 # Relecture de recouvrement: un payload peut être écrit (par lot) après sa récupération
+
+def sync_from_fundamentals_store():
+    """
+    Mode multi-réplicas: reprend dans le cache les payloads écrits dans le stockage partagé depuis la dernière
+    synchronisation (fetchs faits par les autres réplicas). Retourne le nombre de tickers mis à jour.
+    """
+    global _store_synced_at
+    if _fundamentals_store is None:
+        return 0
+    flush_fundamentals_store()
+    updated = 0
+    for ticker_symbol, info, fetched_at in _fundamentals_store.iter_all(_store_synced_at - STORE_SYNC_OVERLAP_SECONDS):
+        cached = _info_cache.peek(ticker_symbol)
+        if cached is None or cached[1] < fetched_at:
+            _info_cache.put(ticker_symbol, TickerRecord.from_info(ticker_symbol, info), stored_at=fetched_at)
+            updated += 1
+        _store_synced_at = max(_store_synced_at, fetched_at)
+    return updated
+
+def flush_fundamentals_store():
+    """Écrit en un lot les payloads récupérés depuis le dernier flush."""
+    if _fundamentals_store is not None:
+        _fundamentals_store.flush()
+
+def get_cache_stats():
+    """Compteurs du cache des tickers (hits, misses, coalesced...)."""
+    return _info_cache.stats()
+
+# --- Cotations légères (prix, variation) en un seul appel groupé ---
+# Pour les vues qui n'affichent que le prix (ex: /list): un yf.download pour tous les symboles
+# au lieu d'un scrape `.info` complet par ticker.
+_quote_cache = TTLCache(max_entries=CACHE_MAX_ENTRIES, ttl=PRICE_TTL_SECONDS, name="quotes")
+QUOTE_DOWNLOAD_BATCH = int(os.getenv("QUOTE_DOWNLOAD_BATCH", 200)) # tickers par yf.download de cotations
+
+def _download_quotes(tickers):
+    """Télécharge les dernières clôtures journalières de `tickers` en une requête. Retourne dict ticker -> cotation."""
+    with timed("yfinance.download"):
+        frame = yahoo.call(yf.download, tickers, period="5d", interval="1d", group_by="ticker", auto_adjust=False,
+                           progress=False, threads=True)
+    quotes = {}
+    if frame is None or frame.empty:
+        return quotes
+    for ticker_symbol in tickers:
+        try:
+            if isinstance(frame.columns, pd.MultiIndex):
+                closes = frame[ticker_symbol]["Close"].dropna()
+            else: # Ancien format à un seul niveau (un seul ticker)
+                closes = frame["Close"].dropna()
+        except KeyError:
+            continue
+        if closes.empty:
+            continue
+        price = float(closes.iloc[-1])
+        previous = float(closes.iloc[-2]) if len(closes) > 1 else None
+        change = price - previous if previous else None
+        quotes[ticker_symbol] = {
+            "price": price, "change": change,
+            "change_pct": change / previous if previous else None, # fraction, comme regularMarketChangePercent
+        }
+    return quotes
+
+def get_quotes_batch(tickers):
+    """
+    Cotations (prix, variation, variation %) de `tickers`, depuis le cache de cotations ou
+    via un unique téléchargement groupé pour les symboles manquants. Retourne dict ticker -> cotation.
+    """
+    quotes, missing = {}, []
+    for ticker_symbol in tickers:
+        quote = _quote_cache.get(ticker_symbol)
+        if quote is not None:
+            quotes[ticker_symbol] = quote
+        else:
+            missing.append(ticker_symbol)
+    if missing:
+        try:
+            fetched = _download_quotes(missing)
+        except Exception as e:
+            print(f"Erreur téléchargement groupé des cotations: {e}")
+            # Dernières cotations connues, marquées de leur âge (format_quote)
+            fetched = {t: {**quote, "stale_since": stored_at} for t, (quote, stored_at) in get_cached_quotes(missing).items()}
+        else:
+            for ticker_symbol, quote in fetched.items():
+                _quote_cache.put(ticker_symbol, quote)
+        quotes.update(fetched)
+    return quotes
+
+def get_cached_quotes(tickers):
+    """{ticker: (cotation, horodatage)} depuis le cache de cotations quel que soit leur âge, sans appel réseau."""
+    cached = {}
+    for ticker_symbol in tickers:
+        entry = _quote_cache.peek(ticker_symbol)
+        if entry is not None:
+            cached[ticker_symbol] = entry
+    return cached
+
+def refresh_quotes(tickers, batch_size=None, stop_event=None):
+    """
+    Retélécharge les cotations de `tickers` (dédoublonnés) par lots groupés et met le cache à jour,
+    quel que soit l'âge des entrées. Retourne le nombre de cotations obtenues.
+    """
+    batch_size = QUOTE_DOWNLOAD_BATCH if batch_size is None else batch_size
+    tickers = list(dict.fromkeys(tickers))
+    refreshed = 0
+    for start in range(0, len(tickers), batch_size):
+        if stop_event is not None and stop_event.is_set():
+            break
+        try:
+            fetched = _download_quotes(tickers[start:start + batch_size])
+        except Exception as e:
+            print(f"Erreur téléchargement groupé des cotations: {e}")
+            continue
+        for ticker_symbol, quote in fetched.items():
+            _quote_cache.put(ticker_symbol, quote)
+        refreshed += len(fetched)
+    return refreshed
+
+def format_quote(ticker_symbol, quote):
+    """Ligne d'affichage d'une cotation ; nom et devise repris du cache `.info` s'il est connu."""
+    cached = get_cached_ticker_info(ticker_symbol)
+    info = cached[0] if cached is not None else {}
+    name = info.get('longName', info.get('shortName', ticker_symbol))
+    currency = info.get('currency', '')
+    change_str = f"{quote['change']:+.2f}" if quote.get('change') is not None else "N/A"
+    change_pct_str = f"{quote['change_pct'] * 100:+.2f}%" if quote.get('change_pct') is not None else "N/A"
+    stale = stale_marker(quote["stale_since"]) if quote.get("stale_since") else ""
+    return f"{name} ({ticker_symbol}): {quote['price']:.2f} {currency} ({change_str} {currency}, {change_pct_str}){stale}"
+
+def get_quote_list_formatted(item_type="ETF", limit=10):
+    """Liste non triée des premiers tickers de l'univers, prix seulement (chemin rapide de /list)."""
+    tickers = get_universe(item_type)[:int(limit * 1.5)] # Un peu de marge pour les symboles sans cotation
+    quotes = get_quotes_batch(tickers)
+    entries = [{"ticker": t, "raw_price": quotes[t]["price"], "formatted_string": format_quote(t, quotes[t]),
+                "name": t, "score": -1000.0} for t in tickers if t in quotes]
+    return format_ranking(entries, item_type, limit, sort_by_score=False)
+
+# --- Historique des clôtures (scores momentum, volatilité, drawdown, Sharpe) ---
+# Une matrice mappée en mémoire pour tout l'univers (voir price_history.py), complétée par téléchargements groupés:
+# historique complet pour les nouveaux tickers, seulement les dernières séances pour les autres.
+PRICE_HISTORY_MAX_AGE_SECONDS = float(os.getenv("PRICE_HISTORY_MAX_AGE", 6 * 3600))
+HISTORY_DOWNLOAD_BATCH = int(os.getenv("HISTORY_DOWNLOAD_BATCH", 200)) # tickers par yf.download
+HISTORY_OVERLAP_DAYS = 7 # Séances récentes retéléchargées (clôtures corrigées, jours fériés décalés)
+
+_price_history = None
+_price_history_lock = threading.Lock()
+
+def get_price_history():
+    """Matrice d'historique partagée (ouverte au premier usage)."""
+    global _price_history
+    with _price_history_lock:
+        if _price_history is None:
+            _price_history = PriceHistory()
+        return _price_history
+
+def _download_closes(tickers, **period):
+    """Clôtures journalières ajustées de `tickers` en une requête. Retourne un DataFrame dates x tickers, ou None."""
+    with timed("yfinance.history"):
+        frame = yahoo.call(yf.download, tickers, interval="1d", group_by="ticker", auto_adjust=True, progress=False,
+                           threads=True, **period)
+    if frame is None or frame.empty:
+        return None
+    if isinstance(frame.columns, pd.MultiIndex):
+        available = set(frame.columns.get_level_values(0))
+        closes = {t: frame[t]["Close"] for t in tickers if t in available}
+    else: # Ancien format à un seul niveau (un seul ticker)
+        closes = {tickers[0]: frame["Close"]} if len(tickers) == 1 else {}
+    return pd.DataFrame(closes) if closes else None
+
+def refresh_price_history(tickers, max_age=None, stop_event=None):
+    """
+    Complète la matrice d'historique: les tickers inconnus sont téléchargés sur toute la fenêtre,
+    les autres (si la dernière mise à jour date de plus de `max_age`) sur les dernières séances seulement.
+    Retourne le nombre de tickers mis à jour.
+    """
+    history = get_price_history()
+    max_age = PRICE_HISTORY_MAX_AGE_SECONDS if max_age is None else max_age
+    tickers = list(dict.fromkeys(tickers))
+    jobs = []
+    new_tickers = [t for t in tickers if t not in history]
+    if new_tickers:
+        backfill_start = pd.Timestamp.today().normalize() - pd.Timedelta(days=int(PRICE_HISTORY_DAYS * 1.5))
+        jobs.append((new_tickers, backfill_start))
+    known_is_stale = time.time() - history.updated_at >= max_age
+    known_tickers = [t for t in tickers if t in history]
+    if known_is_stale and known_tickers:
+        jobs.append((known_tickers, pd.Timestamp(history.last_date) - pd.Timedelta(days=HISTORY_OVERLAP_DAYS)))
+
+    updated, failed = 0, False
+    for job_tickers, start in jobs:
+        for batch_start in range(0, len(job_tickers), HISTORY_DOWNLOAD_BATCH):
+            if stop_event is not None and stop_event.is_set():
+                break
+            batch = job_tickers[batch_start:batch_start + HISTORY_DOWNLOAD_BATCH]
+            try:
+                frame = _download_closes(batch, start=start.strftime("%Y-%m-%d"))
+            except Exception as e:
+                print(f"Erreur téléchargement de l'historique ({len(batch)} tickers): {e}")
+                failed = True
+                continue
+            if frame is not None:
+                history.upsert(frame)
+                updated += frame.shape[1]
+    if known_is_stale and not failed: # Sinon la mise à jour incrémentale sera retentée à la passe suivante
+        history.mark_updated()
+    else:
+        history.flush()
+    return updated
+
+def build_history_ranking(item_type="ETF", sort_by_score=True, score_type="momentum"):
+    """
+    Classe l'univers selon un score historique calculé en une passe sur la matrice (aucun appel réseau).
+    Retourne (entrées, date de la dernière mise à jour de l'historique ou None).
+    """
+    history = get_price_history()
+    closes, present = history.window(get_universe(item_type))
+    values = compute_history_scores(closes)[score_type]
+    prices = last_closes(closes)
+    higher_is_better = HISTORY_SCORE_TYPES[score_type][1]
+    entries = []
+    for ticker_symbol, value, price in zip(present, values.tolist(), prices.tolist()):
+        if value != value or price != price: # NaN: historique insuffisant
+            continue
+        cached = get_cached_ticker_info(ticker_symbol)
+        record = TickerRecord.from_info(ticker_symbol, cached[0] if cached is not None else {})
+        name = record.get('longName', record.get('shortName', ticker_symbol))
+        entries.append({
+            "ticker": ticker_symbol, "raw_price": price, "name": name, "record": record,
+            "score": value if higher_is_better else -value, "score_display": format_history_score(score_type, value),
+            "formatted_string": f"{name} ({ticker_symbol}): {price:.2f} {record.get('currency', '')}".rstrip(),
+        })
+    return _rank(entries, sort_by_score), (history.updated_at or None)
+
 # --- SCORING HEURISTIQUE LONG TERME ---
 # ATTENTION: Ces scores sont hautement simplifiés et ne garantissent rien.
 # Ils sont basés sur des indicateurs généraux. Faites TOUJOURS vos propres recherches.
+# Les poids sont partagés avec le scoring vectorisé (vectorized_scoring.py).
+LONG_TERM_STOCK_WEIGHTS = {
+    "profit_margin": 0.25,  # Marge bénéficiaire nette
+    "revenue_growth": 0.15, # Croissance des revenus (TTM)
+    "roe": 0.20,            # Return on Equity
+    "forward_pe": 0.20,     # Forward P/E (valorisation)
+    "debt_to_equity": 0.10, # Endettement
+    "dividend_sustainability": 0.10 # Dividende (si applicable et soutenable)
+}
+LONG_TERM_ETF_WEIGHTS = {
+    "5y_return": 0.6,
+    "expense_ratio": 0.4
+}
+
+def to_number(value):
+    """float(value), ou None si la valeur manque ou n'est pas numérique : une valeur non numérique compte comme absente."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
 
 def normalize_value(value, good_range_min, good_range_max, lower_is_better=False):
     """Normalise une valeur entre 0 et 10. Assure que value est un float."""
@@ -43,63 +506,54 @@ def normalize_value(value, good_range_min, good_range_max, lower_is_better=False
         if value <= good_range_min: return 0
         return 10 * (value - good_range_min) / (good_range_max - good_range_min)
 
-def calculate_long_term_stock_score(info):
+def calculate_long_term_stock_score(info, weights=None):
     score = 0
-    weights = {
-        "profit_margin": 0.25,  # Marge bénéficiaire nette
-        "revenue_growth": 0.15, # Croissance des revenus (TTM)
-        "roe": 0.20,            # Return on Equity
-        "forward_pe": 0.20,     # Forward P/E (valorisation)
-        "debt_to_equity": 0.10, # Endettement
-        "dividend_sustainability": 0.10 # Dividende (si applicable et soutenable)
-    }
+    weights = LONG_TERM_STOCK_WEIGHTS if weights is None else weights
 
+    # Chaque champ passe par to_number: une valeur non numérique ("n/a"...) est traitée comme absente
     # 1. Marge Bénéficiaire (profitMargins)
-    pm = info.get('profitMargins') # ex: 0.1 pour 10%
+    pm = to_number(info.get('profitMargins')) # ex: 0.1 pour 10%
     score += weights["profit_margin"] * normalize_value(pm, 0.05, 0.25) # Bon entre 5% et 25%+
 
     # 2. Croissance des Revenus (revenueGrowth - TTM, donc proxy limité)
-    rg = info.get('revenueGrowth') # ex: 0.1 pour 10%
+    rg = to_number(info.get('revenueGrowth')) # ex: 0.1 pour 10%
     score += weights["revenue_growth"] * normalize_value(rg, 0.03, 0.20) # Bon entre 3% et 20%+
 
     # 3. Return on Equity (returnOnEquity)
-    roe = info.get('returnOnEquity') # ex: 0.15 pour 15%
+    roe = to_number(info.get('returnOnEquity')) # ex: 0.15 pour 15%
     score += weights["roe"] * normalize_value(roe, 0.10, 0.30) # Bon entre 10% et 30%+
 
     # 4. Forward P/E (forwardPE) - Plus bas est mieux (avec limites)
-    fpe = info.get('forwardPE')
+    fpe = to_number(info.get('forwardPE'))
     if fpe is not None and fpe < 5 : fpe = 5 # Eviter P/E trop bas qui peuvent être des pièges
     score += weights["forward_pe"] * normalize_value(fpe, 10, 35, lower_is_better=True) # Bon entre 10 et 35
 
     # 5. Debt to Equity (debtToEquity) - Plus bas est mieux
-    dte = info.get('debtToEquity')
+    dte = to_number(info.get('debtToEquity'))
     if dte is not None: # Peut être négatif si fonds propres négatifs
          score += weights["debt_to_equity"] * normalize_value(dte, 0.1, 1.5, lower_is_better=True) # Bon entre 0.1 et 1.5
 
     # 6. Soutenabilité du dividende (si applicable)
-    div_yield = info.get('dividendYield')
-    payout_ratio = info.get('payoutRatio')
+    div_yield = to_number(info.get('dividendYield'))
+    payout_ratio = to_number(info.get('payoutRatio'))
     if div_yield is not None and div_yield > 0:
         if payout_ratio is not None and 0 < payout_ratio < 0.75: # Payout ratio raisonnable
             score += weights["dividend_sustainability"] * normalize_value(div_yield, 0.01, 0.05) # Bon rendement entre 1-5%
         # elif payout_ratio is None: # Si payout non dispo mais dividende existe, petite contribution
         #     score += (weights["dividend_sustainability"] / 2) * normalize_value(div_yield, 0.01, 0.05)
 
-    return round(score, 2) if pd.notna(score) and np.isfinite(score) else -1000.0
+    return round(score, 2) if math.isfinite(score) else -1000.0
 
-def calculate_long_term_etf_score(info):
+def calculate_long_term_etf_score(info, weights=None):
     score = 0
-    weights = {
-        "5y_return": 0.6,
-        "expense_ratio": 0.4
-    }
+    weights = LONG_TERM_ETF_WEIGHTS if weights is None else weights
     # 1. Performance 5 ans (fiveYearAverageReturn)
-    ret_5y = info.get('fiveYearAverageReturn')
-    if ret_5y is None: ret_5y = info.get('threeYearAverageReturn') # Fallback 3 ans
+    ret_5y = to_number(info.get('fiveYearAverageReturn'))
+    if ret_5y is None: ret_5y = to_number(info.get('threeYearAverageReturn')) # Fallback 3 ans (5 ans absent ou non numérique)
     score += weights["5y_return"] * normalize_value(ret_5y, 0.03, 0.15) # Bon entre 3% et 15%+ annuel
 
     # 2. Expense Ratio (annualReportExpenseRatio) - Souvent non disponible
-    er = info.get('annualReportExpenseRatio')
+    er = to_number(info.get('annualReportExpenseRatio'))
     # Si non dispo, on ne pénalise pas trop, mais on ne peut pas scorer positivement.
     # On pourrait mettre une pénalité par défaut si non trouvé, ou ignorer.
     if er is not None:
@@ -107,19 +561,28 @@ def calculate_long_term_etf_score(info):
     else: # Si frais non trouvés, on ne peut pas vraiment scorer cette partie
         score += weights["expense_ratio"] * 2 # Petite contribution par défaut si pas de frais, ou ne rien ajouter
 
-    return round(score, 2) if pd.notna(score) and np.isfinite(score) else -1000.0
+    return round(score, 2) if math.isfinite(score) else -1000.0
 
-def get_stock_data_with_score(ticker_symbol, is_etf=False, score_type="long_term"):
+def _unavailable_data(ticker_symbol):
+    """Résultat par défaut d'un ticker dont les données n'ont pas pu être obtenues."""
+    return {"ticker": ticker_symbol, "raw_price": None, "formatted_string": f"{ticker_symbol}: Données indisponibles",
+            "name": ticker_symbol, "score": -1000.0, "record": None}
+
+def get_stock_data_with_score(ticker_symbol, is_etf=False, score_type="long_term", info=None, score=None):
     """
     score_type peut être "long_term" ou un autre type futur.
-    Retourne un dict avec données formatées et score.
+    `info` permet de scorer un payload déjà connu sans appel réseau ; `score`, un score déjà calculé
+    (scoring vectorisé de tout l'univers, voir build_ranking_from_cache).
+    Retourne un dict avec données formatées et score ; seul un TickerRecord (champs du scoring et de l'affichage)
+    est gardé du payload, pas le payload complet.
     """
-    raw_data = {"ticker": ticker_symbol, "raw_price": None, "formatted_string": f"{ticker_symbol}: Données indisponibles",
-                "name": ticker_symbol, "score": -1000.0, "info_dict": {}}
+    raw_data = _unavailable_data(ticker_symbol)
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        info = ticker.info
-        raw_data["info_dict"] = info
+        stale_since = None
+        if info is None:
+            with timed("ticker.fetch"): # Cache compris: les hits apparaissent comme des fetchs quasi instantanés
+                info, stale_since = get_ticker_info_or_stale(ticker_symbol)
+        info = raw_data["record"] = TickerRecord.from_info(ticker_symbol, info)
 
         name = info.get('longName', info.get('shortName', ticker_symbol))
         raw_data["name"] = name
@@ -129,8 +592,11 @@ def get_stock_data_with_score(ticker_symbol, is_etf=False, score_type="long_term
         current_score = -1000.0
         if info and price is not None:
             raw_data["raw_price"] = float(price)
-            if score_type == "long_term":
-                current_score = calculate_long_term_etf_score(info) if is_etf else calculate_long_term_stock_score(info)
+            if score is not None:
+                current_score = score
+            elif score_type == "long_term":
+                with timed("scoring"):
+                    current_score = calculate_long_term_etf_score(info) if is_etf else calculate_long_term_stock_score(info)
             # Ajouter d'autres types de scores ici si besoin
             raw_data["score"] = current_score
 
@@ -141,6 +607,8 @@ def get_stock_data_with_score(ticker_symbol, is_etf=False, score_type="long_term
 
             price_str = f"{price:.2f}" if price is not None else "N/A"
             raw_data["formatted_string"] = f"{name} ({ticker_symbol}): {price_str} {currency} ({change_str} {currency}, {change_pct_str})"
+            if stale_since is not None:
+                raw_data["formatted_string"] += stale_marker(stale_since)
         else: # Si pas de prix ou d'info
             raw_data["formatted_string"] = f"{name} ({ticker_symbol}): Données de prix/infos de base manquantes"
 
@@ -151,16 +619,168 @@ def get_stock_data_with_score(ticker_symbol, is_etf=False, score_type="long_term
 
     return raw_data
 
-def get_selected_items_formatted(item_type="ETF", limit=10, sort_by_score=True, score_type="long_term"):
-    is_etf = item_type.upper() == "ETF"
-    tickers_list = DEFAULT_ETF_TICKERS if is_etf else DEFAULT_ACTION_TICKERS
+def _run_concurrently(func, items, ticker_timeout=None, total_deadline=None):
+    """
+    Exécute `func(item)` pour chaque élément sur le pool partagé.
+    Un élément qui dépasse `ticker_timeout` (compté depuis son démarrage effectif) ou qui n'a pas
+    fini avant `total_deadline` est abandonné : son résultat vaut None et il ne bloque jamais les autres.
+    Retourne les résultats dans l'ordre de `items` (que des None si trop de threads sont déjà bloqués, voir FETCH_MAX_ABANDONED).
+    """
+    ticker_timeout = FETCH_TICKER_TIMEOUT if ticker_timeout is None else ticker_timeout
+    total_deadline = FETCH_TOTAL_DEADLINE if total_deadline is None else total_deadline
+    results = [None] * len(items)
+    abandoned_count = abandoned_fetch_count()
+    if abandoned_count >= FETCH_MAX_ABANDONED:
+        print(f"Récupération ignorée: {abandoned_count} fetch(s) abandonné(s) encore en cours.")
+        return results
+    started_at = {} # index -> instant où un worker a réellement commencé l'élément
+    pending = {} # future -> index
+    owners = {} # future -> pool qui l'exécute (le pool peut être remplacé en cours de route)
+
+    def run(index, item):
+        started_at[index] = time.monotonic()
+        return func(item)
+
+    def submit(index):
+        executor, fut = _submit_fetch(run, index, items[index])
+        owners[fut] = executor
+        pending[fut] = index
+
+    for i in range(len(items)):
+        submit(i)
+    deadline = time.monotonic() + total_deadline
+
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        # Se réveiller à la prochaine échéance: fin globale ou expiration du plus ancien élément en cours
+        wake_in = deadline - now
+        for i in pending.values():
+            if i in started_at:
+                wake_in = min(wake_in, started_at[i] + ticker_timeout - now)
+        done, _ = wait(pending, timeout=max(wake_in, 0), return_when=FIRST_COMPLETED)
+        for fut in done:
+            i = pending.pop(fut)
+            try:
+                results[i] = fut.result()
+            except Exception as e:
+                print(f"Erreur fetch concurrent pour {items[i]}: {e}")
+
+        now = time.monotonic()
+        abandoned = False
+        for fut, i in list(pending.items()):
+            if i in started_at and now - started_at[i] >= ticker_timeout:
+                # On cesse d'attendre: le thread terminera seul et son résultat sera ignoré
+                del pending[fut]
+                _abandon_fetch(owners[fut], fut)
+                abandoned = True
+        if abandoned:
+            # Pool retiré: les éléments pas encore démarrés repartent sur le nouveau au lieu d'attendre des workers bloqués
+            current = _get_fetch_executor()
+            for fut, i in list(pending.items()):
+                if owners[fut] is not current and fut.cancel():
+                    del pending[fut]
+                    submit(i)
+
+    for fut in pending:
+        # Les éléments pas encore démarrés ne consomment pas de worker ; les autres sont comptés comme bloqués
+        if not fut.cancel():
+            _abandon_fetch(owners[fut], fut)
+    if pending:
+        print(f"Échéance globale atteinte: {len(pending)} ticker(s) ignoré(s).")
+    flush_fundamentals_store()
+    return results
+
+def refresh_stale_tickers(tickers, budget=None, max_age=None, batch_size=None, stop_event=None):
+    """
+    Refetch les tickers absents du cache ou plus vieux que `max_age`, les plus anciens d'abord,
+    dans la limite de `budget` tickers, par lots concurrents de `batch_size`.
+    Retourne le nombre de tickers effectivement rafraîchis.
+    """
+    budget = FETCH_BUDGET if budget is None else budget
+    max_age = UNIVERSE_MAX_AGE_SECONDS if max_age is None else max_age
+    batch_size = FETCH_BATCH_SIZE if batch_size is None else batch_size
+    now = time.time()
+    # Un essai plus vieux que max_age ne retarde plus rien: on l'oublie (tickers en échec jamais entrés dans le cache)
+    for ticker_symbol, attempted_at in list(_last_refresh_attempt.items()):
+        if now - attempted_at >= max(max_age, UNIVERSE_MAX_AGE_SECONDS):
+            _last_refresh_attempt.pop(ticker_symbol, None)
+    due = []
+    for ticker_symbol in dict.fromkeys(tickers): # Dédoublonné, ordre conservé
+        cached = _info_cache.peek(ticker_symbol)
+        fetched_at = cached[1] if cached is not None else 0.0
+        # Un ticker en échec (délisté...) attend lui aussi max_age avant un nouvel essai: il ne monopolise pas le budget
+        fetched_at = max(fetched_at, _last_refresh_attempt.get(ticker_symbol, 0.0))
+        if now - fetched_at >= max_age:
+            due.append((fetched_at, ticker_symbol))
+    due.sort(key=lambda x: x[0])
+    due = [t for _, t in due[:budget]]
+
+    refreshed = 0
+    for start in range(0, len(due), batch_size):
+        if stop_event is not None and stop_event.is_set():
+            break
+        if yahoo.is_open(): # Inutile d'entamer le budget: les tickers restants seront repris à la passe suivante
+            print("Rafraîchissement interrompu: Yahoo indisponible (circuit ouvert).")
+            break
+        batch = due[start:start + batch_size]
+        for ticker_symbol in batch:
+            _last_refresh_attempt[ticker_symbol] = now
+        # ttl=0: on force le refetch, tout en partageant un éventuel fetch déjà en vol pour le même ticker
+        results = _run_concurrently(
+            lambda t: _info_cache.get_or_load(t, lambda: _load_ticker_record(t), ttl=0, stale_ttl=0), batch)
+        refreshed += sum(1 for r in results if r is not None)
+    return refreshed
+
+def _rank(data_objects, sort_by_score):
+    # Filtrer les données invalides (score très bas signifie souvent un problème de données)
+    valid_data = [d for d in data_objects if d["score"] > -999.0 and d["raw_price"] is not None]
     
+    if sort_by_score and valid_data:
+        valid_data.sort(key=lambda x: x["score"], reverse=True)
+    return valid_data
+
+@timed_function("ranking.build")
+def build_ranking_from_cache(item_type="ETF", sort_by_score=True, score_type="long_term"):
+    """
+    Classe tout l'univers à partir des payloads déjà en cache, quel que soit leur âge (aucun appel réseau).
+    Retourne (entrées, horodatage du payload le plus ancien utilisé) ; l'horodatage est None si rien n'est en cache.
+    """
+    if score_type in HISTORY_SCORE_TYPES:
+        return build_history_ranking(item_type, sort_by_score, score_type)
+    is_etf = item_type.upper() == "ETF"
+    records, oldest = {}, None
+    for ticker_symbol in get_universe(item_type):
+        cached = get_cached_ticker_info(ticker_symbol)
+        if cached is None:
+            continue
+        info, fetched_at = cached
+        records[ticker_symbol] = TickerRecord.from_info(ticker_symbol, info)
+        oldest = fetched_at if oldest is None else min(oldest, fetched_at)
+    scores = [None] * len(records)
+    if score_type == "long_term" and records:
+        # Import local: vectorized_scoring importe ce module (poids et fonctions par dict pour la parité)
+        from vectorized_scoring import score_universe
+        with timed("scoring"):
+            scores = score_universe(records, is_etf).tolist()
+    data_objects = [get_stock_data_with_score(ticker_symbol, is_etf, score_type, info=record, score=score)
+                    for (ticker_symbol, record), score in zip(records.items(), scores)]
+    return _rank(data_objects, sort_by_score), oldest
+
+@timed_function("ranking.format")
+def format_ranking(valid_data, item_type="ETF", limit=10, sort_by_score=True, score_type="long_term", footer=""):
+    """Met en forme les `limit` premières entrées d'un classement déjà construit (voir build_ranking_from_cache)."""
+    is_etf = item_type.upper() == "ETF"
+
     # Adaptez le titre en fonction du tri et du type de score
     sort_description = ""
     if sort_by_score:
         if score_type == "long_term":
             sort_description = "par Potentiel LT (Score Desc.)"
         # Ajoutez d'autres descriptions pour d'autres types de scores
+        elif score_type in HISTORY_SCORE_TYPES:
+            sort_description = f"par {HISTORY_SCORE_TYPES[score_type][0]} ({PRICE_HISTORY_DAYS} séances)"
         else:
             sort_description = "par Score Desc."
     
@@ -168,73 +788,78 @@ def get_selected_items_formatted(item_type="ETF", limit=10, sort_by_score=True,
     if not sort_by_score: # Si pas de tri par score, titre générique
         title_prefix = f"📈 **ETFs Sélectionnés :**" if is_etf else f"📊 **Actions Sélectionnées :**"
 
-    # Récupérer un peu plus de données pour avoir une meilleure sélection après filtrage et tri
-    data_objects = [get_stock_data_with_score(ticker, is_etf, score_type) for ticker in tickers_list[:int(limit * 1.5)]]
-
-    # Filtrer les données invalides (score très bas signifie souvent un problème de données)
-    valid_data = [d for d in data_objects if d["score"] > -999.0 and d["raw_price"] is not None]
-    
-    if sort_by_score and valid_data:
-        valid_data.sort(key=lambda x: x["score"], reverse=True)
-
     # Construire la liste formatée finale
     final_formatted_list = []
     for d in valid_data[:limit]:
         # Inclure le score dans l'affichage si trié par score
         score_display = f" (Score LT: {d['score']:.1f})" if sort_by_score and score_type=="long_term" else ""
+        if sort_by_score and d.get("score_display"):
+            score_display = f" ({d['score_display']})"
         final_formatted_list.append(f"{d['formatted_string']}{score_display}")
     
     if not final_formatted_list:
         final_formatted_list.append("_Aucune donnée exploitable trouvée pour le classement actuel._")
     elif len(valid_data) < limit:
          final_formatted_list.append("\n_Moins d'éléments que demandé ont pu être classés._")
+    if footer:
+        final_formatted_list.append(footer)
 
     return title_prefix + "\n" + "\n".join(final_formatted_list)
 
 # --- Fonctions de récupération de données détaillées (inchangées par rapport à la version précédente) ---
+def detailed_fields(ticker_symbol, info):
+    """Champs de /detail extraits d'un payload `.info` (aussi les colonnes filtrables par /screen)."""
+    return {
+        "ticker": ticker_symbol, "longName": info.get('longName'), "shortName": info.get('shortName'), "currency": info.get('currency'),
+        "currentPrice": info.get('currentPrice', info.get('regularMarketPrice', info.get('previousClose'))),
+        "previousClose": info.get('previousClose'), "dayHigh": info.get('dayHigh'), "dayLow": info.get('dayLow'),
+        "fiftyTwoWeekHigh": info.get('fiftyTwoWeekHigh'), "fiftyTwoWeekLow": info.get('fiftyTwoWeekLow'),
+        "regularMarketChange": info.get('regularMarketChange'), "regularMarketChangePercent": info.get('regularMarketChangePercent'),
+        "marketCap": info.get('marketCap'), "volume": info.get('regularMarketVolume', info.get('volume')),
+        "averageVolume": info.get('averageVolume'), "trailingPE": info.get('trailingPE'), "forwardPE": info.get('forwardPE'),
+        "dividendYield": info.get('dividendYield'), "payoutRatio": info.get('payoutRatio'), "beta": info.get('beta'),
+        "sector": info.get('sector'), "industry": info.get('industry'), "website": info.get('website'),
+        "longBusinessSummary": info.get('longBusinessSummary'),
+    }
+
 def get_detailed_stock_data(ticker_symbol):
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        info = ticker.info
+        # Payload complet: le résumé d'activité n'est pas gardé dans le cache
+        info, stale_since = get_full_ticker_info_or_stale(ticker_symbol)
         if not info or info.get('regularMarketPrice') is None and info.get('currentPrice') is None and info.get('previousClose') is None :
-            hist = ticker.history(period="1d")
+            hist = yahoo.call(lambda: yf.Ticker(ticker_symbol).history(period="1d"))
             if hist.empty:
                  return {"error": f"Aucune donnée pour {ticker_symbol} (invalide/délisté?)."}
-        data = {
-            "ticker": ticker_symbol, "longName": info.get('longName'), "shortName": info.get('shortName'), "currency": info.get('currency'),
-            "currentPrice": info.get('currentPrice', info.get('regularMarketPrice', info.get('previousClose'))),
-            "previousClose": info.get('previousClose'), "dayHigh": info.get('dayHigh'), "dayLow": info.get('dayLow'),
-            "fiftyTwoWeekHigh": info.get('fiftyTwoWeekHigh'), "fiftyTwoWeekLow": info.get('fiftyTwoWeekLow'),
-            "regularMarketChange": info.get('regularMarketChange'), "regularMarketChangePercent": info.get('regularMarketChangePercent'),
-            "marketCap": info.get('marketCap'), "volume": info.get('regularMarketVolume', info.get('volume')),
-            "averageVolume": info.get('averageVolume'), "trailingPE": info.get('trailingPE'), "forwardPE": info.get('forwardPE'),
-            "dividendYield": info.get('dividendYield'), "payoutRatio": info.get('payoutRatio'), "beta": info.get('beta'),
-            "sector": info.get('sector'), "industry": info.get('industry'), "website": info.get('website'),
-            "longBusinessSummary": info.get('longBusinessSummary')
-        }
+        data = detailed_fields(ticker_symbol, info)
+        data["stale_since"] = stale_since # Horodatage si Yahoo n'a pas répondu et que la dernière valeur connue est servie
         return data
+    except UpstreamUnavailable as e:
+        return {"error": f"Données indisponibles pour {ticker_symbol}: {e}."}
     except Exception as e:
         return {"error": f"Erreur récupération données détaillées pour {ticker_symbol}: {str(e)}"}
 
 def get_company_officers(ticker_symbol):
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        short_name = ticker.info.get('shortName', ticker_symbol)
-        officers = ticker.info.get('companyOfficers', [])
+        info, stale_since = get_full_ticker_info_or_stale(ticker_symbol, max_age=FUNDAMENTALS_TTL_SECONDS)
+        short_name = info.get('shortName', ticker_symbol)
+        officers = info.get('companyOfficers', [])
         if not officers: return f"Aucune info dirigeant pour {short_name}."
         
         officers_info_list = [f"- {o.get('name')} ({o.get('title')})" for o in officers if o.get('name') and o.get('title')]
         if not officers_info_list: return f"Aucune info détaillée dirigeant pour {short_name}."
         
-        return f"🧑‍💼 **Dirigeants de {short_name}:**\n" + "\n".join(officers_info_list)
+        stale = stale_marker(stale_since) if stale_since is not None else ""
+        return f"🧑‍💼 **Dirigeants de {short_name}:**{stale}\n" + "\n".join(officers_info_list)
     except Exception as e:
         return f"Erreur récupération dirigeants pour {ticker_symbol}: {str(e)}"
 
 # if __name__ == '__main__':
 #     print("--- Actions triées par Potentiel Long Terme (Score Desc.) ---")
-#     print(get_selected_items_formatted(item_type="ACTION", limit=10, sort_by_score=True, score_type="long_term"))
+#     refresh_stale_tickers(ACTION_UNIVERSE)
+#     print(format_ranking(build_ranking_from_cache("ACTION")[0], item_type="ACTION", limit=10))
 #     print("\n" + "="*40 + "\n")
 #     print("--- ETFs triés par Potentiel Long Terme (Score Desc.) ---")
-#     print(get_selected_items_formatted(item_type="ETF", limit=10, sort_by_score=True, score_type="long_term"))
+#     refresh_stale_tickers(ETF_UNIVERSE)
+#     print(format_ranking(build_ranking_from_cache("ETF")[0], item_type="ETF", limit=10))
 #     # print("\n--- Test détaillé AAPL ---")
 #     # print(get_detailed_stock_data("AAPL"))
\ No newline at end of file
@@ -0,0 +1,111 @@
+# fundamentals_store.py
+# Stockage local (SQLite) des payloads yfinance: une ligne par ticker + date de récupération.
+# Permet à un processus redémarré de servir immédiatement les classements avec les dernières données connues.
+import json
+import os
+import sqlite3
+import threading
+import time
+
+FUNDAMENTALS_DB_FILE = os.getenv("FUNDAMENTALS_DB_FILE", "fundamentals_cache.sqlite3")
+FUNDAMENTALS_FLUSH_BATCH = int(os.getenv("FUNDAMENTALS_FLUSH_BATCH", 50))
+FUNDAMENTALS_LOAD_PAGE = int(os.getenv("FUNDAMENTALS_LOAD_PAGE", 500)) # Lignes décodées à la fois par iter_all
+
+class FundamentalsStore:
+    """Table `tickers(ticker, payload JSON, fetched_at)`. Les écritures sont regroupées et faites par lots."""
+
+    def __init__(self, path=FUNDAMENTALS_DB_FILE, flush_batch=FUNDAMENTALS_FLUSH_BATCH):
+        self.path = path
+        self.flush_batch = flush_batch
+        self._pending = {} # ticker -> (payload, fetched_at), en attente d'écriture
+        self._lock = threading.Lock()
+        # Attente prolongée des verrous: le fichier peut être partagé par plusieurs réplicas (voir shared_state.py)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tickers ("
+                " ticker TEXT PRIMARY KEY, payload TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+
+    def iter_all(self, fetched_after=None, page_size=FUNDAMENTALS_LOAD_PAGE):
+        """
+        Itère sur (ticker, payload_dict, fetched_at) pour toutes les lignes lisibles (seulement celles récupérées
+        après `fetched_after` si donné, ex: écrites par une autre réplica). Lecture par pages de `page_size` tickers:
+        l'appelant peut ne garder qu'un extrait de chaque payload sans que toute la table soit décodée à la fois.
+        """
+        last_ticker = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT ticker, payload, fetched_at FROM tickers WHERE ticker > ? AND fetched_at > ?"
+                    " ORDER BY ticker LIMIT ?",
+                    (last_ticker, float("-inf") if fetched_after is None else fetched_after, page_size)).fetchall()
+            for ticker, payload, fetched_at in rows:
+                try:
+                    decoded = json.loads(payload)
+                except ValueError:
+                    print(f"Payload illisible pour {ticker} dans {self.path}, ignoré.")
+                    continue
+                yield ticker, decoded, fetched_at
+            if len(rows) < page_size:
+                return
+            last_ticker = rows[-1][0]
+
+    def load_all(self, fetched_after=None):
+        """Comme iter_all, en liste: [(ticker, payload_dict, fetched_at), ...]."""
+        return list(self.iter_all(fetched_after))
+
+    def get(self, ticker):
+        """(payload_dict, fetched_at) le plus récent pour `ticker` (écriture en attente comprise) ; None si inconnu."""
+        with self._lock:
+            pending = self._pending.get(ticker)
+            if pending is not None:
+                return pending
+            row = self._conn.execute("SELECT payload, fetched_at FROM tickers WHERE ticker = ?", (ticker,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError:
+            print(f"Payload illisible pour {ticker} dans {self.path}, ignoré.")
+            return None
+
+    def queue(self, ticker, payload, fetched_at=None):
+        """Met une ligne en attente ; écrit le lot dès que `flush_batch` lignes sont en attente."""
+        with self._lock:
+            self._pending[ticker] = (payload, time.time() if fetched_at is None else fetched_at)
+            should_flush = len(self._pending) >= self.flush_batch
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """
+        Écrit toutes les lignes en attente dans une seule transaction.
+        Elles ne quittent la file qu'une fois la transaction validée: après une erreur SQLite, elles restent
+        en attente pour le flush suivant (seuls les payloads non sérialisables sont abandonnés).
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+            rows = []
+            for ticker, (payload, fetched_at) in list(self._pending.items()):
+                try:
+                    rows.append((ticker, json.dumps(payload, default=str), fetched_at))
+                except (TypeError, ValueError) as e:
+                    print(f"Payload non sérialisable pour {ticker}: {e}")
+                    del self._pending[ticker]
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO tickers (ticker, payload, fetched_at) VALUES (?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                print(f"Erreur écriture {self.path}: {e} ({len(rows)} ligne(s) gardée(s) en attente)")
+                return 0
+            self._pending = {}
+        return len(rows)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
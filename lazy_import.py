@@ -0,0 +1,30 @@
+# lazy_import.py
+# Import différé des modules lourds (yfinance, pandas, numpy...): le démarrage du bot n'attend pas leur chargement.
+import importlib
+import threading
+
+class LazyModule:
+    """Se comporte comme le module `name`, importé au premier accès à l'un de ses attributs."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def warm(self):
+        """Importe le module maintenant (préchauffage en arrière-plan)."""
+        self._load()
+
+    def __repr__(self):
+        state = "chargé" if self._module is not None else "non chargé"
+        return f"<LazyModule {self._name} ({state})>"
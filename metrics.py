@@ -0,0 +1,197 @@
+# metrics.py
+# Mesures des étapes chaudes du bot (yfinance, scoring, formatage, Gemini, envois Telegram, tâches planifiées):
+# histogrammes de latence, compteurs d'erreurs et ratios de cache, lisibles via /metrics ou au format Prometheus.
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0)) # 0 = pas d'endpoint HTTP
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Bornes supérieures des seaux d'histogramme, en secondes
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class StageHistogram:
+    """Histogramme cumulable (seaux fixes) des durées d'une étape, avec son nombre d'erreurs."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Dernier seau: au-delà de la plus grande borne
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.total += seconds
+            self.count += 1
+            if seconds > self.max:
+                self.max = seconds
+            if error:
+                self.errors += 1
+
+    def quantile(self, q):
+        """Estimation du quantile `q` (borne supérieure du seau qui le contient, au plus le maximum observé)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = q * self.count
+            seen = 0
+            for i, n in enumerate(self.counts):
+                seen += n
+                if seen >= target:
+                    return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+            return self.max
+
+    def snapshot(self):
+        with self._lock:
+            return {"count": self.count, "errors": self.errors, "sum": self.total, "max": self.max,
+                    "counts": list(self.counts)}
+
+_stages = {} # nom d'étape -> StageHistogram
+_stages_lock = threading.Lock()
+_gauge_sources = {} # nom -> fonction retournant une liste de dicts (ex: TTLCache.stats)
+
+def get_stage(name):
+    histogram = _stages.get(name)
+    if histogram is None:
+        with _stages_lock:
+            histogram = _stages.setdefault(name, StageHistogram())
+    return histogram
+
+def observe(name, seconds, error=False):
+    get_stage(name).observe(seconds, error)
+
+@contextmanager
+def timed(name):
+    """Mesure le bloc `with` sous l'étape `name` ; une exception est comptée comme erreur puis propagée."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        observe(name, time.perf_counter() - started, error=True)
+        raise
+    observe(name, time.perf_counter() - started)
+
+def timed_function(name):
+    """Décorateur: chaque appel de la fonction est mesuré sous l'étape `name`."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def instrument_async_method(obj, method_name, stage_name):
+    """Remplace la méthode asynchrone `obj.method_name` par une version mesurée (ex: bot.send_message)."""
+    method = getattr(obj, method_name)
+
+    @wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = await method(*args, **kwargs)
+        except BaseException:
+            observe(stage_name, time.perf_counter() - started, error=True)
+            raise
+        observe(stage_name, time.perf_counter() - started)
+        return result
+    setattr(obj, method_name, wrapper)
+
+def register_cache_source(name, stats_func):
+    """`stats_func()` retourne un dict ou une liste de dicts TTLCache.stats(), lus à chaque rendu."""
+    _gauge_sources[name] = stats_func
+
+def _cache_stats():
+    stats = []
+    for name, stats_func in list(_gauge_sources.items()):
+        try:
+            result = stats_func()
+        except Exception as e:
+            print(f"Erreur lecture des statistiques {name}: {e}")
+            continue
+        stats.extend(result if isinstance(result, list) else [result])
+    return stats
+
+def format_metrics_summary():
+    """Résumé texte (Markdown Telegram) pour /metrics."""
+    lines = ["📈 *Métriques* (p50 / p95 / max en ms, appels, erreurs)"]
+    with _stages_lock:
+        stages = sorted(_stages.items())
+    if not stages:
+        lines.append("Aucune mesure pour l'instant.")
+    for name, histogram in stages:
+        snap = histogram.snapshot()
+        lines.append(
+            f"`{name}`: {histogram.quantile(0.5) * 1000:.0f} / {histogram.quantile(0.95) * 1000:.0f} / "
+            f"{snap['max'] * 1000:.0f} ms, {snap['count']} appels, {snap['errors']} erreurs"
+        )
+    for stats in _cache_stats():
+        lines.append(f"Cache `{stats['name']}`: {stats['hit_ratio'] * 100:.1f}% hits ({stats['size']}/{stats['max_entries']})")
+    return "\n".join(lines)
+
+def render_prometheus():
+    """Toutes les mesures au format texte d'exposition Prometheus."""
+    lines = [
+        "# HELP bot_stage_duration_seconds Durée des étapes du bot.",
+        "# TYPE bot_stage_duration_seconds histogram",
+    ]
+    with _stages_lock:
+        stages = sorted(_stages.items())
+    errors = []
+    for name, histogram in stages:
+        snap = histogram.snapshot()
+        cumulative = 0
+        for bound, n in zip(histogram.buckets, snap["counts"]):
+            cumulative += n
+            lines.append(f'bot_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'bot_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {snap["count"]}')
+        lines.append(f'bot_stage_duration_seconds_sum{{stage="{name}"}} {snap["sum"]:.6f}')
+        lines.append(f'bot_stage_duration_seconds_count{{stage="{name}"}} {snap["count"]}')
+        errors.append(f'bot_stage_errors_total{{stage="{name}"}} {snap["errors"]}')
+    lines += ["# HELP bot_stage_errors_total Erreurs par étape.", "# TYPE bot_stage_errors_total counter"] + errors
+    lines += ["# HELP bot_cache_hit_ratio Ratio de hits des caches.", "# TYPE bot_cache_hit_ratio gauge"]
+    cache_stats = _cache_stats()
+    for stats in cache_stats:
+        lines.append(f'bot_cache_hit_ratio{{cache="{stats["name"]}"}} {stats["hit_ratio"]}')
+    lines += ["# HELP bot_cache_entries Entrées en cache.", "# TYPE bot_cache_entries gauge"]
+    for stats in cache_stats:
+        lines.append(f'bot_cache_entries{{cache="{stats["name"]}"}} {stats["size"]}')
+    return "\n".join(lines) + "\n"
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Pas de log par requête de scraping
+
+def start_metrics_server(port=None, host=None):
+    """Sert /metrics (format Prometheus) dans un thread daemon. Retourne le serveur, ou None si désactivé."""
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host or METRICS_HOST, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Métriques Prometheus sur http://{host or METRICS_HOST}:{port}/metrics")
+    return server
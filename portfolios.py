@@ -0,0 +1,233 @@
+# portfolios.py
+# Listes de suivi (/watch) et portefeuilles (/portfolio) par chat, stockés dans SQLite.
+# Un thread rafraîchit à chaque passe l'union des symboles de tous les chats en téléchargements groupés:
+# 500 chats qui suivent AAPL coûtent une seule cotation. Les commandes lisent ensuite le cache, sans appel réseau.
+import os
+import sqlite3
+import threading
+import time
+
+from lazy_import import LazyModule
+from financial_data import (
+    format_age, get_cached_quotes, get_cached_ticker_info, get_quotes_batch, refresh_quotes, refresh_stale_tickers,
+    calculate_long_term_etf_score, calculate_long_term_stock_score
+)
+from metrics import observe
+
+np = LazyModule("numpy")
+
+PORTFOLIOS_DB_FILE = os.getenv("PORTFOLIOS_DB_FILE", "portfolios.sqlite3")
+PORTFOLIO_REFRESH_SECONDS = float(os.getenv("PORTFOLIO_REFRESH_SECONDS", 120))
+PORTFOLIO_MAX_TICKERS = int(os.getenv("PORTFOLIO_MAX_TICKERS", 50)) # Par chat, liste de suivi et positions chacune
+
+class PortfolioStore:
+    """
+    Tables `watchlist(chat_id, ticker)` et `positions(chat_id, ticker, quantity, cost_basis)`, écrites à chaque changement.
+    Le contenu est gardé en mémoire: lectures par chat et union des symboles sans requête SQL.
+    Les modifications sont décidées par la table (la copie mémoire d'une réplica peut être en retard, voir reload).
+    """
+
+    def __init__(self, path=PORTFOLIOS_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._watchlists = {} # chat_id -> [tickers] (ordre d'ajout)
+        self._positions = {} # chat_id -> {ticker: (quantité, prix de revient ou None)}
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS watchlist ("
+                " chat_id INTEGER NOT NULL, ticker TEXT NOT NULL, added_at REAL NOT NULL, PRIMARY KEY (chat_id, ticker))")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS positions ("
+                " chat_id INTEGER NOT NULL, ticker TEXT NOT NULL, quantity REAL NOT NULL, cost_basis REAL,"
+                " updated_at REAL NOT NULL, PRIMARY KEY (chat_id, ticker))")
+        self.reload()
+
+    def reload(self):
+        """Relit les tables (mode multi-réplicas: changements faits par les autres réplicas)."""
+        watchlists, positions = {}, {}
+        with self._lock:
+            for chat_id, ticker in self._conn.execute("SELECT chat_id, ticker FROM watchlist ORDER BY added_at"):
+                watchlists.setdefault(chat_id, []).append(ticker)
+            for chat_id, ticker, quantity, cost_basis in self._conn.execute(
+                    "SELECT chat_id, ticker, quantity, cost_basis FROM positions ORDER BY updated_at"):
+                positions.setdefault(chat_id, {})[ticker] = (quantity, cost_basis)
+            self._watchlists, self._positions = watchlists, positions
+
+    def tickers(self, owns_chat=None):
+        """Union dédoublonnée des symboles suivis ou détenus par tous les chats (ceux pour lesquels `owns_chat(chat_id)` si donné)."""
+        keep = owns_chat or (lambda chat_id: True)
+        with self._lock:
+            union = dict.fromkeys(t for chat_id, tickers in self._watchlists.items() if keep(chat_id) for t in tickers)
+            union.update(dict.fromkeys(t for chat_id, positions in self._positions.items() if keep(chat_id) for t in positions))
+        return list(union)
+
+    def watchlist(self, chat_id):
+        with self._lock:
+            return list(self._watchlists.get(chat_id, []))
+
+    def toggle_watch(self, chat_id, ticker):
+        """Ajoute `ticker` à la liste de suivi du chat, ou l'en retire (selon la table). Retourne True s'il est désormais suivi."""
+        with self._lock, self._conn:
+            tickers = self._watchlists.setdefault(chat_id, [])
+            if self._conn.execute("DELETE FROM watchlist WHERE chat_id = ? AND ticker = ?", (chat_id, ticker)).rowcount:
+                if ticker in tickers:
+                    tickers.remove(ticker)
+                return False
+            self._conn.execute("INSERT INTO watchlist (chat_id, ticker, added_at) VALUES (?, ?, ?)",
+                               (chat_id, ticker, time.time()))
+            if ticker not in tickers:
+                tickers.append(ticker)
+            return True
+
+    def positions(self, chat_id):
+        """[(ticker, quantité, prix de revient ou None), ...] dans l'ordre d'ajout."""
+        with self._lock:
+            return [(t, q, c) for t, (q, c) in self._positions.get(chat_id, {}).items()]
+
+    def set_position(self, chat_id, ticker, quantity, cost_basis=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO positions (chat_id, ticker, quantity, cost_basis, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (chat_id, ticker, quantity, cost_basis, time.time()))
+            positions = self._positions.setdefault(chat_id, {})
+            positions.pop(ticker, None) # Réinsertion: la position modifiée passe en fin de liste, comme en base
+            positions[ticker] = (quantity, cost_basis)
+
+    def remove_position(self, chat_id, ticker):
+        """Retourne True si la position existait (dans la table)."""
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM positions WHERE chat_id = ? AND ticker = ?", (chat_id, ticker)).rowcount
+            self._positions.get(chat_id, {}).pop(ticker, None)
+            return deleted > 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def value_positions(quantities, prices, changes, cost_bases):
+    """
+    Valorisation vectorisée d'un portefeuille (NaN = donnée manquante, ignorée dans les totaux).
+    Retourne les tableaux par ligne (valeur, P&L du jour, P&L latent) et les totaux.
+    """
+    quantities = np.asarray(quantities, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    values = quantities * prices
+    day_pnl = quantities * np.asarray(changes, dtype=np.float64)
+    unrealized = quantities * (prices - np.asarray(cost_bases, dtype=np.float64))
+    previous_total = np.nansum(values - day_pnl)
+    return {
+        "values": values, "day_pnl": day_pnl, "unrealized": unrealized,
+        "total_value": float(np.nansum(values)), "total_day_pnl": float(np.nansum(day_pnl)),
+        "total_day_pnl_pct": float(np.nansum(day_pnl) / previous_total) if previous_total else None,
+        "total_unrealized": float(np.nansum(unrealized)) if not np.isnan(unrealized).all() else None,
+    }
+
+def holding_details(ticker_symbol):
+    """(nom, devise, score long_term ou None) depuis le cache des tickers (TickerRecord), sans appel réseau."""
+    cached = get_cached_ticker_info(ticker_symbol)
+    if cached is None or not cached[0]:
+        return ticker_symbol, "", None
+    info = cached[0]
+    if info.get("quoteType") == "ETF":
+        score = calculate_long_term_etf_score(info)
+    else:
+        score = calculate_long_term_stock_score(info)
+    name = info.get('longName', info.get('shortName', ticker_symbol))
+    return name, info.get('currency', ''), score if score > -999.0 else None
+
+def get_holding_quotes(tickers):
+    """
+    Cotations des `tickers` depuis le cache (rempli par le rafraîchisseur). Les symboles jamais cotés, ou plus vieux
+    que deux passes du rafraîchisseur (ex: chats attribués à une autre réplica), sont téléchargés en un appel groupé ;
+    en cas d'échec, la cotation en cache est gardée. Retourne (cotations, horodatage le plus ancien).
+    """
+    cached = get_cached_quotes(tickers)
+    now = time.time()
+    fresh = {t: entry for t, entry in cached.items() if now - entry[1] < 2 * PORTFOLIO_REFRESH_SECONDS}
+    missing = [t for t in tickers if t not in fresh]
+    if missing:
+        fetched = get_quotes_batch(missing)
+        fresh.update((t, (quote, now)) for t, quote in fetched.items())
+        fresh.update((t, cached[t]) for t in missing if t not in fetched and t in cached) # Échec: dernière cotation connue
+    quotes = {t: quote for t, (quote, _) in fresh.items()}
+    oldest = min((stored_at for _, stored_at in fresh.values()), default=None)
+    return quotes, oldest
+
+def _format_score(score):
+    return f"Score LT: {score:.1f}" if score is not None else "Score LT: N/A"
+
+def _age_footer(oldest):
+    return f"\n_Cours {format_age(time.time() - oldest)}._" if oldest is not None else ""
+
+def format_watchlist(tickers):
+    quotes, oldest = get_holding_quotes(tickers)
+    lines = ["👀 **Liste de suivi**"]
+    for ticker_symbol in tickers:
+        name, currency, score = holding_details(ticker_symbol)
+        quote = quotes.get(ticker_symbol)
+        if quote is None:
+            lines.append(f"{name} ({ticker_symbol}): Données indisponibles")
+            continue
+        change_pct = f"{quote['change_pct'] * 100:+.2f}%" if quote.get('change_pct') is not None else "N/A"
+        lines.append(f"{name} ({ticker_symbol}): {quote['price']:.2f} {currency} ({change_pct}) | {_format_score(score)}")
+    return "\n".join(lines) + _age_footer(oldest)
+
+def format_portfolio(positions):
+    """Message de /portfolio: valeur, P&L du jour et score long_term par ligne, puis les totaux."""
+    tickers = [t for t, _, _ in positions]
+    quotes, oldest = get_holding_quotes(tickers)
+    nan = float("nan")
+    valuation = value_positions(
+        [q for _, q, _ in positions],
+        [quotes[t]["price"] if t in quotes else nan for t in tickers],
+        [quotes[t]["change"] if t in quotes and quotes[t].get("change") is not None else nan for t in tickers],
+        [c if c is not None else nan for _, _, c in positions],
+    )
+    lines = ["💼 **Portefeuille**"]
+    currencies = set()
+    for i, (ticker_symbol, quantity, cost_basis) in enumerate(positions):
+        name, currency, score = holding_details(ticker_symbol)
+        currencies.add(currency)
+        if ticker_symbol not in quotes:
+            lines.append(f"{name} ({ticker_symbol}): {quantity:g} titre(s), Données indisponibles")
+            continue
+        line = f"{name} ({ticker_symbol}): {quantity:g} × {quotes[ticker_symbol]['price']:.2f} = {valuation['values'][i]:.2f} {currency}"
+        if not np.isnan(valuation["day_pnl"][i]):
+            line += f", jour {valuation['day_pnl'][i]:+.2f}"
+        if cost_basis is not None:
+            line += f", latent {valuation['unrealized'][i]:+.2f}"
+        lines.append(f"{line} | {_format_score(score)}")
+    total = f"\n**Total**: {valuation['total_value']:.2f}, jour {valuation['total_day_pnl']:+.2f}"
+    if valuation["total_day_pnl_pct"] is not None:
+        total += f" ({valuation['total_day_pnl_pct'] * 100:+.2f}%)"
+    if valuation["total_unrealized"] is not None:
+        total += f", latent {valuation['total_unrealized']:+.2f}"
+    lines.append(total)
+    if len(currencies - {""}) > 1:
+        lines.append("_Totaux additionnés sans conversion de devises._")
+    return "\n".join(lines) + _age_footer(oldest)
+
+def run_portfolio_refresher(store, stop_event, interval=None, owns_chat=None):
+    """
+    Boucle du thread des portefeuilles: à chaque passe, l'union des symboles de tous les chats est cotée
+    une seule fois (téléchargements groupés), et leurs fondamentaux périmés sont refetchés (score long_term).
+    Mode multi-réplicas: seulement les symboles des chats attribués à cette réplica (`owns_chat`) ; le store est
+    relu à chaque battement (voir bot.rebalance_replica) et les fondamentaux circulent par le stockage partagé.
+    """
+    interval = PORTFOLIO_REFRESH_SECONDS if interval is None else interval
+    while not stop_event.is_set():
+        tickers = store.tickers(owns_chat)
+        if tickers:
+            started = time.monotonic()
+            failed = False
+            try:
+                refresh_quotes(tickers, stop_event=stop_event)
+                refresh_stale_tickers(tickers, stop_event=stop_event)
+            except Exception as e:
+                print(f"Erreur rafraîchissement des portefeuilles: {e}")
+                failed = True
+            observe("job.portfolio_refresh", time.monotonic() - started, error=failed)
+        stop_event.wait(interval)
+    print("Thread des portefeuilles arrêté.")
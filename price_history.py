@@ -0,0 +1,206 @@
+# price_history.py
+# Historique des clôtures de tout l'univers dans une matrice NumPy mappée en mémoire (dates x tickers),
+# et scores historiques (momentum, volatilité, drawdown, Sharpe) calculés en une passe sur toute la matrice.
+# La matrice est stockée date par date (une ligne = une séance): l'ajout quotidien n'écrit qu'une ligne.
+import json
+import os
+import threading
+import time
+import warnings
+
+from lazy_import import LazyModule
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+PRICE_HISTORY_DIR = os.getenv("PRICE_HISTORY_DIR", "price_history")
+PRICE_HISTORY_DAYS = int(os.getenv("PRICE_HISTORY_DAYS", 252)) # Fenêtre des scores, en séances (~1 an)
+PRICE_HISTORY_MIN_POINTS = 20 # Séances minimum pour qu'un ticker reçoive un score historique
+TRADING_DAYS_PER_YEAR = 252
+ROW_CAPACITY_STEP = 256 # Lignes (séances) préallouées à chaque agrandissement du fichier
+
+# score_type -> (libellé, meilleur si plus grand, affiché en %)
+HISTORY_SCORE_TYPES = {
+    "momentum": ("Momentum", True, True),
+    "volatility": ("Volatilité", False, True),
+    "drawdown": ("Drawdown max", True, True), # Valeur négative: plus proche de 0 = meilleur
+    "sharpe": ("Sharpe", True, False),
+}
+
+class PriceHistory:
+    """
+    Matrice float32 `closes.f32` de forme (capacité, nb tickers) + `meta.json` (tickers, dates, date de mise à jour).
+    Les lignes au-delà des dates connues sont préallouées (NaN) pour que l'ajout d'une séance soit une simple écriture.
+    """
+
+    def __init__(self, directory=PRICE_HISTORY_DIR):
+        self.directory = directory
+        self.data_path = os.path.join(directory, "closes.f32")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.tickers = []
+        self.dates = [] # np.datetime64[D], triées
+        self.updated_at = 0.0 # time.time() de la dernière mise à jour réseau
+        self._index = {} # ticker -> colonne
+        self._closes = None # np.memmap (capacité, nb tickers)
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.meta_path) or not os.path.exists(self.data_path):
+            return
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            closes = np.memmap(self.data_path, dtype=np.float32, mode="r+", shape=tuple(meta["shape"]))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Historique de prix {self.directory} illisible ({e}), il sera reconstruit.")
+            return
+        self.tickers = meta["tickers"]
+        self.dates = [np.datetime64(d, "D") for d in meta["dates"]]
+        self.updated_at = meta.get("updated_at", 0.0)
+        self._index = {t: i for i, t in enumerate(self.tickers)}
+        self._closes = closes
+
+    def _write_meta(self):
+        meta = {
+            "shape": list(self._closes.shape) if self._closes is not None else [0, 0],
+            "tickers": self.tickers, "dates": [str(d) for d in self.dates], "updated_at": self.updated_at,
+        }
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _reallocate(self, rows, columns, dates, tickers):
+        """Recopie la matrice dans un nouveau fichier de forme (rows, columns) selon le nouvel ordre des dates/tickers."""
+        capacity = max(rows + ROW_CAPACITY_STEP, 1)
+        tmp_path = self.data_path + ".tmp"
+        closes = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(capacity, max(columns, 1)))
+        closes[:] = np.nan
+        if self._closes is not None and self.dates and self.tickers:
+            row_map = {d: i for i, d in enumerate(dates)}
+            old_rows = np.array([row_map[d] for d in self.dates])
+            new_columns = {t: i for i, t in enumerate(tickers)}
+            old_columns = np.array([new_columns[t] for t in self.tickers])
+            closes[np.ix_(old_rows, old_columns)] = self._closes[:len(self.dates), :len(self.tickers)]
+        closes.flush()
+        del self._closes
+        os.replace(tmp_path, self.data_path)
+        self._closes = np.memmap(self.data_path, dtype=np.float32, mode="r+", shape=(capacity, max(columns, 1)))
+        self.dates = list(dates)
+        self.tickers = list(tickers)
+        self._index = {t: i for i, t in enumerate(self.tickers)}
+
+    def upsert(self, frame):
+        """
+        Écrit les clôtures de `frame` (index: dates, colonnes: tickers ; NaN = pas de cotation).
+        Cas courant (séances postérieures à la dernière connue, tickers déjà suivis): écriture des seules
+        lignes nouvelles/modifiées. Un nouveau ticker ou une séance intercalée provoque une recopie complète.
+        Retourne le nombre de séances écrites.
+        """
+        if frame is None or frame.empty:
+            return 0
+        frame_dates = [np.datetime64(pd.Timestamp(d).date(), "D") for d in frame.index]
+        with self._lock:
+            new_tickers = [t for t in frame.columns if t not in self._index]
+            known_dates = set(self.dates)
+            new_dates = sorted(set(d for d in frame_dates if d not in known_dates))
+            appended_only = not self.dates or not new_dates or new_dates[0] > self.dates[-1]
+            capacity = self._closes.shape[0] if self._closes is not None else 0
+            if new_tickers or not appended_only or len(self.dates) + len(new_dates) > capacity:
+                dates = sorted(known_dates.union(new_dates))
+                self._reallocate(len(dates), len(self.tickers) + len(new_tickers), dates, self.tickers + new_tickers)
+            else:
+                self.dates.extend(new_dates)
+            rows = {d: i for i, d in enumerate(self.dates)}
+            row_index = np.array([rows[d] for d in frame_dates])
+            column_index = np.array([self._index[t] for t in frame.columns])
+            values = frame.to_numpy(dtype=np.float32)
+            # Une cotation absente du téléchargement n'efface pas une valeur déjà connue
+            current = self._closes[np.ix_(row_index, column_index)]
+            self._closes[np.ix_(row_index, column_index)] = np.where(np.isnan(values), current, values)
+            return len(frame_dates)
+
+    def mark_updated(self, updated_at=None):
+        with self._lock:
+            self.updated_at = time.time() if updated_at is None else updated_at
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._closes is not None:
+                self._closes.flush()
+            self._write_meta()
+
+    def __contains__(self, ticker_symbol):
+        return ticker_symbol in self._index
+
+    @property
+    def last_date(self):
+        return self.dates[-1] if self.dates else None
+
+    def window(self, tickers, days=PRICE_HISTORY_DAYS):
+        """
+        Clôtures des `days` dernières séances pour `tickers` (float64, NaN si inconnu).
+        Retourne (matrice séances x tickers, liste des tickers présents dans l'historique).
+        """
+        with self._lock:
+            present = [t for t in tickers if t in self._index]
+            if self._closes is None or not present or not self.dates:
+                return np.empty((0, 0)), []
+            end = len(self.dates)
+            start = max(0, end - days)
+            columns = np.array([self._index[t] for t in present])
+            return np.asarray(self._closes[start:end, columns], dtype=np.float64), present
+
+def _forward_fill(closes):
+    """Propage la dernière clôture connue sur les séances sans cotation (jours fériés d'une autre place...)."""
+    if not np.isnan(closes).any():
+        return closes
+    return pd.DataFrame(closes).ffill().to_numpy()
+
+def last_closes(closes):
+    """Dernière clôture connue de chaque colonne de `closes` (NaN si aucune)."""
+    if closes.size == 0:
+        return np.full(closes.shape[1] if closes.ndim == 2 else 0, np.nan)
+    return _forward_fill(closes)[-1]
+
+def compute_history_scores(closes, min_points=PRICE_HISTORY_MIN_POINTS):
+    """
+    Scores historiques de chaque colonne de `closes` (séances x tickers), en une passe vectorisée:
+    - momentum: performance sur la fenêtre,
+    - volatility: écart-type annualisé des rendements journaliers,
+    - drawdown: pire baisse depuis un plus haut de la fenêtre (valeur négative),
+    - sharpe: rendement journalier moyen / écart-type, annualisé (taux sans risque nul).
+    Retourne {score_type: np.array} ; NaN pour les tickers ayant moins de `min_points` clôtures.
+    """
+    n_columns = closes.shape[1] if closes.ndim == 2 else 0
+    empty = {name: np.full(n_columns, np.nan) for name in HISTORY_SCORE_TYPES}
+    if closes.size == 0 or closes.shape[0] < 2:
+        return empty
+    valid_points = np.count_nonzero(~np.isnan(closes), axis=0)
+    prices = _forward_fill(closes)
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning) # Colonnes entièrement NaN
+        first_valid = np.argmax(~np.isnan(prices), axis=0)
+        first_prices = prices[first_valid, np.arange(n_columns)]
+        returns = prices[1:] / prices[:-1] - 1
+        mean_returns = np.nanmean(returns, axis=0)
+        std_returns = np.nanstd(returns, axis=0, ddof=1)
+        scores = {
+            "momentum": prices[-1] / first_prices - 1,
+            "volatility": std_returns * np.sqrt(TRADING_DAYS_PER_YEAR),
+            "drawdown": np.nanmin(prices / np.fmax.accumulate(prices, axis=0) - 1, axis=0),
+            "sharpe": np.where(std_returns > 0, mean_returns / std_returns, np.nan) * np.sqrt(TRADING_DAYS_PER_YEAR),
+        }
+    insufficient = valid_points < min_points
+    for values in scores.values():
+        values[insufficient] = np.nan
+    return scores
+
+def format_history_score(score_type, value):
+    label, higher_is_better, percent = HISTORY_SCORE_TYPES[score_type]
+    if not percent:
+        return f"{label}: {value:.2f}"
+    return f"{label}: {value * 100:+.1f}%" if higher_is_better else f"{label}: {value * 100:.1f}%"
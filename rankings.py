@@ -0,0 +1,189 @@
+# rankings.py
+# Classements pré-calculés en mémoire, rafraîchis en arrière-plan.
+# Les handlers lisent le dernier snapshot publié (O(limit)) au lieu de relancer un scan complet.
+import os
+import threading
+import time
+
+from financial_data import (
+    build_ranking_from_cache, format_ranking, format_age, get_universe, refresh_stale_tickers, refresh_price_history,
+    sync_from_fundamentals_store
+)
+from price_history import HISTORY_SCORE_TYPES
+from screener import rebuild_screen_snapshot
+from metrics import observe
+
+RANKING_REFRESH_SECONDS = float(os.getenv("RANKING_REFRESH_SECONDS", 300))
+
+# Classements maintenus par le rafraîchisseur: (item_type, sort_by_score, score_type)
+# (les listes non triées de /list passent par les cotations légères, voir get_quote_list_formatted)
+# Les scores historiques (momentum...) sont recalculés depuis la matrice des clôtures, sans appel réseau.
+RANKING_KEYS = [(item_type, True, score_type) for score_type in ("long_term", *HISTORY_SCORE_TYPES)
+                for item_type in ("ETF", "ACTION")]
+
+class RankingSnapshot:
+    """Classement figé de tout l'univers: entrées déjà triées, numéro de version et date des données (la plus ancienne)."""
+    __slots__ = ("key", "entries", "version", "built_at")
+
+    def __init__(self, key, entries, version, built_at):
+        self.key = key
+        self.entries = tuple(entries)
+        self.version = version
+        self.built_at = built_at
+
+    def age_seconds(self):
+        return time.time() - self.built_at
+
+_snapshots = {} # key -> RankingSnapshot ; une entrée n'est remplacée que par un snapshot complet
+_snapshots_lock = threading.Lock()
+_build_locks = {key: threading.Lock() for key in RANKING_KEYS}
+_version = 0
+
+def _normalize_key(item_type, sort_by_score, score_type):
+    return (item_type.upper(), bool(sort_by_score), score_type)
+
+def publish_snapshot(key, entries, built_at=None):
+    """Publie un nouveau classement pour `key` (remplacement atomique de la référence)."""
+    global _version
+    with _snapshots_lock:
+        _version += 1
+        snapshot = RankingSnapshot(key, entries, _version, time.time() if built_at is None else built_at)
+        _snapshots[key] = snapshot
+    return snapshot
+
+def get_snapshot(item_type, sort_by_score=True, score_type="long_term"):
+    """Dernier snapshot publié pour ce classement, ou None s'il n'a pas encore été construit."""
+    return _snapshots.get(_normalize_key(item_type, sort_by_score, score_type))
+
+def rebuild_snapshot(item_type, sort_by_score=True, score_type="long_term"):
+    """Reclasse tout l'univers depuis le cache (sans appel réseau) puis publie le résultat."""
+    key = _normalize_key(item_type, sort_by_score, score_type)
+    entries, oldest = build_ranking_from_cache(*key)
+    return publish_snapshot(key, entries, oldest)
+
+def refresh_snapshot(item_type, sort_by_score=True, score_type="long_term"):
+    """Rafraîchit les tickers périmés de l'univers (dans la limite du budget), puis reclasse et publie."""
+    if score_type in HISTORY_SCORE_TYPES:
+        refresh_price_history(get_universe(item_type))
+    else:
+        refresh_stale_tickers(get_universe(item_type))
+    return rebuild_snapshot(item_type, sort_by_score, score_type)
+
+def prime_snapshots_from_cache():
+    """
+    Au démarrage: publie des classements construits à partir du cache (ex: rechargé depuis le stockage local),
+    datés du plus ancien payload utilisé. Le rafraîchisseur remplacera ensuite les données périmées.
+    Retourne le nombre de classements publiés.
+    """
+    published = 0
+    for key in RANKING_KEYS:
+        entries, oldest = build_ranking_from_cache(*key)
+        if oldest is not None and entries:
+            publish_snapshot(key, entries, built_at=oldest)
+            published += 1
+    return published
+
+RANKING_PENDING_TEXT = "⏳ Classement en cours de construction, réessayez dans quelques instants."
+
+def _get_or_build_snapshot(item_type, sort_by_score, score_type):
+    """
+    Snapshot publié, ou à défaut (démarrage) un classement dégradé construit depuis le cache seul: aucun appel
+    réseau ni téléchargement d'historique dans le handler, le rafraîchisseur complètera. None si le cache est vide.
+    """
+    key = _normalize_key(item_type, sort_by_score, score_type)
+    snapshot = _snapshots.get(key)
+    if snapshot is not None:
+        return snapshot
+    with _build_locks.setdefault(key, threading.Lock()): # Une seule construction à la fois par classement
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            entries, oldest = build_ranking_from_cache(*key)
+            if entries:
+                snapshot = publish_snapshot(key, entries, oldest)
+    return snapshot
+
+def get_ranking_text(item_type="ETF", limit=10, sort_by_score=True, score_type="long_term"):
+    """Texte d'un classement lu depuis le snapshot en mémoire, avec l'âge des données."""
+    snapshot = _get_or_build_snapshot(item_type, sort_by_score, score_type)
+    if snapshot is None:
+        return RANKING_PENDING_TEXT
+    footer = f"_Données {format_age(snapshot.age_seconds())} (v{snapshot.version})._"
+    return format_ranking(snapshot.entries, item_type, limit, sort_by_score, score_type, footer=footer)
+
+# --- Mode multi-réplicas: le leader publie ses classements dans l'état partagé, les autres les relisent ---
+_shared_loaded_at = 0.0 # published_at du plus récent classement partagé déjà repris
+
+def share_snapshots(shared, replica_id):
+    with _snapshots_lock:
+        snapshots = [(key, snapshot.entries, snapshot.built_at) for key, snapshot in _snapshots.items()]
+    shared.put_snapshots(snapshots, replica_id)
+
+def load_shared_snapshots(shared):
+    """Publie localement les classements partagés plus récents que ceux déjà repris. Retourne leur nombre."""
+    global _shared_loaded_at
+    loaded = 0
+    for key, entries, built_at, published_at in shared.snapshots_since(_shared_loaded_at):
+        publish_snapshot(key, entries, built_at)
+        _shared_loaded_at = max(_shared_loaded_at, published_at)
+        loaded += 1
+    return loaded
+
+def run_ranking_refresher(stop_event, interval=None, replicas=None):
+    """
+    Boucle du thread de rafraîchissement: à chaque passe, refetch par lots les tickers les plus périmés
+    des univers (dans la limite du budget), puis reclasse tous les univers depuis le cache.
+    Avec `replicas` (ReplicaSet), chaque réplica ne refetch que sa part des tickers et relit celles des autres
+    dans le stockage partagé ; seul le leader reclasse et publie, les autres reprennent ses classements.
+    """
+    interval = RANKING_REFRESH_SECONDS if interval is None else interval
+    while not stop_event.is_set():
+        started = time.monotonic()
+        failed = False
+        universe = get_universe("ETF") + get_universe("ACTION")
+        to_fetch = universe
+        if replicas is not None:
+            to_fetch = [t for t in universe if replicas.owns(t)]
+            try:
+                sync_from_fundamentals_store()
+            except Exception as e:
+                print(f"Erreur relecture du stockage partagé: {e}")
+                failed = True
+        try:
+            refreshed = refresh_stale_tickers(to_fetch, stop_event=stop_event)
+        except Exception as e:
+            print(f"Erreur rafraîchissement des univers: {e}")
+            refreshed, failed = 0, True
+        if replicas is None or replicas.is_leader:
+            try:
+                refresh_price_history(universe, stop_event=stop_event)
+            except Exception as e:
+                print(f"Erreur mise à jour de l'historique des prix: {e}")
+                failed = True
+            for key in RANKING_KEYS:
+                if stop_event.is_set(): break
+                try:
+                    rebuild_snapshot(*key)
+                except Exception as e:
+                    print(f"Erreur reconstruction du classement {key}: {e}")
+                    failed = True
+            if replicas is not None:
+                try:
+                    share_snapshots(replicas.shared, replicas.replica_id)
+                except Exception as e:
+                    print(f"Erreur publication des classements partagés: {e}")
+                    failed = True
+        else:
+            try:
+                load_shared_snapshots(replicas.shared)
+            except Exception as e:
+                print(f"Erreur lecture des classements partagés: {e}")
+                failed = True
+        try:
+            rebuild_screen_snapshot() # Chaque réplica: son cache contient aussi les fetchs des autres
+        except Exception as e:
+            print(f"Erreur reconstruction du snapshot du screener: {e}")
+            failed = True
+        observe("job.ranking_refresh", time.monotonic() - started, error=failed)
+        print(f"Classements rafraîchis en {time.monotonic() - started:.1f}s ({refreshed} ticker(s) refetché(s)).")
+        stop_event.wait(interval)
+    print("Thread de rafraîchissement des classements arrêté.")
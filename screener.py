@@ -0,0 +1,294 @@
+# screener.py
+# /screen: filtres sur tout l'univers (ex: `forwardPE<20 dividendYield>2% sector=Technology`) évalués sur un snapshot
+# en colonnes, construit depuis le cache sans appel réseau. Champs numériques: un tableau NumPy et son index trié,
+# chaque comparaison est une recherche dichotomique (searchsorted) qui donne directement les lignes retenues.
+# Champs catégoriels: index par hachage valeur -> lignes. Les filtres se combinent par intersection, du plus sélectif au moins.
+import math
+import os
+import re
+import shlex
+import threading
+import time
+
+from lazy_import import LazyModule
+from financial_data import detailed_fields, format_age, get_cached_ticker_info, get_universe
+from metrics import timed
+
+np = LazyModule("numpy")
+
+SCREEN_MAX_AGE = float(os.getenv("SCREEN_MAX_AGE", 300)) # Snapshot reconstruit au-delà (hors rafraîchisseur)
+SCREEN_PAGE_CHARS = 3500 # Lignes par page: marge sous la limite de 4096 caractères (en-tête et pied de page)
+SCREEN_MAX_ECHOED_QUERY = 200 # Au-delà, la commande de la page suivante n'est pas recopiée (réponse sous 4096 caractères)
+
+# Champs de /detail (voir detailed_fields) ; les textes libres (nom, site web, résumé) ne sont pas indexés
+NUMERIC_FIELDS = (
+    "currentPrice", "previousClose", "dayHigh", "dayLow", "fiftyTwoWeekHigh", "fiftyTwoWeekLow",
+    "regularMarketChange", "regularMarketChangePercent", "marketCap", "volume", "averageVolume",
+    "trailingPE", "forwardPE", "dividendYield", "payoutRatio", "beta",
+)
+CATEGORICAL_FIELDS = ("type", "currency", "sector", "industry") # type: univers d'origine (ETF ou ACTION)
+PERCENT_FIELDS = ("regularMarketChangePercent", "dividendYield", "payoutRatio") # Fractions affichées en %
+LARGE_NUMBER_FIELDS = ("marketCap", "volume", "averageVolume")
+DEFAULT_SORT = ("marketCap", True) # (champ, décroissant)
+_FIELDS_BY_NAME = {field.lower(): field for field in NUMERIC_FIELDS + CATEGORICAL_FIELDS}
+_FILTER_RE = re.compile(r"^([A-Za-z]+)(<=|>=|!=|<|>|=)(.+)$")
+_SUFFIXES = {"%": 0.01, "k": 1e3, "m": 1e6, "b": 1e9, "t": 1e12} # 2% -> 0.02, 10B -> 1e10
+
+SCREEN_USAGE = (
+    "Usage: `/screen [filtres] [sort=champ|sort=-champ] [page=N]` (tri par défaut: `sort=-marketCap` ; sans filtre: tout l'univers)\n"
+    "Ex: `/screen forwardPE<20 dividendYield>2% sector=Technology`\n"
+    "Opérateurs: `< <= > >= = !=` ; valeurs avec `%`, `K`, `M`, `B`, `T` acceptées ; "
+    "plusieurs catégories séparées par des virgules (`sector=Technology,Healthcare`), guillemets pour les espaces.\n"
+    "Un ticker sans valeur pour un champ est exclu de tout filtre sur ce champ, `!=` compris.\n"
+    f"Champs numériques: {', '.join(NUMERIC_FIELDS)}\nChamps catégoriels: {', '.join(CATEGORICAL_FIELDS)}"
+)
+
+class ScreenSnapshot:
+    """
+    Univers figé en colonnes: `numeric[champ]` (float64, NaN si absent) avec `sorted_rows[champ]` (lignes des valeurs
+    connues, triées par valeur) et `sorted_values[champ]` ; `categories[champ]` = {valeur en minuscules: lignes}.
+    """
+
+    def __init__(self, tickers, names, numeric, categorical, oldest, built_at=None):
+        self.tickers = tickers
+        self.names = names
+        self.numeric = numeric
+        self.sorted_rows = {}
+        self.sorted_values = {}
+        for field, values in numeric.items():
+            known = np.flatnonzero(~np.isnan(values))
+            order = known[np.argsort(values[known], kind="stable")]
+            self.sorted_rows[field] = order
+            self.sorted_values[field] = values[order]
+        self.labels = categorical # Valeurs d'origine par ligne, pour l'affichage
+        self.categories = {}
+        self.known_rows = {} # Lignes où le champ catégoriel est renseigné (base de `!=`)
+        for field, values in categorical.items():
+            buckets = {}
+            for row, value in enumerate(values):
+                if value is not None:
+                    buckets.setdefault(value.lower(), []).append(row)
+            self.categories[field] = {value: np.asarray(rows, dtype=np.int64) for value, rows in buckets.items()}
+            self.known_rows[field] = np.asarray([row for row, value in enumerate(values) if value is not None], dtype=np.int64)
+        self.oldest = oldest
+        self.built_at = time.time() if built_at is None else built_at
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def match(self, field, op, value):
+        """
+        Lignes satisfaisant `field op value` (tableau d'indices, sans doublon).
+        Une valeur manquante ne satisfait aucun filtre, `!=` compris (numérique comme catégoriel).
+        """
+        if field in self.categories:
+            buckets = self.categories[field]
+            rows = [buckets[v] for v in value if v in buckets]
+            selected = np.unique(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64)
+            if op == "!=":
+                selected = np.setdiff1d(self.known_rows[field], selected, assume_unique=True)
+            return selected
+        rows, values = self.sorted_rows[field], self.sorted_values[field]
+        left, right = np.searchsorted(values, value, side="left"), np.searchsorted(values, value, side="right")
+        if op == "<": return rows[:left]
+        if op == "<=": return rows[:right]
+        if op == ">": return rows[right:]
+        if op == ">=": return rows[left:]
+        if op == "=": return rows[left:right]
+        return np.concatenate((rows[:left], rows[right:])) # !=
+
+    def query(self, filters):
+        """Lignes satisfaisant tous les `filters` [(champ, op, valeur), ...], intersectées du plus petit au plus grand."""
+        if not filters:
+            return np.arange(len(self.tickers))
+        matches = sorted((self.match(*f) for f in filters), key=len)
+        selected = matches[0]
+        for rows in matches[1:]:
+            if not len(selected):
+                break
+            selected = np.intersect1d(selected, rows, assume_unique=True)
+        return selected
+
+    def sort(self, rows, field, descending):
+        """Trie `rows` selon `field` (valeurs manquantes en dernier)."""
+        values = self.numeric[field][rows]
+        order = np.argsort(-values if descending else values, kind="stable") # NaN en fin de tri dans les deux sens
+        return rows[order]
+
+_snapshot = None # ScreenSnapshot publié (remplacement atomique de la référence)
+_build_lock = threading.Lock()
+
+def _to_float(value):
+    if value is None or isinstance(value, bool):
+        return float("nan")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return float("nan") # Texte inattendu dans le payload
+    return value if math.isfinite(value) else float("nan") # ex: 'Infinity'
+
+def build_screen_snapshot():
+    """Construit le snapshot en colonnes depuis les payloads en cache de tout l'univers (aucun appel réseau)."""
+    tickers, names, oldest = [], [], None
+    rows = {field: [] for field in NUMERIC_FIELDS + CATEGORICAL_FIELDS}
+    for item_type in ("ETF", "ACTION"):
+        for ticker_symbol in get_universe(item_type):
+            cached = get_cached_ticker_info(ticker_symbol)
+            if cached is None or not cached[0]:
+                continue
+            info, fetched_at = cached
+            fields = detailed_fields(ticker_symbol, info)
+            fields["type"] = item_type
+            tickers.append(ticker_symbol)
+            names.append(fields["longName"] or fields["shortName"] or ticker_symbol)
+            for field in NUMERIC_FIELDS:
+                rows[field].append(_to_float(fields[field]))
+            for field in CATEGORICAL_FIELDS:
+                value = fields[field]
+                rows[field].append(str(value) if value not in (None, "") else None)
+            oldest = fetched_at if oldest is None else min(oldest, fetched_at)
+    numeric = {field: np.asarray(rows[field], dtype=np.float64) for field in NUMERIC_FIELDS}
+    categorical = {field: rows[field] for field in CATEGORICAL_FIELDS}
+    return ScreenSnapshot(tickers, names, numeric, categorical, oldest)
+
+def rebuild_screen_snapshot():
+    """Reconstruit et publie le snapshot (appelé par le rafraîchisseur des classements)."""
+    global _snapshot
+    with timed("screen.build"):
+        snapshot = build_screen_snapshot()
+    _snapshot = snapshot
+    return snapshot
+
+def get_screen_snapshot():
+    snapshot = _snapshot
+    if snapshot is not None and time.time() - snapshot.built_at < SCREEN_MAX_AGE:
+        return snapshot
+    with _build_lock: # Une seule construction à la fois
+        snapshot = _snapshot
+        if snapshot is None or time.time() - snapshot.built_at >= SCREEN_MAX_AGE:
+            snapshot = rebuild_screen_snapshot()
+    return snapshot
+
+def parse_number(text):
+    """'20' -> 20.0 ; '2%' -> 0.02 ; '10B' -> 1e10. ValueError si ce n'est pas un nombre fini (nan, inf refusés)."""
+    multiplier = _SUFFIXES.get(text[-1:].lower(), 1)
+    if multiplier != 1:
+        text = text[:-1]
+    value = float(text.replace(",", ".")) * multiplier
+    if not math.isfinite(value):
+        raise ValueError(f"Nombre non fini: {text}")
+    return value
+
+def _echo(text, limit=40):
+    """Extrait de saisie recopié dans un message d'erreur (borné: la réponse reste sous la limite de Telegram)."""
+    return text if len(text) <= limit else text[:limit] + "…"
+
+def parse_screen_query(text):
+    """
+    'forwardPE<20 sector=Technology sort=-dividendYield page=2' ->
+    ([(champ, op, valeur), ...], (champ de tri, décroissant), page). ValueError (message affichable) si invalide.
+    """
+    try:
+        tokens = shlex.split(text)
+    except ValueError as e:
+        raise ValueError(f"Expression illisible ({e}).")
+    filters, sort, page = [], DEFAULT_SORT, 1
+    for token in tokens:
+        match = _FILTER_RE.match(token)
+        if match is None:
+            raise ValueError(f"Filtre invalide: `{_echo(token)}` (attendu: champ, opérateur, valeur).")
+        name, op, raw_value = match.groups()
+        if name.lower() == "page" and op == "=":
+            if not raw_value.isdigit() or int(raw_value) < 1:
+                raise ValueError(f"Page invalide: `{_echo(raw_value)}`.")
+            page = int(raw_value)
+            continue
+        if name.lower() == "sort" and op == "=":
+            descending = raw_value.startswith("-") # `champ`: croissant, `-champ`: décroissant
+            field = _FIELDS_BY_NAME.get(raw_value.lstrip("+-").lower())
+            if field not in NUMERIC_FIELDS:
+                raise ValueError(f"Tri impossible sur `{_echo(raw_value.lstrip('+-'))}` (champ numérique attendu).")
+            sort = (field, descending)
+            continue
+        field = _FIELDS_BY_NAME.get(name.lower())
+        if field is None:
+            raise ValueError(f"Champ inconnu: `{_echo(name)}`.")
+        if field in CATEGORICAL_FIELDS:
+            if op not in ("=", "!="):
+                raise ValueError(f"`{field}` est catégoriel: seuls `=` et `!=` sont possibles.")
+            filters.append((field, op, [v.strip().lower() for v in raw_value.split(",") if v.strip()]))
+            continue
+        try:
+            filters.append((field, op, parse_number(raw_value)))
+        except ValueError:
+            raise ValueError(f"Valeur numérique invalide pour `{field}`: `{_echo(raw_value)}`.")
+    return filters, sort, page
+
+def format_field_value(field, value):
+    if value != value: # NaN
+        return "N/A"
+    if field in PERCENT_FIELDS:
+        return f"{value * 100:.2f}%"
+    if field in LARGE_NUMBER_FIELDS:
+        for threshold, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "K")):
+            if abs(value) >= threshold:
+                return f"{value / threshold:.1f}{suffix}"
+        return f"{value:.0f}"
+    return f"{value:.2f}"
+
+def format_screen_line(snapshot, row, fields):
+    """`Nom (TICKER): prix devise | champ valeur | ...` pour les champs numériques filtrés et le tri."""
+    price = snapshot.numeric["currentPrice"][row]
+    currency = snapshot.labels["currency"][row] or ""
+    line = f"{snapshot.names[row]} ({snapshot.tickers[row]}): {format_field_value('currentPrice', price)} {currency}".rstrip()
+    for field in fields:
+        line += f" | {field} {format_field_value(field, snapshot.numeric[field][row])}"
+    return line
+
+def paginate(lines, max_chars=SCREEN_PAGE_CHARS):
+    """Regroupe les lignes en pages d'au plus `max_chars` caractères, au fil de l'eau (générateur)."""
+    current, size = [], 0
+    for line in lines:
+        if current and size + len(line) + 1 > max_chars:
+            yield current
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        yield current
+
+def screen(query_text):
+    """Texte de réponse à `/screen <query_text>` (une page, avec la commande de la page suivante)."""
+    try:
+        filters, (sort_field, descending), page = parse_screen_query(query_text)
+    except ValueError as e:
+        return f"{e}\n\n{SCREEN_USAGE}"
+    if not query_text.strip():
+        return SCREEN_USAGE
+    snapshot = get_screen_snapshot()
+    if not len(snapshot):
+        return "Aucune donnée en cache pour l'instant, réessayez après le premier rafraîchissement des classements."
+    with timed("screen.query"):
+        rows = snapshot.sort(snapshot.query(filters), sort_field, descending)
+    if not len(rows):
+        return f"🔎 **Screener**: aucun résultat parmi {len(snapshot)} tickers."
+    shown = list(dict.fromkeys([f for f, _, _ in filters if f in NUMERIC_FIELDS and f != "currentPrice"] + [sort_field]))
+    # Seules les lignes jusqu'à la page demandée (et la première de la suivante) sont mises en forme
+    lines, number, has_next = None, 0, False
+    for page_lines in paginate(format_screen_line(snapshot, row, shown) for row in rows.tolist()):
+        if number == page:
+            has_next = True
+            break
+        lines, number = page_lines, number + 1
+    text = f"🔎 **Screener**: {len(rows)} résultat(s) sur {len(snapshot)} tickers, page {number}\n\n"
+    text += "\n".join(lines)
+    page = number # Page demandée au-delà de la fin: dernière page
+    if has_next:
+        next_query = " ".join(f'"{t}"' if " " in t else t for t in shlex.split(query_text) if not t.lower().startswith("page="))
+        if len(next_query) <= SCREEN_MAX_ECHOED_QUERY:
+            text += f"\n\nPage suivante: `/screen {next_query} page={page + 1}`"
+        else: # Longue requête: ne pas la recopier, la réponse dépasserait la limite de Telegram
+            text += f"\n\nPage suivante: même commande avec `page={page + 1}`"
+    if snapshot.oldest is not None:
+        text += f"\n_Données {format_age(time.time() - snapshot.oldest)} au plus._"
+    return text
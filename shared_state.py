@@ -0,0 +1,115 @@
+# shared_state.py
+# Mode multi-réplicas: plusieurs processus du bot partagent un fichier SQLite (même hôte ou volume partagé) pour
+# se connaître (battements de cœur), se répartir le travail (partition stable par hachage) et publier les classements.
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+
+REPLICA_MODE = os.getenv("REPLICA_MODE", "0") == "1"
+SHARED_STATE_DB_FILE = os.getenv("SHARED_STATE_DB_FILE", "shared_state.sqlite3")
+REPLICA_ID = os.getenv("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+REPLICA_HEARTBEAT_SECONDS = float(os.getenv("REPLICA_HEARTBEAT_SECONDS", 15))
+REPLICA_TTL_SECONDS = float(os.getenv("REPLICA_TTL_SECONDS", 45)) # Sans battement depuis: réplica considérée morte
+SQLITE_BUSY_TIMEOUT = 30 # secondes d'attente d'un verrou tenu par une autre réplica
+
+class SharedState:
+    """Tables `replicas(replica_id, heartbeat_at)` et `snapshots(key, entries JSON, built_at, published_at, published_by)`."""
+
+    def __init__(self, path=SHARED_STATE_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS replicas (replica_id TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                " key TEXT PRIMARY KEY, entries TEXT NOT NULL, built_at REAL NOT NULL, published_at REAL NOT NULL,"
+                " published_by TEXT NOT NULL)"
+            )
+
+    def heartbeat(self, replica_id, ttl=REPLICA_TTL_SECONDS):
+        """Signale `replica_id` vivante, oublie les réplicas muettes. Retourne les réplicas vivantes, triées."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO replicas (replica_id, heartbeat_at) VALUES (?, ?)", (replica_id, now))
+            self._conn.execute("DELETE FROM replicas WHERE heartbeat_at < ?", (now - ttl,))
+            rows = self._conn.execute("SELECT replica_id FROM replicas ORDER BY replica_id").fetchall()
+        return [row[0] for row in rows]
+
+    def leave(self, replica_id):
+        """Arrêt propre: les autres réplicas reprennent sa part dès leur prochain battement."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM replicas WHERE replica_id = ?", (replica_id,))
+
+    def put_snapshots(self, snapshots, replica_id):
+        """Publie [(key, entries, built_at), ...] en une transaction (`record` retiré: inutile à l'affichage)."""
+        now = time.time()
+        rows = []
+        for key, entries, built_at in snapshots:
+            light = [{k: v for k, v in entry.items() if k != "record"} for entry in entries]
+            rows.append((json.dumps(list(key)), json.dumps(light, default=str), built_at, now, replica_id))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO snapshots (key, entries, built_at, published_at, published_by) VALUES (?, ?, ?, ?, ?)",
+                rows)
+
+    def snapshots_since(self, published_after=0.0):
+        """[(key, entries, built_at, published_at), ...] publiés après `published_after`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, entries, built_at, published_at FROM snapshots WHERE published_at > ?",
+                (published_after,)).fetchall()
+        return [(tuple(json.loads(key)), json.loads(entries), built_at, published_at)
+                for key, entries, built_at, published_at in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class ReplicaSet:
+    """
+    Vue locale des réplicas vivantes. Chaque clé (ticker, chat_id) appartient à exactement une réplica:
+    crc32(clé) modulo le nombre de réplicas vivantes. La première réplica (ordre alphabétique) est le leader.
+    """
+
+    def __init__(self, shared, replica_id=REPLICA_ID):
+        self.shared = shared
+        self.replica_id = replica_id
+        self.live = [replica_id]
+
+    def heartbeat(self):
+        live = self.shared.heartbeat(self.replica_id)
+        changed = live != self.live
+        self.live = live
+        if changed:
+            print(f"Réplicas actives ({len(live)}): {', '.join(live)} ; cette réplica: {self.replica_id}.")
+        return changed
+
+    @property
+    def is_leader(self):
+        return self.live[0] == self.replica_id
+
+    def owns(self, key):
+        live = self.live
+        if len(live) <= 1:
+            return True
+        return live[zlib.crc32(str(key).encode("utf-8")) % len(live)] == self.replica_id
+
+    def run(self, stop_event, on_tick=None, interval=REPLICA_HEARTBEAT_SECONDS):
+        """Battements de cœur jusqu'à l'arrêt ; `on_tick(changed)` est appelé après chacun (rééquilibrage)."""
+        while not stop_event.is_set():
+            try:
+                changed = self.heartbeat()
+                if on_tick is not None:
+                    on_tick(changed)
+            except Exception as e:
+                print(f"Erreur synchronisation des réplicas: {e}")
+            stop_event.wait(interval)
+        self.shared.leave(self.replica_id)
+        print("Réplica retirée de l'état partagé.")
@@ -0,0 +1,27 @@
+# startup_report.py
+# Chronologie du démarrage, en secondes depuis l'import de bot.py: fin des imports, début du polling,
+# première mise à jour traitée, fin du préchauffage en arrière-plan.
+import time
+
+STARTED_AT = time.perf_counter()
+STARTUP_STEPS = {
+    "imports": "Imports terminés",
+    "polling": "Polling démarré",
+    "first_update": "Première mise à jour traitée",
+    "warmup": "Préchauffage terminé (données locales, modules, IA)",
+}
+_marks = {} # étape -> secondes depuis STARTED_AT
+
+def mark(step):
+    """Enregistre l'étape (seulement la première fois). Retourne True si elle vient d'être enregistrée."""
+    if step in _marks:
+        return False
+    _marks[step] = time.perf_counter() - STARTED_AT
+    return True
+
+def format_startup_report():
+    lines = ["⏱️ *Démarrage*"]
+    for step, label in STARTUP_STEPS.items():
+        value = f"{_marks[step]:.2f} s" if step in _marks else "en attente"
+        lines.append(f"{label}: {value}")
+    return "\n".join(lines)
@@ -0,0 +1,205 @@
+# subscriptions_store.py
+# Abonnements aux infos périodiques et préférences par chat, dans SQLite.
+# Chaque (dés)abonnement est une transaction d'une ligne: atomique, sans réécriture de toute la liste.
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SUBSCRIPTIONS_DB_FILE = os.getenv("SUBSCRIPTIONS_DB_FILE", "subscriptions.sqlite3")
+LEGACY_SUBSCRIPTIONS_FILE = "subscribed_chats.json" # Ancien format, migré au premier démarrage
+
+DIGEST_SECTIONS = ("ETF", "ACTION")
+DEFAULT_PREFERENCES = {
+    "digest_sections": "ETF,ACTION", # Listes incluses dans le message périodique
+    "digest_limit": 5,               # Nombre de lignes par liste
+    "digest_score_type": "long_term",
+    "delivery_interval_hours": 12,   # Fréquence d'envoi
+    "delivery_time": None,           # "HH:MM" (heure du serveur) ; None: toutes les N heures depuis l'abonnement
+}
+PREFERENCE_COLUMNS = tuple(DEFAULT_PREFERENCES)
+# Colonnes ajoutées après la création initiale des tables (bases existantes mises à niveau à l'ouverture)
+ADDED_COLUMNS = {
+    "subscriptions": [("next_delivery_at", "REAL"), ("delivery_lease_owner", "TEXT"), ("next_delivery_nominal", "REAL"),
+                      ("delivery_claimed_due", "REAL")],
+    "preferences": [("delivery_interval_hours", "INTEGER"), ("delivery_time", "TEXT")],
+}
+
+class SubscriptionStore:
+    """
+    Tables `subscriptions(chat_id, subscribed_at)` et `preferences(chat_id, ...)`.
+    L'ensemble des chats abonnés est aussi gardé en mémoire pour les lectures (appartenance, liste d'envoi).
+    """
+
+    def __init__(self, path=SUBSCRIPTIONS_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # timeout: en mode multi-réplicas, la base est partagée et un autre processus peut tenir le verrou d'écriture
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS subscriptions (chat_id INTEGER PRIMARY KEY, subscribed_at REAL NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS preferences ("
+                " chat_id INTEGER PRIMARY KEY, digest_sections TEXT, digest_limit INTEGER, digest_score_type TEXT,"
+                " updated_at REAL NOT NULL)"
+            )
+            for table, columns in ADDED_COLUMNS.items():
+                existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+                for name, sql_type in columns:
+                    if name not in existing:
+                        self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+            self._chats = {row[0] for row in self._conn.execute("SELECT chat_id FROM subscriptions")}
+
+    def __contains__(self, chat_id):
+        return chat_id in self._chats
+
+    def __len__(self):
+        return len(self._chats)
+
+    def chat_ids(self):
+        """Copie de la liste des chats abonnés (utilisable pendant que d'autres chats (dés)abonnent)."""
+        with self._lock:
+            return list(self._chats)
+
+    def reload(self):
+        """Relit la liste des abonnés (modifiée par les autres réplicas). Retourne leur nombre."""
+        with self._lock:
+            self._chats = {row[0] for row in self._conn.execute("SELECT chat_id FROM subscriptions")}
+            return len(self._chats)
+
+    def subscribe(self, chat_id):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO subscriptions (chat_id, subscribed_at) VALUES (?, ?)",
+                               (chat_id, time.time()))
+            self._chats.add(chat_id)
+
+    def delivery_rows(self):
+        """
+        [(chat_id, next_delivery_at ou None, interval_hours, delivery_time, échéance nominale ou None), ...]
+        pour tous les abonnés (format de DeliveryScheduler.schedule_many).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.chat_id, s.next_delivery_at, p.delivery_interval_hours, p.delivery_time, s.next_delivery_nominal"
+                " FROM subscriptions s LEFT JOIN preferences p ON p.chat_id = s.chat_id").fetchall()
+        default_interval = DEFAULT_PREFERENCES["delivery_interval_hours"]
+        return [(chat_id, due_at, interval or default_interval, delivery_time, nominal)
+                for chat_id, due_at, interval, delivery_time, nominal in rows]
+
+    def set_next_deliveries(self, deliveries):
+        """
+        Enregistre les prochaines échéances [(chat_id, échéance, échéance nominale sans jitter), ...]
+        en une transaction.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE subscriptions SET next_delivery_at = ?, next_delivery_nominal = ? WHERE chat_id = ?",
+                [(due_at, nominal, chat_id) for chat_id, due_at, nominal in deliveries])
+
+    def claim_deliveries(self, dues, owner, same_delivery_window=0.0):
+        """
+        Réservation d'un envoi: `dues` = {chat_id: échéance nominale envoyée}. Un chat n'est réservé que pour une
+        échéance postérieure de plus de `same_delivery_window` secondes à la dernière réservée (UPDATE conditionnel,
+        atomique entre réplicas): deux réplicas ne peuvent pas envoyer le même message, et une fréquence raccourcie
+        (/digest) n'est jamais bloquée par la réservation de l'échéance précédente.
+        Retourne les chats réservés par `owner`.
+        """
+        claimed = []
+        with self._lock, self._conn:
+            for chat_id, due_at in dues.items():
+                cursor = self._conn.execute(
+                    "UPDATE subscriptions SET delivery_claimed_due = ?, delivery_lease_owner = ?"
+                    " WHERE chat_id = ? AND (delivery_claimed_due IS NULL OR ? > delivery_claimed_due + ?)",
+                    (due_at, owner, chat_id, due_at, same_delivery_window))
+                if cursor.rowcount:
+                    claimed.append(chat_id)
+        return claimed
+
+    def unsubscribe(self, chat_id):
+        self.unsubscribe_many([chat_id])
+
+    def unsubscribe_many(self, chat_ids):
+        """Désabonne plusieurs chats en une seule transaction (ex: chats ayant bloqué le bot)."""
+        chat_ids = list(chat_ids)
+        if not chat_ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM subscriptions WHERE chat_id = ?", [(c,) for c in chat_ids])
+            self._chats.difference_update(chat_ids)
+
+    def toggle(self, chat_id):
+        """Inverse l'abonnement du chat. Retourne True s'il est désormais abonné."""
+        if chat_id in self._chats:
+            self.unsubscribe(chat_id)
+            return False
+        self.subscribe(chat_id)
+        return True
+
+    def get_preferences(self, chat_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(PREFERENCE_COLUMNS)} FROM preferences WHERE chat_id = ?", (chat_id,)).fetchone()
+        return self._preferences_from_row(row)
+
+    def preferences_for(self, chat_ids, chunk_size=500):
+        """{chat_id: préférences} pour `chat_ids` (requêtes par paquets ; préférences par défaut si aucune ligne)."""
+        chat_ids = list(chat_ids)
+        found = {}
+        with self._lock:
+            for start in range(0, len(chat_ids), chunk_size):
+                chunk = chat_ids[start:start + chunk_size]
+                rows = self._conn.execute(
+                    f"SELECT chat_id, {', '.join(PREFERENCE_COLUMNS)} FROM preferences"
+                    f" WHERE chat_id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+                found.update((row[0], row[1:]) for row in rows)
+        return {chat_id: self._preferences_from_row(found.get(chat_id)) for chat_id in chat_ids}
+
+    def set_preferences(self, chat_id, **preferences):
+        """Met à jour les préférences données (clés de DEFAULT_PREFERENCES), les autres restent inchangées."""
+        unknown = set(preferences) - set(DEFAULT_PREFERENCES)
+        if unknown:
+            raise ValueError(f"Préférences inconnues: {', '.join(sorted(unknown))}")
+        merged = {**self.get_preferences(chat_id), **preferences}
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO preferences (chat_id, {', '.join(PREFERENCE_COLUMNS)}, updated_at)"
+                f" VALUES (?, {', '.join('?' * len(PREFERENCE_COLUMNS))}, ?)",
+                (chat_id, *(merged[c] for c in PREFERENCE_COLUMNS), time.time()))
+        return merged
+
+    @staticmethod
+    def _preferences_from_row(row):
+        preferences = dict(DEFAULT_PREFERENCES)
+        if row is not None:
+            for key, value in zip(PREFERENCE_COLUMNS, row):
+                if value is not None:
+                    preferences[key] = value
+        return preferences
+
+    def migrate_json(self, path=LEGACY_SUBSCRIPTIONS_FILE):
+        """
+        Importe l'ancien fichier JSON (liste d'ID de chats) en une transaction, puis le renomme en `.migrated`.
+        Retourne le nombre de chats importés.
+        """
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'r') as f:
+                chat_ids = [int(c) for c in json.load(f)]
+        except (ValueError, TypeError) as e:
+            print(f"Fichier {path} illisible ({e}), non migré.")
+            return 0
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO subscriptions (chat_id, subscribed_at) VALUES (?, ?)",
+                                   [(c, now) for c in chat_ids])
+            self._chats.update(chat_ids)
+        os.replace(path, path + ".migrated")
+        return len(chat_ids)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,6 @@
+# conftest.py
+# Les modules du bot sont à la racine du dépôt (pas de paquet): on la rend importable depuis les tests.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,123 @@
+# test_ai_streaming.py
+import asyncio
+import threading
+import time
+from contextlib import aclosing
+from types import SimpleNamespace
+
+from ai_streaming import FakeStreamingModel, StreamingReply, stream_model_chunks
+
+class FakeApiError(Exception):
+    """Imite ApiTelegramException: un code d'erreur et la description de Telegram."""
+
+    def __init__(self, error_code, description):
+        super().__init__(description)
+        self.error_code = error_code
+
+class FakeBot:
+    """Enregistre les appels Telegram au lieu de les envoyer ; `reject_markdown` refuse le rendu Markdown (400)."""
+
+    def __init__(self, reject_markdown=False):
+        self.reject_markdown = reject_markdown
+        self.sent = [] # (message_id, texte initial)
+        self.edits = [] # (message_id, texte, parse_mode)
+        self.texts = {} # message_id -> texte affiché
+
+    def _new_message(self, text):
+        message = SimpleNamespace(message_id=len(self.sent) + 1)
+        self.sent.append((message.message_id, text))
+        self.texts[message.message_id] = text
+        return message
+
+    async def reply_to(self, message, text, **kwargs):
+        return self._new_message(text)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return self._new_message(text)
+
+    async def edit_message_text(self, text, chat_id, message_id, parse_mode=None):
+        if parse_mode is None and self.reject_markdown:
+            raise FakeApiError(400, "Bad Request: can't parse entities")
+        self.edits.append((message_id, text, parse_mode))
+        self.texts[message_id] = text
+
+def _message():
+    return SimpleNamespace(chat=SimpleNamespace(id=42))
+
+async def _stream_into(reply, model):
+    await reply.start()
+    async for text in stream_model_chunks(model, "question"):
+        await reply.append(text)
+    await reply.finish()
+
+def test_stream_model_chunks_yields_whole_answer():
+    model = FakeStreamingModel(answer="abcdefghij" * 10, chunk_size=7, delay=0)
+
+    async def collect():
+        return [text async for text in stream_model_chunks(model, "question")]
+    assert "".join(asyncio.run(collect())) == model.answer
+
+def test_long_answer_rolls_over_to_new_messages_under_limit():
+    answer = "\n".join(f"Ligne {i:04d} " + "x" * 60 for i in range(150)) # ~10 000 caractères
+    bot = FakeBot()
+    reply = StreamingReply(bot, _message(), edit_interval=0)
+    asyncio.run(_stream_into(reply, FakeStreamingModel(answer=answer, chunk_size=97, delay=0)))
+
+    assert len(reply.sent_messages) == 3
+    final_texts = [bot.texts[m.message_id] for m in reply.sent_messages]
+    assert all(len(text) <= 4096 for text in final_texts)
+    assert "".join(final_texts) == answer
+    assert all(text.endswith("\n") for text in final_texts[:-1]) # Coupure sur un saut de ligne
+
+def test_edits_are_throttled_until_finish():
+    bot = FakeBot()
+    reply = StreamingReply(bot, _message(), edit_interval=3600)
+    model = FakeStreamingModel(answer="morceau " * 50, chunk_size=8, delay=0)
+    asyncio.run(_stream_into(reply, model))
+
+    # Première édition immédiate, puis plus rien avant la version finale
+    assert len(bot.edits) == 2
+    assert bot.edits[0][1] == "morceau "
+    assert bot.edits[-1] == (1, model.answer, None)
+
+def test_invalid_markdown_falls_back_to_plain_text():
+    bot = FakeBot(reject_markdown=True)
+    reply = StreamingReply(bot, _message(), edit_interval=0)
+    answer = "Réponse avec *markdown non fermé"
+    asyncio.run(_stream_into(reply, FakeStreamingModel(answer=answer, chunk_size=10, delay=0)))
+
+    assert bot.edits[-1] == (1, answer, "") # Texte brut après le refus du rendu Markdown
+    assert bot.texts[1] == answer
+
+class TrackingModel(FakeStreamingModel):
+    """Compte les morceaux produits et note si le flux a été fermé."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.produced = 0
+        self.closed = threading.Event()
+
+    def _stream(self):
+        try:
+            for chunk in super()._stream():
+                self.produced += 1
+                yield chunk
+        finally:
+            self.closed.set()
+
+def test_producer_stops_when_consumer_aborts():
+    model = TrackingModel(answer="x" * 1000, chunk_size=1, delay=0.01) # 1000 morceaux, ~10 s au total
+
+    async def abort_after_first_chunk():
+        async with aclosing(stream_model_chunks(model, "question")) as chunks:
+            async for _ in chunks:
+                raise RuntimeError("envoi Telegram impossible")
+
+    started = time.monotonic()
+    try:
+        asyncio.run(abort_after_first_chunk())
+    except RuntimeError:
+        pass
+    assert model.closed.wait(2)
+    assert time.monotonic() - started < 2
+    assert model.produced < 50
@@ -0,0 +1,127 @@
+# test_alerts.py
+import threading
+
+from alerts import AlertStore, run_alert_poller
+
+def _stored_ids(path):
+    store = AlertStore(path)
+    try:
+        return sorted(alert["alert_id"] for chat_id in (1, 2, 3) for alert in store.for_chat(chat_id))
+    finally:
+        store.close()
+
+def _store(tmp_path):
+    path = str(tmp_path / "alerts.sqlite3")
+    store = AlertStore(path)
+    sent = store.add(1, "AAA", "above", 10)
+    failed = store.add(2, "AAA", "above", 10)
+    blocked = store.add(3, "AAA", "above", 10)
+    other_blocked = store.add(3, "BBB", "below", 5) # Non déclenchée, mais le chat a bloqué le bot
+    return path, store, (sent, failed, blocked, other_blocked)
+
+def test_triggered_alerts_stay_stored_until_acknowledged(tmp_path):
+    path, store, (sent, failed, blocked, _) = _store(tmp_path)
+    triggered = store.pop_triggered({"AAA": 11.0})
+    assert sorted(a["alert_id"] for a in triggered) == [sent["alert_id"], failed["alert_id"], blocked["alert_id"]]
+    assert store.pop_triggered({"AAA": 12.0}) == [] # Plus de nouveau déclenchement pendant l'envoi
+    assert len(_stored_ids(path)) == 4 # Un arrêt ici les renverrait au redémarrage
+    store.close()
+
+def test_poller_acknowledges_sent_rearms_failed_and_drops_blocked_chats(tmp_path):
+    path, store, (sent, failed, blocked, other_blocked) = _store(tmp_path)
+    stop_event = threading.Event()
+    calls = []
+
+    def notify(by_chat):
+        calls.append(sorted(by_chat))
+        stop_event.set() # Une seule passe
+        return {"sent": [1], "failed": [2], "forbidden": [3], "stopped": []}
+
+    run_alert_poller(store, lambda tickers: {t: {"price": 11.0} for t in tickers}, notify, stop_event, interval=0)
+
+    assert calls == [[1, 2, 3]]
+    assert _stored_ids(path) == [failed["alert_id"]]
+    assert [a["alert_id"] for a in store.for_chat(2)] == [failed["alert_id"]] # Réarmée
+    assert [a["alert_id"] for a in store.pop_triggered({"AAA": 11.0})] == [failed["alert_id"]]
+    assert store.for_chat(1) == [] and store.for_chat(3) == []
+    store.close()
+
+def test_notify_error_rearms_everything(tmp_path):
+    path, store, alerts = _store(tmp_path)
+    stop_event = threading.Event()
+
+    def notify(by_chat):
+        stop_event.set()
+        raise RuntimeError("Telegram indisponible")
+
+    run_alert_poller(store, lambda tickers: {t: {"price": 11.0} for t in tickers}, notify, stop_event, interval=0)
+    assert len(store) == 4
+    assert len(_stored_ids(path)) == 4
+    store.close()
+
+def test_stale_quotes_never_trigger(tmp_path):
+    path, store, _ = _store(tmp_path)
+    stop_event = threading.Event()
+    passes, notified = [], []
+
+    def fetch_quotes(tickers):
+        passes.append(tickers)
+        if len(passes) == 1: # Téléchargement en échec: dernière valeur connue, vieille de plusieurs heures
+            return {t: {"price": 11.0, "stale_since": 1000.0} for t in tickers}
+        stop_event.set()
+        return {t: {"price": 9.0} for t in tickers} # Prix frais: le seuil n'est plus franchi
+
+    run_alert_poller(store, fetch_quotes, lambda by_chat: notified.append(by_chat) or {"sent": list(by_chat)},
+                     stop_event, interval=0)
+    assert len(passes) == 2 and notified == []
+    assert len(_stored_ids(path)) == 4
+    assert len(store.pop_triggered({"AAA": 11.0})) == 3 # Toujours armées
+    store.close()
+
+def test_remove_during_send_is_not_rearmed(tmp_path):
+    path, store, (sent, _, _, _) = _store(tmp_path)
+    store.pop_triggered({"AAA": 11.0})
+    assert store.remove(1, sent["alert_id"])
+    assert store.rearm([sent["alert_id"]]) == 0
+    assert sent["alert_id"] not in _stored_ids(path)
+    store.close()
+
+def test_replicas_sharing_the_table(tmp_path):
+    path = str(tmp_path / "alerts.sqlite3")
+    first, second = AlertStore(path), AlertStore(path)
+    alert = first.add(1, "AAA", "above", 10)
+
+    assert second.for_chat(1) == [] # Copie mémoire en retard...
+    assert second.remove(1, alert["alert_id"]) # ...mais la suppression est décidée par la table
+    assert not first.remove(1, alert["alert_id"])
+
+    other = second.add(2, "BBB", "below", 5)
+    assert first.reload() == 1
+    assert [a["alert_id"] for a in first.for_chat(2)] == [other["alert_id"]]
+    first.close()
+    second.close()
+
+def test_only_the_leader_polls(tmp_path):
+    path, store, _ = _store(tmp_path)
+    follower = AlertStore(path)
+    stop_event = threading.Event()
+    fetched = []
+
+    def fetch_quotes(tickers):
+        fetched.extend(tickers)
+        return {}
+
+    timer = threading.Timer(0.2, stop_event.set)
+    timer.start()
+    run_alert_poller(follower, fetch_quotes, lambda by_chat: {}, stop_event, interval=0.01, is_leader=lambda: False)
+    assert fetched == []
+
+    stop_event.clear()
+    late = store.add(4, "CCC", "above", 1) # Créée après le chargement du leader: relue avant la passe
+    def fetch_once(tickers):
+        stop_event.set()
+        return fetch_quotes(tickers)
+    run_alert_poller(follower, fetch_once, lambda by_chat: {}, stop_event, interval=0, is_leader=lambda: True)
+    assert "CCC" in fetched and late["alert_id"] in [a["alert_id"] for a in follower.for_chat(4)]
+    store.close()
+    follower.close()
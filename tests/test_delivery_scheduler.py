@@ -0,0 +1,70 @@
+# test_delivery_scheduler.py
+import threading
+import time
+
+from delivery_scheduler import DeliveryScheduler, next_delivery_time
+
+class Store:
+    """Échéances persistées, comme SubscriptionStore.set_next_deliveries / delivery_rows."""
+
+    def __init__(self, rows):
+        self.due = {chat_id: (due_at, None) for chat_id, due_at, _, _ in rows}
+        self.settings = {chat_id: (interval_hours, delivery_time) for chat_id, _, interval_hours, delivery_time in rows}
+        self.writes = []
+
+    def set_next_deliveries(self, deliveries):
+        self.writes.append(list(deliveries))
+        self.due.update((chat_id, (due_at, nominal)) for chat_id, due_at, nominal in deliveries)
+
+    def rows(self):
+        return [(chat_id, due_at, *self.settings[chat_id], nominal) for chat_id, (due_at, nominal) in self.due.items()]
+
+def _scheduler(store):
+    return DeliveryScheduler(lambda chat_ids: None, threading.Event(), on_rescheduled=store.set_next_deliveries, jitter=300)
+
+def test_past_due_catch_up_is_persisted():
+    now = time.time()
+    store = Store([(1, now - 3600, 12, None), (2, now + 600, 12, None)])
+    scheduler = _scheduler(store)
+    scheduler.schedule_many(store.rows())
+
+    assert [chat_id for chat_id, _, _ in store.writes[0]] == [1] # Seule l'échéance manquée a été recalculée
+    assert now <= store.due[1][0] <= time.time() + 300
+    assert store.due[1] == (scheduler._due[1], scheduler._nominal[1])
+    assert store.due[2] == (now + 600, None)
+
+def test_sync_keeps_persisted_catch_up():
+    store = Store([(1, time.time() - 3600, 12, None)])
+    scheduler = _scheduler(store)
+    scheduler.sync(store.rows())
+    due_at = scheduler._due[1]
+
+    for _ in range(5): # Passages suivants du planificateur de réplica
+        assert scheduler.sync(store.rows()) == (0, 0)
+    assert scheduler._due[1] == due_at
+    assert len(store.writes) == 1
+
+def _persisted_nominal_rows(delivery_time):
+    """Première programmation (abonnement), persistée: échéance jitterée + échéance nominale."""
+    store = Store([(1, None, 12, delivery_time)])
+    _scheduler(store).schedule_many(store.rows())
+    return store
+
+def test_reload_keeps_nominal_time():
+    for delivery_time in (None, "08:30"):
+        store = _persisted_nominal_rows(delivery_time)
+        due_at, nominal = store.due[1]
+        assert nominal <= due_at <= nominal + 300
+        for _ in range(2): # Deux redémarrages successifs sur la même ligne
+            scheduler = _scheduler(store)
+            scheduler.schedule_many(store.rows())
+            assert scheduler._nominal[1] == nominal # Aucun jitter ajouté au jitter déjà tiré
+            assert scheduler._due[1] == due_at
+        assert len(store.writes) == 1
+
+def test_legacy_row_without_nominal_recovers_delivery_slot():
+    nominal = next_delivery_time(time.time(), 24, "08:30")
+    store = Store([(1, nominal + 250, 24, "08:30")]) # Ligne d'avant la colonne nominale
+    scheduler = _scheduler(store)
+    scheduler.schedule_many(store.rows())
+    assert scheduler._nominal[1] == nominal
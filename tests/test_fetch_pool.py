@@ -0,0 +1,55 @@
+# test_fetch_pool.py
+import threading
+import time
+
+import financial_data
+
+def _force_pool_retirement():
+    """Marque le pool courant comme à moitié bloqué: le prochain accès le retire (shutdown) et en crée un neuf."""
+    financial_data._get_fetch_executor()
+    with financial_data._fetch_executor_lock:
+        financial_data._fetch_executor_abandoned = financial_data.FETCH_MAX_WORKERS
+
+def test_pool_retired_concurrently_never_breaks_submit(monkeypatch):
+    monkeypatch.setattr(financial_data, "flush_fundamentals_store", lambda: None)
+    stop, errors, results = threading.Event(), [], []
+
+    def caller():
+        try:
+            while not stop.is_set():
+                results.append(financial_data._run_concurrently(lambda x: x * 2, list(range(20)), ticker_timeout=5, total_deadline=5))
+        except Exception as e: # ex: RuntimeError: cannot schedule new futures after shutdown
+            errors.append(e)
+
+    threads = [threading.Thread(target=caller) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for _ in range(200):
+        _force_pool_retirement()
+        time.sleep(0.001)
+    stop.set()
+    for t in threads:
+        t.join()
+    with financial_data._fetch_executor_lock:
+        financial_data._fetch_executor_abandoned = 0
+    assert errors == []
+    assert results and all(r == [x * 2 for x in range(20)] for r in results)
+
+def test_blocked_items_are_abandoned_and_queued_items_move_to_new_pool(monkeypatch):
+    monkeypatch.setattr(financial_data, "flush_fundamentals_store", lambda: None)
+    monkeypatch.setattr(financial_data, "FETCH_MAX_WORKERS", 2)
+    monkeypatch.setattr(financial_data, "FETCH_MAX_ABANDONED", 10)
+    with financial_data._fetch_executor_lock:
+        financial_data._fetch_executor_abandoned = financial_data.FETCH_MAX_WORKERS # Pool neuf à 2 workers
+    release = threading.Event()
+
+    def fetch(item):
+        if item == "slow":
+            release.wait(5)
+        return item
+
+    try:
+        results = financial_data._run_concurrently(fetch, ["slow", "slow", "a", "b"], ticker_timeout=0.2, total_deadline=3)
+        assert results == [None, None, "a", "b"] # Les éléments en file ne restent pas derrière les workers bloqués
+    finally:
+        release.set()
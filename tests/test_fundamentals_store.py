@@ -0,0 +1,52 @@
+# test_fundamentals_store.py
+import sqlite3
+
+from fundamentals_store import FundamentalsStore
+
+def test_flush_keeps_pending_rows_after_sqlite_error(tmp_path):
+    path = str(tmp_path / "fundamentals.sqlite3")
+    store = FundamentalsStore(path, flush_batch=100)
+    store.queue("AAA", {"currentPrice": 1.0}, fetched_at=10.0)
+    store.queue("BBB", {"currentPrice": 2.0}, fetched_at=11.0)
+
+    other = sqlite3.connect(path)
+    with other:
+        other.execute("ALTER TABLE tickers RENAME TO tickers_away")
+    assert store.flush() == 0 # Table absente: la transaction échoue
+
+    with other:
+        other.execute("ALTER TABLE tickers_away RENAME TO tickers")
+    other.close()
+    assert store.flush() == 2
+    assert sorted((t, p["currentPrice"], f) for t, p, f in store.load_all()) == [("AAA", 1.0, 10.0), ("BBB", 2.0, 11.0)]
+    assert store.flush() == 0 # Plus rien en attente
+    store.close()
+
+def test_flush_drops_unserializable_payload_only(tmp_path):
+    store = FundamentalsStore(str(tmp_path / "fundamentals.sqlite3"), flush_batch=100)
+    store.queue("AAA", {"currentPrice": 1.0})
+    circular = {"currentPrice": 2.0}
+    circular["self"] = circular # Référence circulaire: json.dumps échoue
+    store.queue("BAD", circular)
+    assert store.flush() == 1
+    assert [t for t, _, _ in store.load_all()] == ["AAA"]
+    store.close()
+
+def test_iter_all_pages_and_filters(tmp_path):
+    store = FundamentalsStore(str(tmp_path / "fundamentals.sqlite3"), flush_batch=100)
+    for i in range(7):
+        store.queue(f"T{i}", {"currentPrice": float(i)}, fetched_at=float(i))
+    store.flush()
+    assert [t for t, _, _ in store.iter_all(page_size=3)] == [f"T{i}" for i in range(7)]
+    assert [t for t, _, _ in store.iter_all(fetched_after=4.0, page_size=2)] == ["T5", "T6"]
+    store.close()
+
+def test_get_prefers_pending_row(tmp_path):
+    store = FundamentalsStore(str(tmp_path / "fundamentals.sqlite3"), flush_batch=100)
+    assert store.get("AAA") is None
+    store.queue("AAA", {"currentPrice": 1.0}, fetched_at=10.0)
+    store.flush()
+    assert store.get("AAA") == ({"currentPrice": 1.0}, 10.0)
+    store.queue("AAA", {"currentPrice": 2.0}, fetched_at=20.0) # Pas encore écrit
+    assert store.get("AAA") == ({"currentPrice": 2.0}, 20.0)
+    store.close()
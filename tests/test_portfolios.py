@@ -0,0 +1,28 @@
+# test_portfolios.py
+from portfolios import PortfolioStore
+
+def test_replicas_sharing_the_tables(tmp_path):
+    path = str(tmp_path / "portfolios.sqlite3")
+    first, second = PortfolioStore(path), PortfolioStore(path)
+
+    assert first.toggle_watch(1, "AAA") # Suivi via la première réplica
+    assert not second.toggle_watch(1, "AAA") # La seconde, pas encore rechargée, le retire bien
+    assert first.watchlist(1) == ["AAA"] # Copie mémoire en retard jusqu'au rechargement
+    first.reload()
+    assert first.watchlist(1) == []
+
+    second.set_position(2, "BBB", 10, 100.0)
+    assert first.remove_position(2, "BBB")
+    assert not second.remove_position(2, "BBB")
+    first.close()
+    second.close()
+
+def test_tickers_of_owned_chats(tmp_path):
+    store = PortfolioStore(str(tmp_path / "portfolios.sqlite3"))
+    store.toggle_watch(1, "AAA")
+    store.toggle_watch(2, "BBB")
+    store.set_position(2, "CCC", 1)
+    store.set_position(3, "AAA", 1)
+    assert store.tickers() == ["AAA", "BBB", "CCC"]
+    assert store.tickers(lambda chat_id: chat_id == 2) == ["BBB", "CCC"]
+    store.close()
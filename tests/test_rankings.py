@@ -0,0 +1,27 @@
+# test_rankings.py
+import pytest
+
+import rankings
+
+ENTRY = {"ticker": "AAA", "name": "Test Corp", "raw_price": 10.0, "score": 5.0, "formatted_string": "Test Corp (AAA): 10.00 USD"}
+
+@pytest.fixture
+def cold(monkeypatch):
+    """Aucun snapshot publié ; tout accès réseau fait échouer le test."""
+    monkeypatch.setattr(rankings, "_snapshots", {})
+    def network(*args, **kwargs):
+        raise AssertionError("appel réseau depuis un handler")
+    monkeypatch.setattr(rankings, "refresh_stale_tickers", network)
+    monkeypatch.setattr(rankings, "refresh_price_history", network)
+
+def test_cold_start_serves_degraded_snapshot_from_cache(cold, monkeypatch):
+    monkeypatch.setattr(rankings, "build_ranking_from_cache", lambda *key: ([ENTRY], 1000.0))
+    text = rankings.get_ranking_text("ACTION", limit=10)
+    assert "Test Corp (AAA)" in text
+    snapshot = rankings.get_snapshot("ACTION")
+    assert snapshot is not None and snapshot.built_at == 1000.0 # Daté de la donnée la plus ancienne
+
+def test_cold_start_with_empty_cache_replies_pending(cold, monkeypatch):
+    monkeypatch.setattr(rankings, "build_ranking_from_cache", lambda *key: ([], None))
+    assert rankings.get_ranking_text("ETF", limit=10, score_type="momentum") == rankings.RANKING_PENDING_TEXT
+    assert rankings.get_snapshot("ETF", score_type="momentum") is None # Le rafraîchisseur publiera le classement
@@ -0,0 +1,108 @@
+# test_screener.py
+import numpy as np
+import pytest
+
+import screener
+from screener import DEFAULT_SORT, SCREEN_USAGE, ScreenSnapshot, parse_number, parse_screen_query, screen
+
+NAN = float("nan")
+
+@pytest.fixture
+def snapshot():
+    # AAA..EEE: EEE n'a ni forwardPE ni secteur
+    return ScreenSnapshot(
+        ["AAA", "BBB", "CCC", "DDD", "EEE"], ["A", "B", "C", "D", "E"],
+        {"forwardPE": np.array([10.0, 20.0, 20.0, 30.0, NAN]), "marketCap": np.array([5e9, 1e9, 3e9, 2e9, 4e9])},
+        {"sector": ["Technology", "Healthcare", "technology", "Energy", None]}, oldest=None)
+
+def rows(snapshot, selected):
+    return sorted(snapshot.tickers[i] for i in selected.tolist())
+
+def test_parse_number_suffixes():
+    assert parse_number("20") == 20.0
+    assert parse_number("2%") == pytest.approx(0.02)
+    assert parse_number("10B") == 1e10
+    assert parse_number("1,5k") == 1500.0
+
+@pytest.mark.parametrize("text", ["nan", "inf", "-inf", "Infinity", "nan%", "infB", "abc", ""])
+def test_parse_number_rejects_non_finite_and_text(text):
+    with pytest.raises(ValueError):
+        parse_number(text)
+
+def test_parse_screen_query():
+    filters, sort, page = parse_screen_query('forwardpe<=20 sector="Technology, Energy" sort=marketCap page=2')
+    assert filters == [("forwardPE", "<=", 20.0), ("sector", "=", ["technology", "energy"])]
+    assert sort == ("marketCap", False) and page == 2
+    assert parse_screen_query("beta>1")[1] == DEFAULT_SORT
+
+@pytest.mark.parametrize("query, message", [
+    ("forwardPE<nan", "Valeur numérique invalide"),
+    ("forwardPE>inf", "Valeur numérique invalide"),
+    ("unknown=1", "Champ inconnu"),
+    ("sector<Tech", "catégoriel"),
+    ("sort=sector", "Tri impossible"),
+    ("page=0", "Page invalide"),
+    ("forwardPE", "Filtre invalide"),
+])
+def test_parse_screen_query_errors(query, message):
+    with pytest.raises(ValueError, match=message):
+        parse_screen_query(query)
+
+def test_numeric_operators(snapshot):
+    assert rows(snapshot, snapshot.match("forwardPE", "<", 20.0)) == ["AAA"]
+    assert rows(snapshot, snapshot.match("forwardPE", "<=", 20.0)) == ["AAA", "BBB", "CCC"]
+    assert rows(snapshot, snapshot.match("forwardPE", ">", 20.0)) == ["DDD"]
+    assert rows(snapshot, snapshot.match("forwardPE", ">=", 20.0)) == ["BBB", "CCC", "DDD"]
+    assert rows(snapshot, snapshot.match("forwardPE", "=", 20.0)) == ["BBB", "CCC"]
+
+def test_not_equal_excludes_missing_values(snapshot):
+    assert rows(snapshot, snapshot.match("forwardPE", "!=", 20.0)) == ["AAA", "DDD"]
+    assert rows(snapshot, snapshot.match("sector", "!=", ["technology"])) == ["BBB", "DDD"]
+
+def test_categorical_match_is_case_insensitive(snapshot):
+    assert rows(snapshot, snapshot.match("sector", "=", ["technology", "energy"])) == ["AAA", "CCC", "DDD"]
+    assert rows(snapshot, snapshot.match("sector", "=", ["unknown"])) == []
+
+def test_query_intersects_and_sort_puts_missing_last(snapshot):
+    selected = snapshot.query([("forwardPE", ">=", 20.0), ("sector", "!=", ["energy"])])
+    assert rows(snapshot, selected) == ["BBB", "CCC"]
+    assert len(snapshot.query([])) == 5
+    ordered = snapshot.sort(np.arange(5), "forwardPE", True)
+    assert [snapshot.tickers[i] for i in ordered.tolist()] == ["DDD", "BBB", "CCC", "AAA", "EEE"]
+
+TELEGRAM_LIMIT = 4096
+
+@pytest.fixture
+def big_snapshot(monkeypatch):
+    """300 tickers aux noms longs (plusieurs pages), servis à screen() sans construction depuis le cache."""
+    n = 300
+    snapshot = ScreenSnapshot(
+        [f"T{i:03d}" for i in range(n)], [f"Very Long Company Name Number {i} Incorporated" for i in range(n)],
+        {field: np.arange(n, dtype=float) for field in screener.NUMERIC_FIELDS},
+        {"type": ["ACTION"] * n, "currency": ["USD"] * n, "sector": ["Technology"] * n, "industry": ["Software"] * n},
+        oldest=None)
+    monkeypatch.setattr(screener, "get_screen_snapshot", lambda: snapshot)
+    return snapshot
+
+def test_sort_and_page_only_queries_list_the_universe(big_snapshot):
+    assert screen("") == SCREEN_USAGE
+    text = screen("sort=-dividendYield")
+    assert "300 résultat(s) sur 300 tickers, page 1" in text
+    assert text.index("(T299)") < text.index("(T298)") # Tri décroissant
+    assert "Page suivante: `/screen sort=-dividendYield page=2`" in text
+    assert "page 2" in screen("page=2")
+
+def test_reply_stays_under_telegram_limit(big_snapshot):
+    # Beaucoup de filtres (toujours vrais): lignes longues et longue commande recopiée en pied de page
+    filters = " ".join(f"{field}>=0" for field in screener.NUMERIC_FIELDS)
+    query = f'{filters} sector="Technology, Health Care, Consumer Discretionary, Communication Services" sort=-marketCap'
+    page, pages = 1, 0
+    while True:
+        text = screen(f"{query} page={page}")
+        assert len(text) <= TELEGRAM_LIMIT
+        pages += 1
+        if "Page suivante" not in text:
+            break
+        page += 1
+    assert pages > 1
+    assert len(screen("x" * 4000)) <= TELEGRAM_LIMIT # Erreur: saisie recopiée tronquée
@@ -0,0 +1,34 @@
+# test_subscriptions_store.py
+from subscriptions_store import SubscriptionStore
+
+HOUR = 3600.0
+
+def _store(tmp_path, *chat_ids):
+    store = SubscriptionStore(str(tmp_path / "subscriptions.sqlite3"))
+    for chat_id in chat_ids:
+        store.subscribe(chat_id)
+    return store
+
+def test_each_due_time_is_claimed_once_across_replicas(tmp_path):
+    store = _store(tmp_path, 1, 2)
+    other = SubscriptionStore(str(tmp_path / "subscriptions.sqlite3")) # Autre réplica, même base
+    assert store.claim_deliveries({1: 1000.0, 2: 1000.0}, "a", same_delivery_window=300) == [1, 2]
+    assert other.claim_deliveries({1: 1000.0}, "b", same_delivery_window=300) == []
+    assert other.claim_deliveries({1: 1200.0}, "b", same_delivery_window=300) == [] # Même envoi (rattrapage étalé)
+    other.close()
+    store.close()
+
+def test_shortened_interval_is_not_blocked_by_previous_claim(tmp_path):
+    store = _store(tmp_path, 1)
+    assert store.claim_deliveries({1: 24 * HOUR}, "a", same_delivery_window=300) == [1]
+    store.set_preferences(1, delivery_interval_hours=6) # /digest: 24h -> 6h
+    for due_at in (30 * HOUR, 36 * HOUR, 42 * HOUR): # Échéances suivantes, toutes envoyées
+        assert store.claim_deliveries({1: due_at}, "a", same_delivery_window=300) == [1]
+    store.close()
+
+def test_delivery_rows_carry_nominal_time(tmp_path):
+    store = _store(tmp_path, 1)
+    assert store.delivery_rows() == [(1, None, 12, None, None)]
+    store.set_next_deliveries([(1, 1100.0, 1000.0)])
+    assert store.delivery_rows() == [(1, 1100.0, 12, None, 1000.0)]
+    store.close()
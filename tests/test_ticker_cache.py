@@ -0,0 +1,78 @@
+# test_ticker_cache.py
+import pytest
+
+import financial_data
+from cache import TTLCache
+from screener import build_screen_snapshot
+from ticker_record import TickerRecord
+
+PAYLOAD = {
+    "longName": "Test Corp", "currency": "USD", "quoteType": "EQUITY", "currentPrice": 10.0, "previousClose": 9.5,
+    "marketCap": 1e9, "regularMarketVolume": 1000, "sector": "Technology", "industry": "Software",
+    "forwardPE": 15.0, "longBusinessSummary": "Résumé complet.",
+    "companyOfficers": [{"name": "Jane Doe", "title": "CEO"}],
+}
+
+class FakeTicker:
+    def __init__(self, fake, symbol):
+        self.fake, self.symbol = fake, symbol
+
+    @property
+    def info(self):
+        self.fake.calls += 1
+        if self.fake.fail:
+            raise RuntimeError("Yahoo en panne")
+        return dict(self.fake.payloads.get(self.symbol, {}))
+
+class FakeYFinance:
+    def __init__(self, payloads):
+        self.payloads, self.calls, self.fail = payloads, 0, False
+
+    def Ticker(self, symbol):
+        return FakeTicker(self, symbol)
+
+@pytest.fixture
+def fake_yf(monkeypatch, tmp_path):
+    fake = FakeYFinance({"AAA": PAYLOAD})
+    monkeypatch.setattr(financial_data, "yf", fake)
+    monkeypatch.setattr(financial_data, "_info_cache", TTLCache(max_entries=16, ttl=60, name="ticker_info"))
+    monkeypatch.setattr(financial_data, "_fundamentals_store", None)
+    monkeypatch.setattr(financial_data, "_store_synced_at", 0.0)
+    monkeypatch.setattr(financial_data, "_last_refresh_attempt", {})
+    monkeypatch.setattr(financial_data, "ACTION_UNIVERSE", ["AAA"])
+    monkeypatch.setattr(financial_data, "ETF_UNIVERSE", [])
+    monkeypatch.setattr(financial_data.yahoo, "is_open", lambda: False)
+    assert financial_data.open_fundamentals_store(str(tmp_path / "fundamentals.sqlite3")) == 0
+    yield fake
+    financial_data._fundamentals_store.close()
+
+def test_cache_keeps_record_and_store_keeps_full_payload(fake_yf):
+    assert financial_data.refresh_stale_tickers(["AAA"]) == 1
+    record, _ = financial_data.get_cached_ticker_info("AAA")
+    assert isinstance(record, TickerRecord)
+    assert record.get("longBusinessSummary") is None and record.get("sector") == "Technology"
+    assert financial_data._fundamentals_store.get("AAA")[0]["longBusinessSummary"] == "Résumé complet."
+
+def test_detail_and_officers_read_full_payload_from_store(fake_yf):
+    assert financial_data.refresh_stale_tickers(["AAA"]) == 1
+    calls = fake_yf.calls
+    data = financial_data.get_detailed_stock_data("AAA")
+    assert data["longBusinessSummary"] == "Résumé complet." and data["sector"] == "Technology"
+    assert "Jane Doe" in financial_data.get_company_officers("AAA")
+    assert fake_yf.calls == calls # Lignes fraîches du stockage: aucun refetch
+
+def test_detail_falls_back_to_stored_payload(fake_yf, monkeypatch):
+    assert financial_data.refresh_stale_tickers(["AAA"]) == 1
+    monkeypatch.setattr(financial_data, "PRICE_TTL_SECONDS", 0.0) # Ligne stockée trop vieille pour /detail
+    fake_yf.fail = True
+    data = financial_data.get_detailed_stock_data("AAA")
+    assert data["longBusinessSummary"] == "Résumé complet." and data["stale_since"] is not None
+
+def test_reopen_fills_cache_with_records(fake_yf, tmp_path):
+    assert financial_data.refresh_stale_tickers(["AAA"]) == 1
+    financial_data._fundamentals_store.close()
+    financial_data._info_cache = TTLCache(max_entries=16, ttl=60, name="ticker_info") # Redémarrage: cache vide
+    assert financial_data.open_fundamentals_store(str(tmp_path / "fundamentals.sqlite3")) == 1
+    assert isinstance(financial_data.get_cached_ticker_info("AAA")[0], TickerRecord)
+    snapshot = build_screen_snapshot() # Colonnes de /screen lues dans les TickerRecord
+    assert len(snapshot) == 1 and snapshot.query([("sector", "=", {"technology"})]).tolist() == [0]
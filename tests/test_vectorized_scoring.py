@@ -0,0 +1,63 @@
+# test_vectorized_scoring.py
+import math
+
+import pytest
+
+from financial_data import calculate_long_term_etf_score, calculate_long_term_stock_score
+from ticker_record import TickerRecord
+from vectorized_scoring import ETF_FIELDS, STOCK_FIELDS, check_scoring_parity, score_universe
+
+STOCK = {"profitMargins": 0.12, "revenueGrowth": 0.08, "returnOnEquity": 0.18, "forwardPE": 22.0,
+         "debtToEquity": 0.6, "dividendYield": 0.02, "payoutRatio": 0.4}
+ETF = {"fiveYearAverageReturn": 0.09, "threeYearAverageReturn": 0.07, "annualReportExpenseRatio": 0.003}
+ODD_VALUES = {"missing": None, "nan": math.nan, "non_numeric": "n/a", "inf": math.inf, "-inf": -math.inf}
+
+def _variants(base, fields):
+    """Un payload par (champ, valeur particulière), plus le payload de base et un payload vide."""
+    infos = {"base": dict(base), "empty": {}}
+    for field in fields:
+        for label, value in ODD_VALUES.items():
+            info = dict(base)
+            if label == "missing":
+                del info[field]
+            else:
+                info[field] = value
+            infos[f"{field}.{label}"] = info
+    return infos
+
+def test_stock_parity_on_odd_values():
+    assert check_scoring_parity(_variants(STOCK, STOCK_FIELDS)) == []
+
+def test_etf_parity_on_odd_values():
+    assert check_scoring_parity(_variants(ETF, ETF_FIELDS), is_etf=True) == []
+
+@pytest.mark.parametrize("value", [None, "n/a", "N/A", [], {}])
+def test_unusable_5y_return_falls_back_to_3y(value):
+    info = {**ETF, "fiveYearAverageReturn": value}
+    expected = calculate_long_term_etf_score({k: v for k, v in ETF.items() if k != "fiveYearAverageReturn"})
+    assert calculate_long_term_etf_score(info) == expected
+    assert score_universe({"X": info}, is_etf=True)["X"] == expected
+
+def test_non_numeric_expense_ratio_counts_as_missing():
+    info = {**ETF, "annualReportExpenseRatio": "n/a"}
+    expected = calculate_long_term_etf_score({k: v for k, v in ETF.items() if k != "annualReportExpenseRatio"})
+    assert calculate_long_term_etf_score(info) == expected
+    assert score_universe({"X": info}, is_etf=True)["X"] == expected
+
+def test_non_numeric_forward_pe_does_not_raise():
+    info = {**STOCK, "forwardPE": "n/a"}
+    assert calculate_long_term_stock_score(info) == score_universe({"X": info})["X"]
+
+def test_present_nan_invalidates_score():
+    assert calculate_long_term_stock_score({**STOCK, "profitMargins": math.nan}) == -1000.0
+    assert score_universe({"X": {**STOCK, "profitMargins": math.nan}})["X"] == -1000.0
+
+def test_records_and_dicts_score_identically():
+    infos = _variants(STOCK, STOCK_FIELDS)
+    records = {t: TickerRecord.from_info(t, info) for t, info in infos.items()}
+    assert score_universe(records).tolist() == score_universe(infos).tolist()
+
+def test_rounding_matches_python_round_on_ties():
+    # Scores dont la valeur * 100 tombe sur un x.5: np.round et round() peuvent diverger
+    infos = {f"T{i}": {"profitMargins": 0.05 + i * 0.0000625} for i in range(2000)}
+    assert check_scoring_parity(infos) == []
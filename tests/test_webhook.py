@@ -0,0 +1,112 @@
+# test_webhook.py
+import asyncio
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from webhook import WebhookServer, replay_updates
+
+SECRET = "secret-de-test"
+
+@pytest.fixture
+def loop():
+    """Boucle asyncio dans un thread, comme la boucle du bot vue depuis les threads HTTP."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+def _server(loop, **kwargs):
+    """Serveur sur un port libre, sans workers: la file n'est jamais vidée."""
+    async def process(update):
+        pass
+    options = {"host": "127.0.0.1", "port": 0, "secret_token": SECRET, "queue_size": 2, "workers": 0, "retry_after": 7}
+    server = WebhookServer(process, loop, **{**options, **kwargs})
+    server.start_http()
+    return server
+
+def _stop(server):
+    server._httpd.shutdown()
+    server._httpd.server_close()
+
+def _url(server):
+    return f"http://127.0.0.1:{server.port}{server.path}"
+
+def _post(server, update, token=SECRET):
+    headers = {"Content-Type": "application/json"}
+    if token is not None:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = token
+    request = urllib.request.Request(_url(server), data=json.dumps(update).encode(), method="POST", headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, dict(response.headers)
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers)
+
+@pytest.fixture
+def recorded_updates(tmp_path):
+    path = tmp_path / "updates.jsonl"
+    path.write_text("\n".join(json.dumps({"update_id": i, "message": {"text": f"/detail T{i}"}}) for i in range(5)),
+                    encoding="utf-8")
+    return str(path)
+
+def test_secret_token_is_required(loop):
+    with pytest.raises(ValueError):
+        WebhookServer(lambda update: None, loop, secret_token="")
+
+def test_requests_without_matching_secret_are_rejected(loop):
+    server = _server(loop)
+    try:
+        assert _post(server, {"update_id": 1}, token=None)[0] == 401
+        assert _post(server, {"update_id": 1}, token="mauvais")[0] == 401
+        assert _post(server, {"update_id": 1})[0] == 200
+        assert server.stats()["unauthorized"] == 2
+        assert server.stats()["queued"] == 1
+    finally:
+        _stop(server)
+
+def test_full_queue_answers_503_with_retry_after(loop, recorded_updates):
+    server = _server(loop, full_policy="retry")
+    try:
+        assert replay_updates(recorded_updates, _url(server), SECRET, max_retries=0) == {200: 2, 503: 3}
+        status, headers = _post(server, {"update_id": 99})
+        assert status == 503
+        assert headers["Retry-After"] == "7"
+        stats = server.stats()
+        assert (stats["queued"], stats["rejected"], stats["dropped"]) == (2, 4, 0)
+    finally:
+        _stop(server)
+
+def test_full_queue_drop_policy_acknowledges_and_discards(loop, recorded_updates):
+    server = _server(loop, full_policy="drop")
+    try:
+        assert replay_updates(recorded_updates, _url(server), SECRET, max_retries=0) == {200: 5}
+        stats = server.stats()
+        assert (stats["queued"], stats["rejected"], stats["dropped"]) == (2, 0, 3)
+    finally:
+        _stop(server)
+
+def test_queued_updates_are_processed_by_workers(loop, recorded_updates):
+    processed = []
+
+    async def process(update):
+        processed.append(update["update_id"])
+
+    server = WebhookServer(process, loop, host="127.0.0.1", port=0, secret_token=SECRET, workers=2)
+    serving = asyncio.run_coroutine_threadsafe(server.serve(), loop)
+    try:
+        for _ in range(50): # serve() démarre le serveur HTTP sur la boucle
+            if server.port: # Port réel attribué par start_http()
+                break
+            threading.Event().wait(0.02)
+        assert replay_updates(recorded_updates, _url(server), SECRET) == {200: 5}
+        asyncio.run_coroutine_threadsafe(server.queue.join(), loop).result(5)
+        assert sorted(processed) == [0, 1, 2, 3, 4]
+    finally:
+        serving.cancel()
@@ -0,0 +1,60 @@
+# ticker_record.py
+# Enregistrement compact par ticker: seuls les champs `.info` lus par le scoring, les classements, /detail et /screen,
+# dans des __slots__ (pas de dict par instance). C'est ce que garde le cache des tickers: le payload yfinance complet
+# (150+ clés, résumé, dirigeants...) n'est conservé que dans le stockage SQLite (voir fundamentals_store.py).
+import sys
+
+RECORD_FIELDS = (
+    # Affichage
+    "longName", "shortName", "currency", "quoteType",
+    "currentPrice", "regularMarketPrice", "previousClose", "regularMarketChange", "regularMarketChangePercent",
+    # /detail et colonnes filtrables de /screen (voir detailed_fields)
+    "dayHigh", "dayLow", "fiftyTwoWeekHigh", "fiftyTwoWeekLow", "marketCap", "regularMarketVolume", "volume",
+    "averageVolume", "trailingPE", "beta", "sector", "industry", "website",
+    # Score long_term des actions
+    "profitMargins", "revenueGrowth", "returnOnEquity", "forwardPE", "debtToEquity", "dividendYield", "payoutRatio",
+    # Score long_term des ETF
+    "fiveYearAverageReturn", "threeYearAverageReturn", "annualReportExpenseRatio",
+)
+_FIELD_SET = frozenset(RECORD_FIELDS)
+INTERNED_FIELDS = ("currency", "quoteType", "sector", "industry") # Valeurs répétées sur tout l'univers: une seule copie
+
+class TickerRecord:
+    """
+    Lecture comme un payload `.info`: `record.get(clé, défaut)` (mêmes fonctions de scoring).
+    Un champ absent du payload reste un slot non initialisé: `get` renvoie alors le défaut, comme dict.get.
+    """
+    __slots__ = ("ticker",) + RECORD_FIELDS
+
+    def __init__(self, ticker, **fields):
+        self.ticker = ticker
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    @classmethod
+    def from_info(cls, ticker, info):
+        if isinstance(info, TickerRecord): # Déjà compacté
+            return info
+        record = cls(ticker)
+        for key in RECORD_FIELDS:
+            if key in info:
+                value = info[key]
+                if key in INTERNED_FIELDS and isinstance(value, str):
+                    value = sys.intern(value)
+                setattr(record, key, value)
+        return record
+
+    def __bool__(self):
+        """Faux si aucun champ n'est renseigné (comme un payload vide)."""
+        return any(hasattr(self, key) for key in RECORD_FIELDS)
+
+    def get(self, key, default=None):
+        if key not in _FIELD_SET:
+            return default
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in RECORD_FIELDS if hasattr(self, key)}
+
+    def __repr__(self):
+        return f"TickerRecord({self.ticker!r}, {self.to_dict()!r})"
@@ -0,0 +1,41 @@
+# universe.py
+# Chargement des univers de tickers depuis des fichiers externes (ex: composition d'indices).
+import os
+
+ETF_UNIVERSE_FILE = os.getenv("ETF_UNIVERSE_FILE", "")
+ACTION_UNIVERSE_FILE = os.getenv("ACTION_UNIVERSE_FILE", "")
+
+def load_universe_file(path):
+    """
+    Lit un fichier d'univers: un symbole par ligne, ou un CSV dont la première colonne est le symbole
+    (une éventuelle ligne d'en-tête "symbol"/"ticker" est ignorée). Les lignes vides et les
+    commentaires (#) sont ignorés, les doublons retirés en gardant l'ordre du fichier.
+    """
+    tickers, seen = [], set()
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            symbol = line.split(',', 1)[0].split(';', 1)[0].strip().strip('"').upper()
+            if not symbol or symbol.lower() in ("symbol", "ticker"):
+                continue
+            if symbol not in seen:
+                seen.add(symbol)
+                tickers.append(symbol)
+    return tickers
+
+def load_universe(path, default_tickers):
+    """Univers du fichier `path` s'il est configuré et lisible, sinon la liste par défaut."""
+    if not path:
+        return list(default_tickers)
+    try:
+        tickers = load_universe_file(path)
+    except OSError as e:
+        print(f"Fichier d'univers {path} illisible ({e}), liste par défaut utilisée.")
+        return list(default_tickers)
+    if not tickers:
+        print(f"Fichier d'univers {path} vide, liste par défaut utilisée.")
+        return list(default_tickers)
+    print(f"Univers chargé depuis {path}: {len(tickers)} ticker(s).")
+    return tickers
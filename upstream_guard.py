@@ -0,0 +1,161 @@
+# upstream_guard.py
+# Protection des appels à un service amont (Yahoo Finance via yfinance): disjoncteur, réessais avec
+# backoff exponentiel + jitter, et budget de réessais. Circuit ouvert: échec immédiat (UpstreamUnavailable),
+# l'appelant sert alors les dernières données connues au lieu d'attendre un timeout complet.
+import os
+import random
+import threading
+import time
+
+UPSTREAM_FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_FAILURE_THRESHOLD", 5)) # Échecs consécutifs avant ouverture
+UPSTREAM_OPEN_SECONDS = float(os.getenv("UPSTREAM_OPEN_SECONDS", 30)) # Première ouverture, doublée à chaque récidive
+UPSTREAM_MAX_OPEN_SECONDS = float(os.getenv("UPSTREAM_MAX_OPEN_SECONDS", 600))
+UPSTREAM_SLOW_CALL_SECONDS = float(os.getenv("UPSTREAM_SLOW_CALL_SECONDS", 10)) # Appel réussi mais compté comme échec
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", 2))
+UPSTREAM_RETRY_BASE_DELAY = 0.5 # secondes, doublé à chaque réessai (jitter complet)
+UPSTREAM_RETRY_BUDGET_RATIO = float(os.getenv("UPSTREAM_RETRY_BUDGET_RATIO", 0.1)) # Réessais / appels, au plus
+UPSTREAM_RETRY_BUDGET_MIN = 10 # Réessais toujours disponibles (faible trafic, démarrage)
+
+# Erreurs propres à la requête (symbole inconnu...): ni réessayées, ni comptées contre le service
+CLIENT_ERROR_MARKERS = ("404", "Not Found", "delisted", "No data found")
+
+class UpstreamUnavailable(Exception):
+    """Circuit ouvert: l'appel n'a pas été tenté. `retry_in`: secondes avant le prochain essai."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} indisponible (circuit ouvert, nouvel essai dans {retry_in:.0f}s)")
+        self.retry_in = retry_in
+
+def is_client_error(error):
+    message = str(error)
+    return any(marker in message for marker in CLIENT_ERROR_MARKERS)
+
+class CircuitBreaker:
+    """
+    Fermé: les appels passent. Après `failure_threshold` échecs consécutifs: ouvert pendant une durée qui double
+    à chaque réouverture (avec jitter). À l'échéance: semi-ouvert, un seul appel d'essai ; succès -> fermé, échec -> rouvert.
+    """
+
+    def __init__(self, failure_threshold=UPSTREAM_FAILURE_THRESHOLD, open_seconds=UPSTREAM_OPEN_SECONDS,
+                 max_open_seconds=UPSTREAM_MAX_OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = "closed"
+        self.failures = 0 # Échecs consécutifs
+        self.openings = 0 # Réouvertures successives sans succès entre elles
+        self.open_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Retourne 0 si l'appel peut être tenté, sinon le temps (s) avant le prochain essai."""
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            now = time.monotonic()
+            if self.state == "open":
+                if now < self.open_until:
+                    return self.open_until - now
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self._probe_in_flight: # Semi-ouvert: un seul appel d'essai à la fois
+                return max(self.open_until - now, 1.0)
+            self._probe_in_flight = True
+            return 0.0
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print("Service amont rétabli: circuit refermé.")
+            self.state = "closed"
+            self.failures = 0
+            self.openings = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.openings += 1
+                duration = min(self.max_open_seconds, self.open_seconds * 2 ** (self.openings - 1))
+                duration *= random.uniform(0.8, 1.2) # Jitter: les réveils de plusieurs processus ne s'alignent pas
+                self.state = "open"
+                self.open_until = time.monotonic() + duration
+                self._probe_in_flight = False
+                print(f"Service amont en échec ({self.failures} échecs consécutifs): circuit ouvert pour {duration:.0f}s.")
+
+class UpstreamGuard:
+    """Point de passage unique des appels à un service amont: `guard.call(func, *args)`."""
+
+    def __init__(self, name, breaker=None, max_retries=UPSTREAM_MAX_RETRIES, retry_base_delay=UPSTREAM_RETRY_BASE_DELAY,
+                 slow_call_seconds=UPSTREAM_SLOW_CALL_SECONDS, retry_budget_ratio=UPSTREAM_RETRY_BUDGET_RATIO,
+                 retry_budget_min=UPSTREAM_RETRY_BUDGET_MIN):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.slow_call_seconds = slow_call_seconds
+        self.retry_budget_ratio = retry_budget_ratio
+        self.retry_budget_min = retry_budget_min
+        self._retry_tokens = float(retry_budget_min)
+        self.counts = {"calls": 0, "failures": 0, "retries": 0, "rejected": 0, "budget_exhausted": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _take_retry_token(self):
+        """Budget de réessais: chaque appel crédite `retry_budget_ratio` jeton, chaque réessai en consomme un."""
+        with self._lock:
+            if self._retry_tokens >= 1:
+                self._retry_tokens -= 1
+                return True
+            self.counts["budget_exhausted"] += 1
+            return False
+
+    def is_open(self):
+        return self.breaker.state == "open" and time.monotonic() < self.breaker.open_until
+
+    def call(self, func, *args, **kwargs):
+        """
+        Appelle `func` avec réessais (backoff exponentiel, jitter complet) dans la limite du budget.
+        Lève UpstreamUnavailable si le circuit est ouvert, sinon la dernière erreur de `func`.
+        """
+        with self._lock:
+            self.counts["calls"] += 1
+            self._retry_tokens = min(self._retry_tokens + self.retry_budget_ratio,
+                                     max(self.retry_budget_min, self.retry_budget_ratio * 100))
+        for attempt in range(self.max_retries + 1):
+            retry_in = self.breaker.allow()
+            if retry_in:
+                self._count("rejected")
+                raise UpstreamUnavailable(self.name, retry_in)
+            started = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if is_client_error(e):
+                    self.breaker.record_success() # Le service a répondu: pas une panne
+                    raise
+                self._count("failures")
+                self.breaker.record_failure()
+                if attempt == self.max_retries or not self._take_retry_token():
+                    raise
+                self._count("retries")
+                time.sleep(random.uniform(0, self.retry_base_delay * 2 ** attempt))
+                continue
+            if time.monotonic() - started > self.slow_call_seconds:
+                self.breaker.record_failure() # Réponse obtenue, mais le service sature: rapprocher l'ouverture
+            else:
+                self.breaker.record_success()
+            return result
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        breaker = self.breaker
+        retry_in = max(0.0, breaker.open_until - time.monotonic()) if breaker.state != "closed" else 0.0
+        return {"name": self.name, "state": breaker.state, "consecutive_failures": breaker.failures,
+                "retry_in": retry_in, **counts}
@@ -0,0 +1,154 @@
+# vectorized_scoring.py
+# Scoring "Potentiel LT" de tout l'univers en une passe (pandas/NumPy).
+# Mêmes règles que calculate_long_term_stock_score / calculate_long_term_etf_score de financial_data,
+# mais appliquées colonne par colonne: c'est le chemin utilisé par build_ranking_from_cache pour classer
+# tout l'univers, et il permet de re-scorer rapidement après un changement de poids.
+import numpy as np
+import pandas as pd
+
+from ticker_record import TickerRecord
+from financial_data import (
+    LONG_TERM_STOCK_WEIGHTS,
+    LONG_TERM_ETF_WEIGHTS,
+    calculate_long_term_stock_score,
+    calculate_long_term_etf_score,
+    to_number
+)
+
+STOCK_FIELDS = ['profitMargins', 'revenueGrowth', 'returnOnEquity', 'forwardPE', 'debtToEquity', 'dividendYield', 'payoutRatio']
+ETF_FIELDS = ['fiveYearAverageReturn', 'threeYearAverageReturn', 'annualReportExpenseRatio']
+UNIVERSE_FIELDS = STOCK_FIELDS + ETF_FIELDS
+
+def _column(raw):
+    """
+    Colonne float + masque "absent" pour une liste de valeurs brutes `.info`.
+    Chemin rapide: conversion NumPy de toute la colonne (None devient NaN, seuls les NaN sont ensuite réexaminés
+    pour distinguer un None d'un vrai NaN) ; si une valeur n'est pas numérique (ex: "n/a"), repli élément
+    par élément avec to_number, la valeur étant alors traitée comme absente.
+    """
+    try:
+        values = np.array(raw, dtype=float)
+        if values.shape == (len(raw),):
+            missing = np.zeros(len(raw), dtype=bool)
+            for i in np.flatnonzero(np.isnan(values)).tolist():
+                missing[i] = raw[i] is None
+            return values, missing
+    except (ValueError, TypeError):
+        pass
+    numbers = [to_number(v) for v in raw]
+    missing = np.fromiter((v is None for v in numbers), dtype=bool, count=len(numbers))
+    return np.array([np.nan if v is None else v for v in numbers], dtype=float), missing
+
+def build_universe_frame(infos, fields=UNIVERSE_FIELDS):
+    """
+    Construit le snapshot colonnaire de l'univers à partir de `infos` (dict ticker -> dict `.info` ou TickerRecord).
+    Retourne (values, missing) : deux DataFrames indexés par ticker, une colonne par champ.
+    `values` contient des float (NaN si absent), `missing` vaut True si la donnée manque ou n'est pas numérique.
+    Un NaN réellement présent dans `.info` n'est pas "absent" : il rend le score invalide (-1000),
+    exactement comme dans les fonctions par dict.
+    """
+    tickers = list(infos)
+    rows = list(infos.values())
+    values, missing = {}, {}
+    if all(type(info) is TickerRecord for info in rows):
+        # Lecture directe des slots (un slot non initialisé vaut None, comme record.get)
+        extract = lambda field: [getattr(record, field, None) for record in rows]
+    else:
+        extract = lambda field: [info.get(field) for info in rows]
+    for field in fields:
+        values[field], missing[field] = _column(extract(field))
+    return pd.DataFrame(values, index=tickers), pd.DataFrame(missing, index=tickers)
+
+def normalize_columns(values, missing, good_range_min, good_range_max, lower_is_better=False):
+    """Version vectorisée de normalize_value : score 0-10 par élément, 0 si la donnée manque."""
+    values = np.asarray(values, dtype=float)
+    clipped = np.clip(values, good_range_min, good_range_max)
+    if lower_is_better:
+        scaled = 10 * (good_range_max - clipped) / (good_range_max - good_range_min)
+        scaled = np.where(values <= good_range_min, 10.0, np.where(values >= good_range_max, 0.0, scaled))
+    else:
+        scaled = 10 * (clipped - good_range_min) / (good_range_max - good_range_min)
+        scaled = np.where(values >= good_range_max, 10.0, np.where(values <= good_range_min, 0.0, scaled))
+    # Les bornes sont fixées explicitement pour retomber sur les mêmes valeurs exactes que normalize_value
+    return np.where(missing, 0.0, scaled)
+
+def _round2(score):
+    """
+    Arrondi à 2 décimales identique au round() Python des fonctions par dict.
+    np.round ne diffère de round() que si score * 100 tombe (à l'erreur flottante près) sur un x.5 :
+    seuls ces éléments, rares, repassent par round().
+    """
+    scaled = score * 100
+    rounded = np.round(score, 2)
+    near_tie = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in near_tie.tolist():
+        rounded[i] = round(float(score[i]), 2)
+    return rounded
+
+def _finalize(score, index):
+    finite = np.isfinite(score)
+    return pd.Series(np.where(finite, _round2(np.where(finite, score, 0.0)), -1000.0), index=index, dtype=float)
+
+def score_stocks_vectorized(values, missing, weights=None):
+    """Score LT de toutes les actions du snapshot. Retourne une Series ticker -> score."""
+    weights = LONG_TERM_STOCK_WEIGHTS if weights is None else weights
+    col = lambda field: values[field].to_numpy(dtype=float)
+    miss = lambda field: missing[field].to_numpy(dtype=bool)
+    score = np.zeros(len(values.index))
+
+    score = score + weights["profit_margin"] * normalize_columns(col('profitMargins'), miss('profitMargins'), 0.05, 0.25)
+    score = score + weights["revenue_growth"] * normalize_columns(col('revenueGrowth'), miss('revenueGrowth'), 0.03, 0.20)
+    score = score + weights["roe"] * normalize_columns(col('returnOnEquity'), miss('returnOnEquity'), 0.10, 0.30)
+
+    fpe = col('forwardPE')
+    fpe = np.where(~miss('forwardPE') & (fpe < 5), 5.0, fpe) # Eviter P/E trop bas
+    score = score + weights["forward_pe"] * normalize_columns(fpe, miss('forwardPE'), 10, 35, lower_is_better=True)
+
+    score = score + weights["debt_to_equity"] * normalize_columns(col('debtToEquity'), miss('debtToEquity'), 0.1, 1.5, lower_is_better=True)
+
+    div_yield, payout_ratio = col('dividendYield'), col('payoutRatio')
+    sustainable = (~miss('dividendYield') & (div_yield > 0)
+                   & ~miss('payoutRatio') & (payout_ratio > 0) & (payout_ratio < 0.75))
+    div_score = weights["dividend_sustainability"] * normalize_columns(div_yield, miss('dividendYield'), 0.01, 0.05)
+    score = score + np.where(sustainable, div_score, 0.0)
+
+    return _finalize(score, values.index)
+
+def score_etfs_vectorized(values, missing, weights=None):
+    """Score LT de tous les ETFs du snapshot. Retourne une Series ticker -> score."""
+    weights = LONG_TERM_ETF_WEIGHTS if weights is None else weights
+    col = lambda field: values[field].to_numpy(dtype=float)
+    miss = lambda field: missing[field].to_numpy(dtype=bool)
+    score = np.zeros(len(values.index))
+
+    # Performance 5 ans, repli sur 3 ans si absente (ou non numérique)
+    no_5y = miss('fiveYearAverageReturn')
+    ret = np.where(no_5y, col('threeYearAverageReturn'), col('fiveYearAverageReturn'))
+    ret_missing = no_5y & miss('threeYearAverageReturn')
+    score = score + weights["5y_return"] * normalize_columns(ret, ret_missing, 0.03, 0.15)
+
+    # Frais: petite contribution par défaut s'ils ne sont pas connus
+    er_missing = miss('annualReportExpenseRatio')
+    er_score = weights["expense_ratio"] * normalize_columns(col('annualReportExpenseRatio'), er_missing, 0.001, 0.0075, lower_is_better=True)
+    score = score + np.where(er_missing, weights["expense_ratio"] * 2, er_score)
+
+    return _finalize(score, values.index)
+
+def score_universe(infos, is_etf=False, weights=None):
+    """Raccourci: snapshot + scoring en une passe pour un dict ticker -> `.info` (ou TickerRecord)."""
+    values, missing = build_universe_frame(infos, ETF_FIELDS if is_etf else STOCK_FIELDS)
+    return score_etfs_vectorized(values, missing, weights) if is_etf else score_stocks_vectorized(values, missing, weights)
+
+def check_scoring_parity(infos, is_etf=False, weights=None):
+    """
+    Compare le chemin vectorisé aux fonctions par dict sur `infos`.
+    Retourne la liste des (ticker, score_par_dict, score_vectorisé) divergents : vide si parité.
+    """
+    scalar_fn = calculate_long_term_etf_score if is_etf else calculate_long_term_stock_score
+    vectorized = score_universe(infos, is_etf, weights)
+    mismatches = []
+    for (ticker, info), score in zip(infos.items(), vectorized.tolist()):
+        expected = scalar_fn(info, weights)
+        if expected != score:
+            mismatches.append((ticker, expected, score))
+    return mismatches
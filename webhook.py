@@ -0,0 +1,217 @@
+# webhook.py
+# Réception des mises à jour Telegram par webhook (alternative au long polling): un serveur HTTP local
+# met chaque mise à jour dans une file bornée, traitée par un nombre fixe de workers sur la boucle du bot.
+# File pleine: réponse 503 + Retry-After (Telegram renverra la mise à jour plus tard) ou abandon, selon WEBHOOK_FULL_POLICY.
+#
+# Rejouer des mises à jour enregistrées (une par ligne, JSON) sans connexion à Telegram:
+#   python webhook.py replay updates.jsonl --url http://127.0.0.1:8443/webhook --secret <WEBHOOK_SECRET_TOKEN>
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metrics import observe
+
+WEBHOOK_MODE = os.getenv("WEBHOOK_MODE", "0") == "1" # 1 = webhook au lieu du long polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "") # URL publique déclarée à Telegram (vide: serveur local seulement)
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "") # Vérifié dans l'en-tête X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 8))
+WEBHOOK_FULL_POLICY = os.getenv("WEBHOOK_FULL_POLICY", "retry") # "retry" (503 + Retry-After) ou "drop"
+WEBHOOK_RETRY_AFTER = int(os.getenv("WEBHOOK_RETRY_AFTER", 2)) # secondes
+WEBHOOK_MAX_BODY = 1024 * 1024 # Une mise à jour Telegram fait quelques Ko
+ENQUEUE_TIMEOUT = 5 # Attente max de la boucle du bot depuis un thread HTTP
+
+class WebhookServer:
+    """
+    `process(update_dict)` est une coroutine exécutée par les workers sur la boucle `loop`
+    (ex: conversion en types.Update puis bot.process_new_updates).
+    `priority(update_dict)` ordonne la file (plus petit = traité d'abord, puis ordre d'arrivée).
+    """
+
+    def __init__(self, process, loop, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH,
+                 secret_token=WEBHOOK_SECRET_TOKEN, queue_size=WEBHOOK_QUEUE_SIZE, workers=WEBHOOK_WORKERS,
+                 full_policy=WEBHOOK_FULL_POLICY, retry_after=WEBHOOK_RETRY_AFTER, priority=None):
+        if full_policy not in ("retry", "drop"):
+            raise ValueError(f"WEBHOOK_FULL_POLICY inconnue: {full_policy}")
+        if not secret_token: # Sans secret, n'importe qui pouvant joindre le serveur injecterait des mises à jour
+            raise ValueError("WEBHOOK_SECRET_TOKEN est obligatoire en mode webhook.")
+        self.process = process
+        self.loop = loop
+        self.host, self.port, self.path = host, port, path
+        self.secret_token = secret_token
+        self.workers = workers
+        self.full_policy = full_policy
+        self.retry_after = retry_after
+        self.priority = priority or (lambda update: 0)
+        self.queue = asyncio.PriorityQueue(maxsize=queue_size) # Créée sur la boucle du bot
+        self._arrivals = itertools.count()
+        self.counts = {"received": 0, "rejected": 0, "dropped": 0, "processed": 0, "failed": 0, "unauthorized": 0}
+        self._counts_lock = threading.Lock()
+        self._httpd = None
+
+    def _count(self, key):
+        with self._counts_lock:
+            self.counts[key] += 1
+
+    def stats(self):
+        with self._counts_lock:
+            return {**self.counts, "queued": self.queue.qsize(), "queue_size": self.queue.maxsize}
+
+    def submit(self, update):
+        """
+        Depuis un thread HTTP: met `update` dans la file. Retourne "queued", "rejected" (file pleine, à renvoyer
+        plus tard) ou "dropped" (file pleine, abandonnée).
+        """
+        self._count("received")
+        started = time.perf_counter()
+        # put_nowait exécuté sur la boucle du bot (asyncio.Queue n'est pas thread-safe)
+        queued = asyncio.run_coroutine_threadsafe(self._enqueue(update), self.loop).result(ENQUEUE_TIMEOUT)
+        observe("webhook.enqueue", time.perf_counter() - started, error=not queued)
+        if queued:
+            return "queued"
+        status = "dropped" if self.full_policy == "drop" else "rejected"
+        self._count(status)
+        return status
+
+    async def _enqueue(self, update):
+        try:
+            self.queue.put_nowait((self.priority(update), next(self._arrivals), time.monotonic(), update))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _worker(self):
+        while True:
+            _, _, enqueued_at, update = await self.queue.get()
+            observe("webhook.queue_wait", time.monotonic() - enqueued_at)
+            started = time.perf_counter()
+            try:
+                await self.process(update)
+                self._count("processed")
+                observe("webhook.process", time.perf_counter() - started)
+            except Exception as e:
+                self._count("failed")
+                observe("webhook.process", time.perf_counter() - started, error=True)
+                print(f"Erreur traitement de la mise à jour {update.get('update_id')}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def start_http(self):
+        handler = type("WebhookRequestHandler", (_WebhookRequestHandler,), {"server_ref": self})
+        self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1] # Port réel si 0 (tests)
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        print(f"Webhook en écoute sur http://{self.host}:{self.port}{self.path} "
+              f"({self.workers} workers, file de {self.queue.maxsize}, politique '{self.full_policy}').")
+
+    async def serve(self):
+        """Démarre le serveur HTTP et les workers ; tourne jusqu'à annulation (/stop), puis arrête le serveur."""
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.start_http()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            for task in workers:
+                task.cancel()
+            print(f"Webhook arrêté: {self.stats()}")
+
+class _WebhookRequestHandler(BaseHTTPRequestHandler):
+    server_ref = None # WebhookServer, défini par start_http()
+
+    def _reply(self, code, headers=None):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        webhook = self.server_ref
+        if self.path.split("?", 1)[0] != webhook.path:
+            self._reply(404)
+            return
+        received_token = self.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not secrets.compare_digest(received_token.encode(), webhook.secret_token.encode()):
+            webhook._count("unauthorized")
+            self._reply(401)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if not 0 < length <= WEBHOOK_MAX_BODY:
+            self._reply(413 if length else 400)
+            return
+        try:
+            update = json.loads(self.rfile.read(length))
+            if not isinstance(update, dict) or "update_id" not in update:
+                raise ValueError("update_id manquant")
+        except ValueError:
+            self._reply(400)
+            return
+        try:
+            status = webhook.submit(update)
+        except Exception as e: # Boucle du bot indisponible (arrêt en cours...)
+            print(f"Webhook: mise à jour non transmise ({e}).")
+            self._reply(503, {"Retry-After": str(webhook.retry_after)})
+            return
+        if status == "rejected":
+            self._reply(503, {"Retry-After": str(webhook.retry_after)})
+        else: # "queued" ou "dropped": Telegram ne doit pas la renvoyer
+            self._reply(200)
+
+    def log_message(self, format, *args):
+        pass # Pas de log par mise à jour
+
+def replay_updates(path, url, secret_token="", max_retries=5):
+    """
+    Poste les mises à jour enregistrées de `path` (une par ligne) vers le webhook local, en respectant
+    les 503/Retry-After comme le ferait Telegram. Retourne {code HTTP: nombre}.
+    """
+    results = {}
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    for line in lines:
+        body = line.strip().encode("utf-8")
+        for attempt in range(max_retries + 1):
+            request = urllib.request.Request(url, data=body, method="POST", headers={
+                "Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": secret_token})
+            try:
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    code = response.status
+            except urllib.error.HTTPError as e:
+                code = e.code
+                if code == 503 and attempt < max_retries:
+                    time.sleep(float(e.headers.get("Retry-After", 1)))
+                    continue
+            break
+        results[code] = results.get(code, 0) + 1
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Outils du mode webhook.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay = subparsers.add_parser("replay", help="Poste des mises à jour enregistrées (JSON, une par ligne) au webhook local.")
+    replay.add_argument("updates_file")
+    replay.add_argument("--url", default=f"http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    replay.add_argument("--secret", default=WEBHOOK_SECRET_TOKEN)
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    results = replay_updates(args.updates_file, args.url, args.secret)
+    print(f"{sum(results.values())} mise(s) à jour postée(s) en {time.perf_counter() - started:.2f}s: {results}")
+    return 0 if set(results) <= {200} else 1
+
+if __name__ == "__main__":
+    sys.exit(main())